@@ -1,6 +1,10 @@
-from fastapi.responses import Response
+from typing import Literal
+from fastapi.responses import Response, StreamingResponse
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Header, Query
 from . import convert_html as ch
+from .columnar import ARROW_TYPES, arrow_available
+from .images import IMAGE_TYPES
+from app.utils.resultstore import content_headers
 
 
 # 初始化业务模块路由
@@ -17,13 +21,40 @@ async def check_uid(x_user_id: str | None = Header(None)):
 @router.post(
     "/to_html",
     summary="上传Excel文档，返回HTML表格内容",
+    description="format=json 返回各sheet的列式结构(列数组+合并区域)，"
+    "format=arrow/parquet 直接返回长表二进制(需安装pyarrow，未安装时返回501)；"
+    "sheets/range 只转换选中的sheet和区域，各sheet耗时见 Server-Timing 响应头；"
+    "images=blob 时图片单元格内容为图片ID，图片通过 /image/{图片ID} 获取",
 )
 async def to_html(
+    response: Response,
     file: UploadFile = File(...),
+    format: Literal["html", "json", "arrow", "parquet"] = Query(
+        "html", description="输出格式"
+    ),
+    sheets: list[str] | None = Query(
+        None, description="按名称或序号(从0开始)选择sheet，可重复传入"
+    ),
+    cell_range: str | None = Query(
+        None, alias="range", description="只转换的单元格区域，如 A1:D20、A:D、2:10"
+    ),
+    images: Literal["type", "blob"] = Query(
+        "type", description="xlsx单元格图片：type 输出图片格式，blob 输出图片ID"
+    ),
 ):
-    cnt, msg = await ch.to_html(file)
+    if format in ARROW_TYPES and not arrow_available():
+        # 可选依赖未安装，服务端不支持该格式
+        raise HTTPException(status_code=501, detail=f"{format} output requires pyarrow")
+    timings = []
+    cnt, msg = await ch.to_html(
+        file, format, sheets, cell_range, images=images, timings=timings
+    )
     if msg:
         return {"data": "", "msg": msg, "code": -1}
+    headers = {"Server-Timing": ch.server_timing(timings)} if timings else {}
+    if format in ARROW_TYPES:
+        return Response(content=cnt, media_type=ARROW_TYPES[format], headers=headers)
+    response.headers.update(headers)
     return {"data": cnt, "msg": "ok", "code": 1}
 
 
@@ -34,13 +65,47 @@ async def to_html(
 async def upload(
     files: list[UploadFile] = File(...),
     user_id: str = Depends(check_uid),
+    format: Literal["html", "json"] = Query("html", description="暂存内容的格式"),
+    sheets: list[str] | None = Query(
+        None, description="按名称或序号(从0开始)选择sheet，可重复传入"
+    ),
+    cell_range: str | None = Query(
+        None, alias="range", description="只转换的单元格区域，如 A1:D20、A:D、2:10"
+    ),
+    images: Literal["type", "blob"] = Query(
+        "type", description="xlsx单元格图片：type 输出图片格式，blob 输出图片ID"
+    ),
 ):
-    cnt, msg = await ch.to_htmls(files, user_id)
+    cnt, msg = await ch.to_htmls(files, user_id, format, sheets, cell_range, images)
     if msg:
         return {"data": "", "msg": msg, "code": -1}
     return {"data": cnt, "msg": "ok", "code": 1}
 
 
+@router.get(
+    "/cache/stats",
+    summary="转换结果缓存统计",
+)
+async def result_cache_stats():
+    return {"data": ch.cache_stats(), "msg": "ok", "code": 1}
+
+
+@router.get(
+    "/image/{image_id}",
+    summary="根据图片ID获取单元格图片",
+)
+async def get_image(image_id: str):
+    data, msg = await ch.get_image(image_id)
+    if msg:
+        raise HTTPException(status_code=404, detail=msg)
+    # 图片ID由内容摘要生成，内容不会变化
+    return Response(
+        content=data,
+        media_type=IMAGE_TYPES.get(image_id.rsplit(".", 1)[-1]),
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
+
+
 @router.get(
     "/html_content",
     summary="根据文档ID获取文件内容",
@@ -48,7 +113,17 @@ async def upload(
 async def get_content(
     file_id: int = Query(..., description="文件ID"),
     user_id: str = Depends(check_uid),
+    raw: bool = Query(
+        False, description="直接流式返回原始内容，文件ID、文件名等元数据在响应头"
+    ),
 ):
+    if raw:
+        result, msg = await ch.html_content_stream(file_id, user_id)
+        if msg:
+            return {"data": "", "msg": msg, "code": -1}
+        meta, chunks = result
+        return StreamingResponse(chunks, headers=content_headers(meta))
+
     cnt, msg = await ch.html_content(file_id, user_id)
     if msg:
         return {"data": "", "msg": msg, "code": -1}
@@ -62,7 +137,12 @@ async def get_content(
 async def get_contents(
     file_ids: list[int] = Query(..., description="文件ID列表"),
     user_id: str = Depends(check_uid),
+    raw: bool = Query(False, description="流式返回NDJSON，每个文件一行"),
 ):
+    if raw:
+        lines = ch.html_contents_ndjson(file_ids, user_id)
+        return StreamingResponse(lines, media_type="application/x-ndjson")
+
     cnt, msg = await ch.html_contents(file_ids, user_id)
     if msg:
         return {"data": cnt, "msg": msg, "code": -1}
@@ -0,0 +1,120 @@
+import io
+from typing import Callable, Sequence
+from importlib.util import find_spec
+from .html import Cell
+
+# 列式二进制格式及其响应类型
+ARROW_TYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def arrow_available() -> bool:
+    """是否安装了可选依赖pyarrow"""
+    return find_spec("pyarrow") is not None
+
+
+class ColumnWriter:
+    """
+    逐行收集单元格为列式结构，与 TableWriter 接口一致，由表格生成函数按需选用
+      - 每列为等长数组，空白及被合并覆盖的位置为 None
+      - 合并单元格以 [行, 列, rowspan, colspan] 元数据给出，粗体单元格以 [行, 列] 给出
+    行列号从0开始，列号相对于表格首列(与HTML输出的列对齐一致)
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.rows: list[dict[int, str]] = []  # 各行 {列号: 文本}
+        self.merges: list[list[int]] = []
+        self.headers: list[list[int]] = []
+        self.origin: int | None = None  # 表格首列
+        self.width = 0  # 有内容的最大列号(不含)
+
+    def add_row(self, cells: Sequence[Cell]):
+        row_idx = len(self.rows)
+        values = {}
+        for col, tag, text, rowspan, colspan in cells:
+            if self.origin is None or col < self.origin:
+                self.origin = col
+            merged = rowspan > 1 or colspan > 1
+            if merged:
+                self.merges.append([row_idx, col, rowspan, colspan])
+            if text.strip():
+                values[col] = text
+                if tag == "th":
+                    self.headers.append([row_idx, col])
+            elif not merged:
+                continue
+            self.width = max(self.width, col + colspan)
+        self.rows.append(values)
+
+    def getvalue(self, lead: Callable | None = None) -> dict | None:
+        """
+        :param lead: 与 TableWriter 一致，列式结构的首列由收到的单元格确定，无需补充
+        :return: {"name", "nrows", "ncols", "columns", "merges", "headers"}，没有内容时返回None
+        """
+        origin = self.origin or 0
+        if self.width <= origin:
+            return None
+
+        columns = [
+            [row.get(col) for row in self.rows] for col in range(origin, self.width)
+        ]
+        return {
+            "name": self.name,
+            "nrows": len(self.rows),
+            "ncols": len(columns),
+            "columns": columns,
+            "merges": [[r, c - origin, rs, cs] for r, c, rs, cs in self.merges],
+            "headers": [[r, c - origin] for r, c in self.headers],
+        }
+
+
+def columns_to_arrow(sheets: list[dict], fmt: str) -> bytes:
+    """
+    多个sheet的列式结构转为 Arrow IPC 流或 Parquet 文件
+    不同sheet列数不同，统一为每个非空单元格一行的长表：
+    sheet, row, col, value, rowspan, colspan, header
+    """
+    import pyarrow as pa
+
+    names, rows, cols, values, rowspans, colspans, headers = ([] for _ in range(7))
+    for sheet in sheets:
+        spans = {(r, c): (rs, cs) for r, c, rs, cs in sheet["merges"]}
+        bold = {(r, c) for r, c in sheet["headers"]}
+        for r in range(sheet["nrows"]):
+            for c, column in enumerate(sheet["columns"]):
+                value = column[r]
+                if value is None and (r, c) not in spans:
+                    continue
+                rs, cs = spans.get((r, c), (1, 1))
+                names.append(sheet["name"])
+                rows.append(r)
+                cols.append(c)
+                values.append(value)
+                rowspans.append(rs)
+                colspans.append(cs)
+                headers.append((r, c) in bold)
+
+    table = pa.table(
+        {
+            "sheet": pa.array(names, pa.string()).dictionary_encode(),
+            "row": pa.array(rows, pa.int32()),
+            "col": pa.array(cols, pa.int32()),
+            "value": pa.array(values, pa.string()),
+            "rowspan": pa.array(rowspans, pa.int32()),
+            "colspan": pa.array(colspans, pa.int32()),
+            "header": pa.array(headers, pa.bool_()),
+        }
+    )
+    buf = io.BytesIO()
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        pq.write_table(table, buf)
+    else:
+        options = pa.ipc.IpcWriteOptions(compression="zstd")
+        with pa.ipc.new_stream(buf, table.schema, options=options) as stream:
+            stream.write_table(table)
+    return buf.getvalue()
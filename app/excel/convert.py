@@ -0,0 +1,114 @@
+from typing import Any
+from pathlib import Path
+from .html import TableWriter, html_document
+from .xls import xls_sheet_names, xls_to_tables
+from .xlsx import xlsx_sheet_names, xlsx_to_tables
+from .columnar import ColumnWriter, columns_to_arrow
+from .images import ImageReader
+from .sheets import Bounds
+
+# Excel文件来源：文件路径，或内存中的文件内容(小文件不落盘直接交给解析进程)
+Source = str | Path | bytes
+
+
+def excel_ext(src: Source, ext: str | None = None) -> str:
+    """文件类型，内存中的文件内容需给出扩展名"""
+    if ext is None:
+        if isinstance(src, bytes):
+            raise ValueError("missing ext for in-memory file")
+        ext = Path(src).suffix
+    ext = ext.lower()
+    if ext not in (".xls", ".xlsx"):
+        raise ValueError(f"unsupported {ext}")
+    return ext
+
+
+def excel_sheet_names(src: Source, ext: str | None = None) -> list[str]:
+    """工作簿的全部sheet名称，只读取工作簿目录，不解析sheet"""
+    if excel_ext(src, ext) == ".xls":
+        return xls_sheet_names(src)
+    return xlsx_sheet_names(src)
+
+
+def excel_to_tables(
+    src: Source,
+    fmt: str = "html",
+    sheets: list[str | int] | None = None,
+    bounds: Bounds | None = None,
+    stream_min_bytes: int | None = None,
+    ext: str | None = None,
+    images: str = "type",
+) -> tuple[list[tuple[str, Any, float]], dict[str, bytes]]:
+    """
+    逐个sheet转换表格(CPU密集，在进程池中执行)，未选中的sheet不解析
+    模块只依赖解析库，工作进程导入时不加载服务端组件
+    :param src: 文件路径或文件内容
+    :param fmt: html 输出HTML表格，其他格式输出列式结构
+    :param sheets: 按名称或序号选择sheet，None表示全部
+    :param bounds: 只转换的单元格区域，None表示整表
+    :param stream_min_bytes: xlsx文件不小于该字节数时流式解析
+    :param ext: 文件扩展名，默认取自文件路径
+    :param images: xlsx单元格图片的输出，type 为图片格式，blob 为图片ID(内容另行返回)
+    :return: (各选中sheet的 (名称, 表格, 耗时), blob模式下的 {图片ID: 图片内容})
+    """
+    writer = TableWriter if fmt == "html" else ColumnWriter
+    if excel_ext(src, ext) == ".xls":
+        return xls_to_tables(src, writer, sheets, bounds), {}
+    reader = ImageReader(images)
+    tables = xlsx_to_tables(src, stream_min_bytes, writer, sheets, bounds, reader)
+    return tables, reader.blobs
+
+
+def join_tables(tables: list, fmt: str = "html") -> str | dict | bytes:
+    """
+    各sheet表格按顺序组装为最终输出，空表跳过
+    :param fmt: html 返回HTML文档，json 返回 {"sheets": [各sheet列式结构]}，
+                arrow/parquet 返回长表二进制
+    """
+    tables = [table for table in tables if table]
+    if fmt == "html":
+        return html_document("".join(f"{table}\n" for table in tables))
+    if fmt == "json":
+        return {"sheets": tables}
+    return columns_to_arrow(tables, fmt)
+
+
+def excel_convert(
+    src: Source,
+    fmt: str = "html",
+    sheets: list[str | int] | None = None,
+    bounds: Bounds | None = None,
+    stream_min_bytes: int | None = None,
+    ext: str | None = None,
+    images: str = "type",
+) -> tuple[str | dict | bytes, list[tuple[str, float]], dict[str, bytes]]:
+    """
+    Excel文件转换并组装输出(CPU密集，在进程池中执行)，参数同 excel_to_tables
+    :return: (输出内容, 各sheet的 (名称, 耗时), blob模式下的 {图片ID: 图片内容})
+    """
+    tables, blobs = excel_to_tables(
+        src, fmt, sheets, bounds, stream_min_bytes, ext, images
+    )
+    output = join_tables([table for _, table, _ in tables], fmt)
+    return output, [(name, seconds) for name, _, seconds in tables], blobs
+
+
+def excel_to_html(fpath: str | Path, stream_min_bytes: int | None = None) -> str:
+    """
+    Excel文件转为对齐后的HTML文档
+    :param stream_min_bytes: xlsx文件不小于该字节数时流式解析
+    """
+    return excel_convert(fpath, stream_min_bytes=stream_min_bytes)[0]
+
+
+def excel_to_columns(
+    fpath: str | Path,
+    fmt: str = "json",
+    stream_min_bytes: int | None = None,
+) -> dict | bytes:
+    """
+    Excel文件转为列式结构
+    :param fmt: json 返回 {"sheets": [各sheet列式结构]}，arrow/parquet 返回长表二进制
+    :param stream_min_bytes: xlsx文件不小于该字节数时流式解析
+    """
+    return excel_convert(fpath, fmt, stream_min_bytes=stream_min_bytes)[0]
@@ -1,79 +1,401 @@
-import os
-import re
+import json
+import time
 import asyncio
-from typing import Tuple
+from typing import Any, Tuple
+from collections.abc import AsyncIterator
 from pathlib import Path
+from urllib.parse import quote
 import aiofiles.os as aos
 import aiofiles.ospath as aop
-from .xls import xls_to_html
-from .xlsx import xlsx_to_html
-from .html import align_table
+from .convert import excel_convert, excel_sheet_names, excel_to_tables, join_tables
+from .columnar import ARROW_TYPES, arrow_available
+from .images import IMAGE_ID_RE
+from .sheets import Bounds, parse_range, select_sheets
+from app.settings import cfg
+from app.utils.log import log
 from app.utils.batch import batch_async
 from app.utils import aiofile as af
-from app.utils.autoid import next_id
+from app.utils.autoid import next_id_async
+from app.utils.procpool import ProcPool
+from app.utils.multipart import upload_chunks
+from app.utils.cache import (
+    DiskCache,
+    MemoryCache,
+    SingleFlight,
+    cache_key,
+    file_digest,
+)
+from app.utils.resultstore import result_store
+from app.utils.framing import pack_header, unpack
+from app.utils.metrics import STAGE_SECONDS, registry
 
+# Excel转换专用进程池，由FastAPI lifespan负责启动和关闭
+excel_pool = ProcPool(
+    workers=cfg.excel_workers,
+    timeout=cfg.excel_task_timeout,
+    max_tasks=cfg.excel_worker_max_tasks,
+    name="excel",
+)
 
-async def to_html(file) -> Tuple[str, str]:
+# 单元格图片存储(按内容寻址，相同图片只存一份)，由FastAPI lifespan负责加载索引
+image_store = DiskCache(
+    cfg.excel_image_dir,
+    max_bytes=cfg.excel_image_max_bytes,
+    ttl=cfg.excel_image_ttl,
+)
+
+# 转换结果缓存(按文件内容+转换参数寻址)：进程内存层 + 磁盘层，及相同转换的并发合并
+result_memory = MemoryCache(cfg.excel_cache_memory_bytes, ttl=cfg.excel_cache_ttl)
+result_cache = DiskCache(
+    cfg.excel_cache_dir,
+    max_bytes=cfg.excel_cache_max_bytes,
+    ttl=cfg.excel_cache_ttl,
+)
+# 等待超时后由等待方自行转换(一次转换最多包含目录读取与转换两个进程池任务)
+result_flight = SingleFlight(timeout=2 * cfg.excel_task_timeout)
+
+# 结果存储中Excel转换结果的类别，及直接返回时各格式的内容类型
+KIND = "excel"
+CONTENT_TYPES = {
+    "html": "text/html; charset=utf-8",
+    "json": "application/json",
+}
+
+
+@STAGE_SECONDS.timed("excel_to_html")
+async def to_html(
+    file,
+    fmt: str = "html",
+    sheets: list[str] | None = None,
+    cell_range: str | None = None,
+    images: str = "type",
+    timings: list | None = None,
+) -> Tuple[Any, str]:
+    """
+    Excel转为HTML表格或列式结构
+    :param fmt: html 返回HTML文档，json 返回各sheet列式结构，arrow/parquet 返回二进制
+    :param sheets: 按名称或序号(从0开始)选择sheet，未选中的sheet不解析，None表示全部
+    :param cell_range: 只转换的单元格区域，如 A1:D20，对选中的每个sheet生效
+    :param images: xlsx单元格图片输出为图片格式(type)，或图片ID(blob，内容存入图片存储)
+    :param timings: 传入列表时追加各sheet的 (名称, 耗时秒数)，命中缓存时不追加
+    相同内容与参数的转换直接返回缓存结果(不可修改)，并发提交的相同转换只执行一次
+    """
     # 检查文件类型
     fpath = Path(file.filename)
     ext = fpath.suffix.lower()
     if ext not in [".xls", ".xlsx"]:
         return "", f"unsupported {ext}"
+    if fmt in ARROW_TYPES and not arrow_available():
+        return "", f"{fmt} output requires pyarrow"
+    try:
+        bounds = parse_range(cell_range)
+    except ValueError as e:
+        return "", str(e)
+
+    if not cfg.excel_cache_enabled:
+        cnt, sheet_timings, _, msg = await convert_upload(
+            file, ext, fmt, sheets, bounds, images
+        )
+    else:
+        digest = await asyncio.to_thread(file_digest, file.file)
+        key = cache_key(
+            digest,
+            ext=ext,
+            fmt=fmt,
+            sheets=sheets,
+            bounds=bounds,
+            images=images,
+            version=cfg.excel_cache_version,
+        )
+        cached = await get_result(key)
+        if cached is not None:
+            log.info(f"excel cache hit: {file.filename}")
+            return cached, ""
+        cnt, sheet_timings, _, msg = await result_flight.do(
+            key, convert_cached, key, file, ext, fmt, sheets, bounds, images
+        )
+
+    if sheet_timings:
+        # 各sheet的解析与对齐在工作进程中完成，耗时随结果带回
+        for _, seconds in sheet_timings:
+            STAGE_SECONDS.observe(f"{ext[1:]}_sheet", value=seconds)
+        log.info(
+            f"excel converted: {file.filename} "
+            + " ".join(f"{name}={seconds:.3f}s" for name, seconds in sheet_timings)
+        )
+        if timings is not None:
+            timings.extend(sheet_timings)
+    return cnt or "", msg
+
+
+async def convert_cached(
+    key: str,
+    file,
+    ext: str,
+    fmt: str,
+    sheets: list[str] | None,
+    bounds: Bounds | None,
+    images: str = "type",
+) -> Tuple[Any, list, list, str]:
+    """转换并写入结果缓存，由并发合并的首个调用方执行，返回值同 convert_upload"""
+    result = await convert_upload(file, ext, fmt, sheets, bounds, images)
+    cnt, _, image_ids, msg = result
+    if not msg:
+        await set_result(key, fmt, cnt, image_ids)
+    return result
+
+
+async def convert_upload(
+    file,
+    ext: str,
+    fmt: str,
+    sheets: list[str] | None,
+    bounds: Bounds | None,
+    images: str = "type",
+) -> Tuple[Any, list, list, str]:
+    """
+    上传文件交给进程池转换
+    小文件直接以内存字节交给解析进程，不经过磁盘；大文件及大小未知的文件分块落盘，不整体驻留内存
+    :return: (输出内容, 各sheet的 (名称, 耗时), 引用的图片ID, 错误信息)
+    """
+    tmp_path = None
+    if file.size is None or file.size > cfg.excel_inmemory_max_bytes:
+        tmp_path = Path(cfg.excel_tmp_dir, f"{await next_id_async()}{ext}")
+        with STAGE_SECONDS.time("excel_tmp_write"):
+            await af.write_chunks(tmp_path, upload_chunks(file))
+        src = tmp_path
+    else:
+        src = await file.read()
+
+    # 进程池中格式转换并对齐单元格
+    try:
+        return await convert_file(src, ext, fmt, sheets, bounds, images)
+    finally:
+        # 清理资源
+        if tmp_path is not None:
+            await aos.unlink(tmp_path)
+
+
+async def convert_file(
+    src: Path | bytes,
+    ext: str,
+    fmt: str,
+    sheets: list[str] | None,
+    bounds: Bounds | None,
+    images: str = "type",
+) -> Tuple[Any, list, list, str]:
+    """
+    进程池中转换，大文件的多个sheet分发到不同工作进程并行转换，按sheet顺序组装
+    :param src: 落盘的文件路径，或文件内容(经管道交给工作进程，不落盘)
+    :return: (输出内容, 各sheet的 (名称, 耗时), 引用的图片ID, 错误信息)
+    """
+    size = len(src) if isinstance(src, bytes) else await aop.getsize(src)
+    parallel = excel_pool.size > 1 and size >= cfg.excel_parallel_min_bytes
+    if sheets or parallel:
+        # 先读取sheet目录，选择的sheet不存在时直接返回
+        names, msg = await excel_pool.run(excel_sheet_names, src, ext)
+        if msg:
+            return "", [], [], msg
+        try:
+            selected = select_sheets(names, sheets)
+        except ValueError as e:
+            return "", [], [], str(e)
+        if parallel and len(selected) > 1:
+            return await convert_sheets(src, ext, fmt, selected, bounds, images)
+        sheets = selected
+
+    stream_min_bytes = cfg.excel_stream_min_bytes
+    result, msg = await excel_pool.run(
+        excel_convert, src, fmt, sheets, bounds, stream_min_bytes, ext, images
+    )
+    if msg:
+        return "", [], [], msg
+    cnt, sheet_timings, blobs = result
+    await save_images(blobs)
+    return cnt, sheet_timings, list(blobs), ""
+
+
+async def convert_sheets(
+    src: Path | bytes,
+    ext: str,
+    fmt: str,
+    selected: list[int],
+    bounds: Bounds | None,
+    images: str = "type",
+) -> Tuple[Any, list, list, str]:
+    """每个sheet一个进程池任务，各自只解析自己的sheet，全部完成后按顺序组装"""
+    stream_min_bytes = cfg.excel_stream_min_bytes
+    results = await asyncio.gather(
+        *(
+            excel_pool.run(
+                excel_to_tables,
+                src,
+                fmt,
+                [idx],
+                bounds,
+                stream_min_bytes,
+                ext,
+                images,
+            )
+            for idx in selected
+        )
+    )
+    tables = []
+    blobs = {}
+    for result, msg in results:
+        if msg:
+            return "", [], [], msg
+        tables.extend(result[0])
+        blobs.update(result[1])
+    await save_images(blobs)
+
+    # 列式二进制编码为CPU密集，在进程池中执行
+    parts = [table for _, table, _ in tables]
+    if fmt in ARROW_TYPES:
+        cnt, msg = await excel_pool.run(join_tables, parts, fmt)
+        if msg:
+            return "", [], [], msg
+    else:
+        cnt = await asyncio.to_thread(join_tables, parts, fmt)
+    sheet_timings = [(name, seconds) for name, _, seconds in tables]
+    return cnt, sheet_timings, list(blobs), ""
+
+
+async def save_images(blobs: dict[str, bytes]):
+    """图片写入图片存储，已存在的相同图片不重复写入"""
+    for image_id, data in blobs.items():
+        # 索引只反映本进程，图片文件可能已被其他worker淘汰，以磁盘为准
+        if not await aop.isfile(image_store.path(image_id)):
+            await image_store.set(image_id, data)
+
+
+def encode_result(fmt: str, cnt: Any, image_ids: list[str]) -> bytes:
+    """转换结果序列化为磁盘缓存内容：分帧头部存放元数据，其后为输出内容"""
+    if fmt == "json":
+        body = json.dumps(cnt, ensure_ascii=False).encode("utf-8")
+    elif fmt in ARROW_TYPES:
+        body = cnt
+    else:
+        body = cnt.encode("utf-8")
+    return pack_header({"fmt": fmt, "images": image_ids}) + body
+
 
-    # 存临时文件
-    tmp_name = f"{next_id()}{ext}"
-    tmp_path = os.path.join("tmp", "all", tmp_name)
-    tmp_path = Path(tmp_path)
-    content = await file.read()
-    await af.write_bin(tmp_path, content)
+def decode_result(data: bytes) -> Tuple[Any, list[str]]:
+    """磁盘缓存内容还原为 (输出内容, 引用的图片ID)，文本直接从内容视图解码"""
+    meta, body = unpack(data)
+    fmt = meta["fmt"]
+    if fmt in ARROW_TYPES:
+        return bytes(body), meta["images"]
+    text = str(body, "utf-8")
+    if fmt == "json":
+        return json.loads(text), meta["images"]
+    return text, meta["images"]
 
-    # 格式转换
-    if ext == ".xls":
-        html_cnt = await asyncio.to_thread(xls_to_html, tmp_path)
-    if ext == ".xlsx":
-        html_cnt = await asyncio.to_thread(xlsx_to_html, tmp_path)
 
-    # 清理并对齐单元格
-    html_cnt = align_table(html_cnt)
+async def images_available(image_ids: list[str]) -> bool:
+    """
+    结果引用的图片是否仍在图片存储中(图片可能先于结果被淘汰)
+    其他worker淘汰图片不会更新本进程的索引，逐个检查图片文件
+    """
+    for image_id in image_ids:
+        if not await aop.isfile(image_store.path(image_id)):
+            return False
+    return True
+
+
+async def get_result(key: str) -> Any:
+    """
+    依次查内存层、磁盘层缓存，磁盘命中时提升到内存层，未命中返回None
+    两层都存放序列化后的内容(内存层按实际占用计量)，命中后再还原
+    """
+    data = result_memory.get(key)
+    from_disk = data is None
+    if from_disk:
+        data = await result_cache.get(key)
+        if data is None:
+            return None
+    try:
+        cnt, image_ids = await asyncio.to_thread(decode_result, data)
+    except ValueError as e:
+        log.warning(f"excel cache entry invalid: {type(e).__name__}: {e} {key}")
+        return None
+    if from_disk:
+        stored_at = result_cache.index.get(key, (0, time.time()))[1]
+        result_memory.set(key, data, len(data), stored_at)
+
+    if image_ids and not await images_available(image_ids):
+        return None
+    return cnt
+
 
-    # 清理资源
-    await aos.unlink(tmp_path)
+async def set_result(key: str, fmt: str, cnt: Any, image_ids: list[str]):
+    """转换结果写入内存层和磁盘层缓存"""
+    data = await asyncio.to_thread(encode_result, fmt, cnt, image_ids)
+    result_memory.set(key, data, len(data))
+    await result_cache.set(key, data)
+
+
+def cache_stats() -> dict:
+    """转换结果缓存各层的命中率、容量与淘汰统计"""
+    return {"memory": result_memory.stats(), "disk": result_cache.stats()}
+
+
+registry.stats("excel_cache", "Excel转换结果缓存统计", cache_stats)
+registry.stats("excel_pool", "Excel转换进程池状态", excel_pool.stats)
+
+
+async def get_image(image_id: str) -> Tuple[bytes | None, str]:
+    """按图片ID读取图片内容"""
+    if not IMAGE_ID_RE.fullmatch(image_id):
+        return None, f"invalid image id: {image_id}"
+    data = await image_store.get(image_id)
+    if data is None:
+        return None, f"image not found: {image_id}"
+    return data, ""
 
-    return html_cnt, ""
 
+def server_timing(timings: list) -> str:
+    """各sheet耗时转为 Server-Timing 响应头，sheet名称URL编码"""
+    return ", ".join(
+        f'sheet{idx};dur={seconds * 1000:.1f};desc="{quote(name)}"'
+        for idx, (name, seconds) in enumerate(timings)
+    )
 
-def extract_filename(ss):
+
+async def to_htmls(
+    files,
+    user_id,
+    fmt: str = "html",
+    sheets: list[str] | None = None,
+    cell_range: str | None = None,
+    images: str = "type",
+) -> Tuple[dict, str]:
     """
-    提取<html>之前的文件名
-    内容：filename<html>...
+    批量转换并暂存结果
+    :param fmt: html 或 json，json 结果以JSON文本暂存
+    :param sheets, cell_range, images: 同 to_html，对每个文件生效
     """
-    pattern = r"([^<]*?\.(?i:xlsx?))(?=\s*<html\b)"
-    match = re.search(pattern, ss)
-    if match:
-        filename = match.group(1)
-        content = re.sub(pattern, "", ss, count=1)
-        return filename, content
-    return "", ss
 
+    async def worker(file):
+        cnt, msg = await to_html(file, fmt, sheets, cell_range, images)
+        if fmt == "json" and not msg:
+            cnt = await asyncio.to_thread(json.dumps, cnt, ensure_ascii=False)
+        return cnt, msg
 
-async def to_htmls(files, user_id) -> Tuple[str, str]:
     # 触发批处理获取结果
-    results = await batch_async(to_html, files)
+    # 单文件超时由进程池控制
+    results = await batch_async(worker, files, timeout=None)
 
     # 提取批量结果
     files_msg = []
     for status, idx, file, (cnt, msg) in results:
         if status and not msg:
-            # 临时文件名
-            id = next_id()
-            tmp_name = f"{user_id}_{id}.md"
-
-            # 临时文件头部写入文件名
-
-            cnt = file.filename + cnt
-
-            # 写文件
-            await af.write_file(os.path.join("tmp", tmp_name), cnt)
+            # 暂存结果，文件名等元数据存于索引
+            id = await next_id_async()
+            content = cnt.encode("utf-8")
+            await result_store.put(
+                KIND, user_id, id, file.filename, content, CONTENT_TYPES[fmt]
+            )
 
             # 文件信息
             files_msg.append(
@@ -91,29 +413,34 @@ async def to_htmls(files, user_id) -> Tuple[str, str]:
 
 
 async def html_content(file_id, user_id) -> Tuple[dict, str]:
-    # 触发批处理获取结果
-    tmp_name = f"{user_id}_{file_id}.md"
-    fpath = os.path.join("tmp", tmp_name)
-    fpath = Path(fpath)
-    if not await aop.isfile(fpath):
-        return {}, f"file not found of id: {file_id}"
-
-    # 读取临时存储的文件内容
-    cnt = await af.read_file(fpath)
-    filename, cnt = extract_filename(cnt)
-
-    # 删除临时文件
-    await aos.unlink(fpath)
+    # 取走暂存的结果(读取后删除)
+    result, msg = await result_store.take(KIND, user_id, file_id)
+    if result is None:
+        return {}, msg
+    meta, cnt = result
 
     data = {
         "id": file_id,
         "user_id": user_id,
-        "content": cnt,
-        "filename": filename,
+        "content": cnt.decode("utf-8"),
+        "filename": meta["filename"],
     }
     return data, ""
 
 
+async def html_content_stream(file_id, user_id) -> tuple[tuple | None, str]:
+    """
+    取走暂存的转换结果，按块读取直接作为响应体
+    :return: ((元数据, 分块内容), 错误信息)
+    """
+    return await result_store.take_stream(KIND, user_id, file_id)
+
+
+def html_contents_ndjson(file_ids, user_id) -> AsyncIterator[str]:
+    """逐个取走暂存的转换结果，每个文件输出一行JSON，不一次性读入全部内容"""
+    return result_store.iter_ndjson(KIND, user_id, file_ids)
+
+
 async def html_contents(file_ids, user_id) -> Tuple[list, str]:
     async def worker(param):
         file_id, user_id = param
@@ -1,5 +1,13 @@
+import re
+from html import escape
+from typing import Callable, Sequence
 from lxml import etree
 
+# 表格单元格：(列号, 标签th/td, 文本内容, rowspan, colspan)
+Cell = tuple[int, str, str, int, int]
+
+NEWLINE_RE = re.compile(r"\r\n|\r|\n")
+
 
 def parse_html(html_content):
     """解析HTML数据"""
@@ -20,25 +28,51 @@ def parse_html(html_content):
     return root
 
 
+def _span(cell, name: str) -> int:
+    """单元格的 rowspan/colspan，非法值按 1 处理"""
+    try:
+        return max(1, int(cell.get(name, 1)))
+    except (ValueError, TypeError):
+        return 1
+
+
+class LogicCols:
+    """
+    逐行统计逻辑列数：本行单元格的 colspan 之和 + 前面行 rowspan 延续到本行的列数
+    按到期行号累计释放的列数，每个单元格只处理一次，总耗时与单元格数成正比
+    """
+
+    def __init__(self):
+        self.row = -1  # 当前行号
+        self.active = 0  # 当前行占用的逻辑列数
+        self.expire: dict[int, int] = {}  # 行号 -> 该行起释放的逻辑列数
+
+    def next_row(self):
+        """进入下一行，释放到期的 rowspan"""
+        self.row += 1
+        self.active -= self.expire.pop(self.row, 0)
+
+    def add(self, rowspan: int, colspan: int):
+        """当前行加入一个单元格"""
+        self.active += colspan
+        until = self.row + max(rowspan, 1)
+        self.expire[until] = self.expire.get(until, 0) + colspan
+
+
 def group_logic_cols(etree_group):
     """
     计算行组各行的逻辑单元格数，统计rowspan和colspan
+    只统计行的直接子单元格，不进入嵌套表格
     """
     # 存储每行的物理/视觉列数
     logic_cols = []
-    rowspan_occupancy = []
-    for row_idx, row in enumerate(etree_group):
-        # 更新 rowspan 占用：上一行延续下来的，每列 -1；若减到0则释放
-        new_occupancy = [r - 1 for r in rowspan_occupancy if r - 1 > 0]
-        rowspan_occupancy = new_occupancy
-
-        cells = row.xpath(".//td | .//th")
-        for cell in cells:
-            cs = int(cell.get("colspan", "1")) or 1
-            rs = int(cell.get("rowspan", "1")) or 1
-            for i in range(cs):
-                rowspan_occupancy.append(rs)
-        logic_cols.append(len(rowspan_occupancy))
+    counter = LogicCols()
+    for row in etree_group:
+        counter.next_row()
+        for cell in row:
+            if cell.tag in ("td", "th"):
+                counter.add(_span(cell, "rowspan"), _span(cell, "colspan"))
+        logic_cols.append(counter.active)
     return logic_cols
 
 
@@ -49,59 +83,54 @@ def rows_occupied(rows):
     Returns:
         List[int]: occupied_counts[i] 表示第 i 行被 rowspan 占用的列数
     """
-    # active[col] 表示该列在当前行是否被前面的 rowspan 占用（值 > 0 表示是），
-    # 且值为包括当前行在内的剩余占用行数。
-    active = []
+    # until[col] 表示该列被前面的 rowspan 占用至哪一行(不含)，
+    # span_end[col] 为该列所在占用块的结束列，跳过占用列时整块跳过；
+    # 新单元格总是从空闲列开始，块内各列的 until 不小于块首列，整块跳过是安全的
+    # ends[行号] 为占用在该行结束的列数，occupied 为当前行被占用的列数
+    until = []
+    span_end = []
+    ends = {}
+    occupied = 0
     occupied_counts = []
 
-    for row in rows:
-        # Step 1: 计算当前行被前面 rowspan 占用的列数
-        occupied = sum(1 for x in active if x > 0)
+    for row_idx, row in enumerate(rows):
+        # Step 1: 释放在当前行结束的占用，得到当前行被占用的列数
+        occupied -= ends.pop(row_idx, 0)
         occupied_counts.append(occupied)
 
-        # Step 2: 构建当前行的占用状态（用于跳过列），并准备下一行的 active
-        current_occupied = [x > 0 for x in active]
-        next_active = [max(0, x - 1) for x in active]
-
-        # Step 3: 遍历当前行的所有单元格（<td> 或 <th>）
+        # Step 2: 遍历当前行的直接子单元格（<td> 或 <th>）
         col = 0
-        cells = [child for child in row if child.tag in ("td", "th")]
+        for cell in row:
+            if cell.tag not in ("td", "th"):
+                continue
 
-        for cell in cells:
             # 跳过被前面 rowspan 占用的列
-            while col < len(current_occupied) and current_occupied[col]:
-                col += 1
-
-            # 确保数组足够长以容纳当前单元格
-            while col >= len(current_occupied):
-                current_occupied.append(False)
-                next_active.append(0)
-
-            # 解析 rowspan 和 colspan，确保至少为 1
-            try:
-                rowspan = max(1, int(cell.get("rowspan", 1)))
-            except (ValueError, TypeError):
-                rowspan = 1
-            try:
-                colspan = max(1, int(cell.get("colspan", 1)))
-            except (ValueError, TypeError):
-                colspan = 1
+            while col < len(until) and until[col] > row_idx:
+                col = span_end[col]
+
+            rowspan = _span(cell, "rowspan")
+            colspan = _span(cell, "colspan")
 
             # 扩展数组以适应 colspan
-            while col + colspan > len(next_active):
-                next_active.append(0)
-                current_occupied.append(False)
+            for c in range(len(until), col + colspan):
+                until.append(0)
+                span_end.append(c + 1)
 
-            # 如果 rowspan > 1，则设置下一行开始的占用
+            # 如果 rowspan > 1，则从下一行开始占用 rowspan-1 行
             if rowspan > 1:
+                end = row_idx + rowspan
                 for c in range(col, col + colspan):
-                    next_active[c] = rowspan - 1  # 从下一行起还需占用 rowspan-1 行
+                    # 覆盖该列原有的占用
+                    if until[c] > row_idx:
+                        ends[until[c]] -= 1
+                        occupied -= 1
+                    until[c] = end
+                    span_end[c] = col + colspan
+                    ends[end] = ends.get(end, 0) + 1
+                    occupied += 1
 
             col += colspan
 
-        # 更新 active 为下一行准备
-        active = next_active
-
     return occupied_counts
 
 
@@ -157,3 +186,69 @@ def align_table(html_content: str) -> str:
 
     # 序列化回字符串；保留原始编码/声明
     return etree.tostring(doc, encoding="unicode", method="html")
+
+
+def cell_html(text: str) -> str:
+    """单元格文本转义为HTML，换行用标签代替保证内容为一行"""
+    return NEWLINE_RE.sub("<br>", escape(text, quote=False))
+
+
+def html_document(body: str) -> str:
+    """包装为完整HTML文档，与align_table的输出格式一致"""
+    return f"<html><body>{body.lstrip()}</body></html>"
+
+
+class TableWriter:
+    """
+    逐行生成并对齐HTML表格，结果与 align_table 一致，但无需重新解析HTML：
+      - 清理每行末尾的空白单元格
+      - 按 rowspan/colspan 统计各行逻辑列数，末尾补 <td></td> 至最大列数
+    与 ColumnWriter 接口一致，由表格生成函数按需选用
+    """
+
+    def __init__(self, caption: str):
+        self.caption = caption
+        self.rows: list[tuple[str, int]] = []  # (行内单元格HTML, 逻辑列数)
+        self.counter = LogicCols()
+
+    def add_row(self, cells: Sequence[Cell]):
+        self.counter.next_row()
+
+        # 清理末尾空白单元格
+        end = len(cells)
+        while end and not cells[end - 1][2].strip():
+            end -= 1
+
+        html = []
+        for i in range(end):
+            _, tag, text, rowspan, colspan = cells[i]
+            attrs = ""
+            if rowspan > 1:
+                attrs += f' rowspan="{rowspan}"'
+            if colspan > 1:
+                attrs += f' colspan="{colspan}"'
+            html.append(f"<{tag}{attrs}>{cell_html(text)}</{tag}>")
+            self.counter.add(rowspan, colspan)
+        self.rows.append(("".join(html), self.counter.active))
+
+    def getvalue(self, lead: Callable[[int], tuple[str, int]] | None = None) -> str:
+        """
+        :param lead: 可选，lead(行序号) 返回行首补充的空白单元格 (HTML, 单元格数)，
+                     用于行首列需全表扫描后才能确定的流式生成，整行空白的行不补充
+        :return: 表格HTML，没有行时返回空串
+        """
+        if not self.rows:
+            return ""
+
+        leads = [("", 0)] * len(self.rows)
+        if lead is not None:
+            leads = [
+                lead(i) if body else ("", 0) for i, (body, _) in enumerate(self.rows)
+            ]
+        max_cols = max(cols + n for (_, cols), (_, n) in zip(self.rows, leads))
+
+        html = [f"<table><caption>{escape(self.caption, quote=False)}</caption>"]
+        for (body, cols), (head, n) in zip(self.rows, leads):
+            html.append(f"<tr>{head}{body}{'<td></td>' * (max_cols - cols - n)}</tr>")
+        html.append("</table>")
+        return "".join(html)
@@ -0,0 +1,147 @@
+import re
+import hashlib
+from zipfile import ZipFile
+from openpyxl.xml.constants import IMAGE_NS
+from openpyxl.xml.functions import fromstring
+from openpyxl.drawing.spreadsheet_drawing import SpreadsheetDrawing
+from openpyxl.packaging.relationship import (
+    RelationshipList,
+    get_dependents,
+    get_rels_path,
+)
+
+# 图片文件头：(偏移, 特征字节, 格式)
+IMAGE_SIGNATURES = [
+    (0, b"\x89PNG\r\n\x1a\n", "png"),
+    (0, b"\xff\xd8\xff", "jpeg"),
+    (0, b"GIF87a", "gif"),
+    (0, b"GIF89a", "gif"),
+    (0, b"BM", "bmp"),
+    (0, b"II*\x00", "tiff"),
+    (0, b"MM\x00*", "tiff"),
+    (8, b"WEBP", "webp"),
+    (40, b" EMF", "emf"),
+    (0, b"\xd7\xcd\xc6\x9a", "wmf"),
+    (0, b"\x01\x00\x09\x00", "wmf"),
+    (0, b"\x00\x00\x01\x00", "ico"),
+]
+
+# 识别格式需读取的文件头字节数
+HEAD_BYTES = 64
+
+# 图片ID：内容SHA-256 + 格式
+IMAGE_ID_RE = re.compile(r"[0-9a-f]{64}\.[a-z]+")
+
+# 图片格式对应的响应类型
+IMAGE_TYPES = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "gif": "image/gif",
+    "bmp": "image/bmp",
+    "tiff": "image/tiff",
+    "webp": "image/webp",
+    "emf": "image/emf",
+    "wmf": "image/wmf",
+    "ico": "image/x-icon",
+}
+
+
+def image_format(head: bytes) -> str:
+    """按文件头识别图片格式，无需解码图片，无法识别时返回空串"""
+    for offset, magic, fmt in IMAGE_SIGNATURES:
+        if head[offset : offset + len(magic)] == magic:
+            return fmt
+    return ""
+
+
+def sheet_images(archive: ZipFile, rels: RelationshipList) -> dict:
+    """
+    sheet内单元格锚定的图片，只解析绘图XML，不读取图片内容
+    :param rels: sheet的关联关系
+    :return: (行, 列) -> 图片在压缩包内的路径，行列从1开始，同一单元格取最后一张
+    """
+    names = set(archive.namelist())
+    cells = {}
+    for rel in rels.find(SpreadsheetDrawing._rel_type):
+        if rel.target not in names:
+            continue
+        try:
+            drawing = SpreadsheetDrawing.from_tree(fromstring(archive.read(rel.target)))
+        except TypeError:
+            # 与openpyxl一致，不支持的绘图元素整体跳过
+            continue
+
+        rels_path = get_rels_path(rel.target)
+        if rels_path not in names:
+            continue
+        deps = get_dependents(archive, rels_path)
+        for blip in drawing._blip_rels:
+            if not hasattr(blip.anchor, "_from"):  # 只处理单元格锚点
+                continue
+            try:
+                dep = deps.get(blip.embed)
+            except KeyError:
+                continue
+            if dep.Type != IMAGE_NS or dep.target not in names:
+                continue
+            row = blip.anchor._from.row + 1  # 从 0 开始，要 +1
+            col = blip.anchor._from.col + 1
+            cells[(row, col)] = dep.target
+    return cells
+
+
+class ImageReader:
+    """
+    按需读取工作簿内的图片，同一图片文件只读取一次
+      - type：单元格内容为图片格式，只读取文件头
+      - blob：单元格内容为图片ID(内容SHA-256 + 格式)，内容相同的图片只保留一份，
+              由调用方写入图片存储后按ID访问
+    """
+
+    def __init__(self, mode: str = "type"):
+        if mode not in ("type", "blob"):
+            raise ValueError(f"unsupported image mode: {mode}")
+        self.mode = mode
+        self.texts: dict[str, str] = {}  # 压缩包内路径 -> 单元格内容
+        self.blobs: dict[str, bytes] = {}  # 图片ID -> 图片内容
+
+    def cell_text(self, archive: ZipFile, path: str) -> str:
+        """图片单元格的内容，无法识别的图片返回空串"""
+        text = self.texts.get(path)
+        if text is None:
+            text = self.texts[path] = self._read(archive, path)
+        return text
+
+    def _read(self, archive: ZipFile, path: str) -> str:
+        if self.mode == "type":
+            with archive.open(path) as f:
+                return image_format(f.read(HEAD_BYTES))
+
+        data = archive.read(path)
+        fmt = image_format(data[:HEAD_BYTES])
+        if not fmt:
+            return ""
+        image_id = f"{hashlib.sha256(data).hexdigest()}.{fmt}"
+        self.blobs.setdefault(image_id, data)
+        return image_id
+
+
+class SheetImages:
+    """单个sheet的图片单元格，内容在转换到该单元格时才读取"""
+
+    def __init__(self, archive: ZipFile, cells: dict, reader: ImageReader):
+        self.archive = archive
+        self.cells = cells
+        self.reader = reader
+
+    def __contains__(self, cell: tuple[int, int]) -> bool:
+        return cell in self.cells
+
+    def max_cell(self) -> tuple[int, int]:
+        """图片锚点的最大行列，没有图片时为 (0, 0)"""
+        max_row = max((row for row, _ in self.cells), default=0)
+        max_col = max((col for _, col in self.cells), default=0)
+        return max_row, max_col
+
+    def text(self, cell: tuple[int, int]) -> str:
+        return self.reader.cell_text(self.archive, self.cells[cell])
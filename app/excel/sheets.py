@@ -0,0 +1,70 @@
+from typing import Sequence
+from openpyxl.utils.cell import range_boundaries
+
+# 单元格区域：(起始列, 起始行, 结束列, 结束行)，从1开始且包含两端，结束为None表示不限
+Bounds = tuple[int, int, int | None, int | None]
+
+
+def parse_range(cell_range: str | None) -> Bounds | None:
+    """
+    解析A1表示法的单元格区域，如 A1:D20、B3、A:D(整列)、2:10(整行)
+    :return: 区域边界，未指定时返回None
+    """
+    if not cell_range or not cell_range.strip():
+        return None
+    try:
+        min_col, min_row, max_col, max_row = range_boundaries(
+            cell_range.strip().upper()
+        )
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"invalid range: {cell_range}") from e
+
+    # 兼容 D4:A1 这样反向书写的区域
+    if min_col and max_col and min_col > max_col:
+        min_col, max_col = max_col, min_col
+    if min_row and max_row and min_row > max_row:
+        min_row, max_row = max_row, min_row
+    return min_col or 1, min_row or 1, max_col, max_row
+
+
+def clip_bounds(bounds: Bounds | None, max_row: int, max_col: int):
+    """
+    区域与表格实际尺寸取交集
+    :return: (起始行, 结束行, 起始列, 结束列)，从1开始且包含两端，交集为空时结束小于起始
+    """
+    if bounds is None:
+        return 1, max_row, 1, max_col
+    min_col, min_row, end_col, end_row = bounds
+    if end_row is not None:
+        max_row = min(max_row, end_row)
+    if end_col is not None:
+        max_col = min(max_col, end_col)
+    return min_row, max_row, min_col, max_col
+
+
+def select_sheets(names: list[str], sheets: Sequence[str | int] | None) -> list[int]:
+    """
+    按名称或序号(从0开始)选择sheet，名称优先匹配，按请求顺序去重
+    :param names: 工作簿的全部sheet名称
+    :param sheets: 名称或序号列表，未指定时选择全部
+    :return: 选中sheet的序号列表
+    """
+    if not sheets:
+        return list(range(len(names)))
+
+    index = {name: idx for idx, name in enumerate(names)}
+    selected = []
+    for sheet in sheets:
+        idx = index.get(sheet) if isinstance(sheet, str) else None
+        if idx is None and str(sheet).strip().lstrip("-").isdigit():
+            idx = int(sheet)
+            # 支持负数序号，-1 为最后一个sheet
+            if idx < 0:
+                idx += len(names)
+            if not 0 <= idx < len(names):
+                idx = None
+        if idx is None:
+            raise ValueError(f"sheet not found: {sheet}")
+        if idx not in selected:
+            selected.append(idx)
+    return selected
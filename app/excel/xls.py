@@ -1,135 +1,175 @@
 import os
-import re
+import time
 import xlrd
 import subprocess
 from pathlib import Path
-from html import escape
+from .html import TableWriter, html_document
+from .sheets import clip_bounds, select_sheets
 
 
-def format_cell(cell):
+def format_cell(ctype, value):
     """避免整数变成小数，如 1.0 → 1"""
-    if cell.ctype == 2:  # number
-        val = cell.value
-        if val == int(val):
-            return str(int(val))
-        return str(val)
-
-    value = escape(str(cell.value)) if cell.value else ""
-    value = re.sub(r"\r\n|\r|\n", "<br>", value)
-    return value
-
-
-def find_trim_ranges(sheet):
+    if ctype == 2:  # number
+        if value == int(value):
+            return str(int(value))
+        return str(value)
+    return str(value) if value else ""
+
+
+def sheet_area(sheet, bounds=None):
+    """
+    选定区域与表格尺寸的交集
+    :return: (起始行, 结束行, 起始列, 结束列)，从0开始且不含结束
+    """
+    first_row, max_row, first_col, max_col = clip_bounds(
+        bounds, sheet.nrows, sheet.ncols
+    )
+    # 转为从0开始的下标，交集为空时结束等于起始
+    top, left = first_row - 1, first_col - 1
+    return top, max(max_row, top), left, max(max_col, left)
+
+
+def find_trim_ranges(sheet, area=None):
     """找到首部全空的行数与列数"""
-    nrows, ncols = sheet.nrows, sheet.ncols
-
-    # 前置空行
-    trim_top = 0
-    for r in range(nrows):
-        if all(sheet.cell(r, c).ctype == 0 for c in range(ncols)):
-            trim_top += 1
-        else:
-            break
-
-    # 前置空列
-    trim_left = 0
-    for c in range(ncols):
-        if all(sheet.cell(r, c).ctype == 0 for r in range(nrows)):
-            trim_left += 1
-        else:
-            break
+    top, nrows, left, ncols = area or (0, sheet.nrows, 0, sheet.ncols)
+
+    # 按行批量取单元格类型，空单元格类型为0，整行转bytes后去掉首部0即得该行首个非空列
+    trim_top = nrows
+    trim_left = ncols
+    for r in range(top, nrows):
+        types = bytes(sheet.row_types(r, left, ncols))
+        lead = left + len(types) - len(types.lstrip(b"\0"))
+        if lead == left + len(types):
+            continue
+        # 前置空行
+        if trim_top == nrows:
+            trim_top = r
+        # 前置空列：所有行首个非空列的最小值
+        trim_left = min(trim_left, lead)
+    if trim_top == nrows:
+        # 全表为空
+        trim_left = ncols
     return trim_top, trim_left
 
 
-def sheet_to_html(sheet_title, sheet, book):
-    """把单个 sheet 转 HTML 表格"""
+def merge_start_map(sheet, trim_top, trim_left, nrows=None, ncols=None):
+    """
+    合并区域起点索引：(行, 列) -> (rowspan, colspan)，坐标为去掉首部空行/列后的位置
+    同一起点有多个合并区域时取第一个
+    :param nrows, ncols: 选定区域的结束行/列(不含)，超出的部分截掉
+    """
+    starts = {}
+    for r1, r2, c1, c2 in sheet.merged_cells:
+        if nrows is not None:
+            r2, c2 = min(r2, nrows), min(c2, ncols)
+            if r1 >= r2 or c1 >= c2:
+                continue
+        if r2 <= trim_top or c2 <= trim_left:
+            continue
+        r1, r2 = max(0, r1 - trim_top), max(0, r2 - trim_top)
+        c1, c2 = max(0, c1 - trim_left), max(0, c2 - trim_left)
+        starts.setdefault((r1, c1), (r2 - r1, c2 - c1))
+    return starts
+
+
+def sheet_to_html(sheet_title, sheet, book, writer=TableWriter, bounds=None):
+    """
+    把单个 sheet 转 HTML 表格，生成时即完成列对齐
+    :param writer: 表格输出，默认HTML，ColumnWriter 输出列式结构
+    :param bounds: 只转换的单元格区域，None表示整表
+    """
 
     font_list = book.font_list  # 所有字体对象
     xf_list = book.xf_list  # 所有格式对象
+    # 各格式是否为粗体 → th
+    bold_xf = [font_list[xf.font_index].bold == 1 for xf in xf_list]
 
-    # 去掉首部空行/列
-    trim_top, trim_left = find_trim_ranges(sheet)
-    nrows = sheet.nrows - trim_top
-    ncols = sheet.ncols - trim_left
+    # 只转换选定区域，并去掉首部空行/列
+    area = sheet_area(sheet, bounds)
+    _, nrows, _, ncols = area
+    trim_top, trim_left = find_trim_ranges(sheet, area)
 
     # 处理合并单元格
-    merged = []
-    for r1, r2, c1, c2 in sheet.merged_cells:
-        if r2 <= trim_top or c2 <= trim_left:
-            continue
-        merged.append(
-            (
-                max(0, r1 - trim_top),
-                max(0, r2 - trim_top),
-                max(0, c1 - trim_left),
-                max(0, c2 - trim_left),
-            )
-        )
+    starts = merge_start_map(sheet, trim_top, trim_left, nrows, ncols)
 
     skip = set()
-    html = [f"<table><caption>{sheet_title}</caption>"]
-    for r in range(trim_top, sheet.nrows):
+    table = writer(sheet_title)
+    for r in range(trim_top, nrows):
         rr = r - trim_top
-        if rr >= nrows:
-            break
+        types = sheet.row_types(r)
+        values = sheet.row_values(r)
 
-        html.append("<tr>")
-        for c in range(trim_left, sheet.ncols):
+        row_cells = []
+        for c in range(trim_left, ncols):
             cc = c - trim_left
-            if cc >= ncols:
-                break
-
             if (rr, cc) in skip:
                 continue
 
             # 合并单元格处理
-            rowspan = 1
-            colspan = 1
-            for r1, r2, c1, c2 in merged:
-                if r1 == rr and c1 == cc:
-                    rowspan = r2 - r1
-                    colspan = c2 - c1
-                    for rr2 in range(r1, r2):
-                        for cc2 in range(c1, c2):
-                            if not (rr2 == r1 and cc2 == c1):
-                                skip.add((rr2, cc2))
-                    break
-
-            cell = sheet.cell(r, c)
-            text = format_cell(cell)
+            rowspan, colspan = starts.get((rr, cc), (1, 1))
+            if rowspan > 1 or colspan > 1:
+                for rr2 in range(rr, rr + rowspan):
+                    for cc2 in range(cc, cc + colspan):
+                        if not (rr2 == rr and cc2 == cc):
+                            skip.add((rr2, cc2))
+
+            text = format_cell(types[c], values[c])
 
             # 粗体 → th
-            xf = xf_list[cell.xf_index]
-            font = font_list[xf.font_index]
-            tag = "th" if font.bold == 1 else "td"
-
-            attrs = ""
-            if rowspan > 1:
-                attrs += f' rowspan="{rowspan}"'
-            if colspan > 1:
-                attrs += f' colspan="{colspan}"'
-            html.append(f"<{tag}{attrs}>{text}</{tag}>")
-        html.append("</tr>")
-    html.append("</table>")
-
-    # 只有<table></table>的空表
-    if len(html) == 2:
-        return ""
-    return "".join(html)
+            tag = "th" if bold_xf[sheet.cell_xf_index(r, c)] else "td"
+
+            row_cells.append((cc, tag, text, rowspan, colspan))
+        table.add_row(row_cells)
+
+    # 没有行的空表返回空值
+    return table.getvalue()
+
+
+def open_book(xls_path, **kwargs):
+    """按需加载sheet打开工作簿，支持文件路径或文件内容(bytes)"""
+    if isinstance(xls_path, (bytes, bytearray, memoryview)):
+        return xlrd.open_workbook(file_contents=xls_path, on_demand=True, **kwargs)
+    return xlrd.open_workbook(xls_path, on_demand=True, **kwargs)
+
+
+def xls_sheet_names(xls_path) -> list[str]:
+    """工作簿的全部sheet名称，不解析sheet"""
+    book = open_book(xls_path)
+    try:
+        return book.sheet_names()
+    finally:
+        book.release_resources()
+
+
+def xls_to_tables(xls_path, writer=TableWriter, sheets=None, bounds=None):
+    """
+    逐个sheet加载并转换表格，转换完即释放，未选中的sheet不解析
+    :param xls_path: 文件路径或文件内容(bytes)
+    :param writer: 表格输出，默认HTML，ColumnWriter 输出列式结构
+    :param sheets: 按名称或序号选择sheet，None表示全部
+    :param bounds: 只转换的单元格区域，None表示整表
+    :return: 各选中sheet的 (名称, 表格, 解析及转换耗时)，空表的表格为空值
+    """
+    book = open_book(xls_path, formatting_info=True)
+    try:
+        names = book.sheet_names()
+        tables = []
+        for idx in select_sheets(names, sheets):
+            start = time.perf_counter()
+            sheet = book.sheet_by_index(idx)
+            table = sheet_to_html(names[idx], sheet, book, writer, bounds)
+            book.unload_sheet(idx)
+            tables.append((names[idx], table, time.perf_counter() - start))
+    finally:
+        book.release_resources()
+    return tables
 
 
 def xls_to_html(xls_path):
-    """遍历所有 sheet，生成完整 HTML 字符串"""
-    book = xlrd.open_workbook(xls_path, formatting_info=True)
-
-    output = []
-    for i in range(book.nsheets):
-        sheet = book.sheet_by_index(i)
-        title = escape(sheet.name)
-        # 该 sheet 的 HTML 表格
-        output.append(sheet_to_html(title, sheet, book))
-
-    return "\n".join(output)
+    """遍历所有 sheet，生成列对齐的完整 HTML 文档"""
+    # 各 sheet 的 HTML 表格
+    output = [table for _, table, _ in xls_to_tables(xls_path)]
+    return html_document("\n".join(output))
 
 
 def xls_to_xlsx(xls_path, output_dir=None):
@@ -1,56 +1,27 @@
+import os
 import re
-import pandas as pd
+import time
 from io import StringIO
-from PIL import Image
 from io import BytesIO
-from typing import List, Dict, Optional
-from openpyxl import load_workbook
-from html import escape
-
-
-def read_xlsx_cols(
-    filepath: str,
-    columns: Optional[List[str]] = None,
-) -> Dict[str, List[Dict[str, str]]]:
-    """
-    从 Excel 文件中提取每个 sheet 的指定列内容，返回的字典包含每个 sheet
-    :param filepath: Excel 文件路径（支持 .xls 或 .xlsx）
-    :param columns: 需要提取的列名列表，如 ["题目","试题","选项个数","答案","解析","归属"]
-                    如果为 None，则提取所有列
-    :return: dict，key = sheet 名称, value = 该 sheet 的记录列表
-    """
-    xls = pd.ExcelFile(filepath)
-    sheet_data = {}
-    for sheet_name in xls.sheet_names:
-        df = pd.read_excel(xls, sheet_name=sheet_name, dtype=str)
-        if columns:
-            available_columns = [col for col in columns if col in df.columns]
-            df = df[available_columns]
-        records = df.fillna("").to_dict(orient="records")
-        sheet_data[sheet_name] = records
-
-    return sheet_data
-
-
-def get_images_map(sheet):
-    """获取 sheet 内所有图片的"""
-    img_map = {}
-    max_row = 0
-    max_col = 0
-    for img in getattr(sheet, "_images", []):
-        if hasattr(img.anchor, "_from"):  # 单元格锚点
-            row = img.anchor._from.row + 1  # 从 0 开始，要 +1
-            col = img.anchor._from.col + 1
-            max_row = max(max_row, row)
-            max_col = max(max_col, col)
-            img_map[(row, col)] = img._data()
-    return max_row, max_col, img_map
-
-
-def get_image_type(data):
-    """获取sheet内图片的类型"""
-    with Image.open(BytesIO(data)) as img:
-        return img.format.lower()  # 'JPEG', 'PNG' → 转小写
+from openpyxl.reader.excel import ExcelReader
+from openpyxl.styles.stylesheet import apply_stylesheet
+from openpyxl.utils.cell import coordinate_to_tuple
+from openpyxl.worksheet.worksheet import Worksheet
+from openpyxl.worksheet._reader import WorksheetReader
+from openpyxl.worksheet._read_only import ReadOnlyWorksheet
+from openpyxl.packaging.relationship import (
+    RelationshipList,
+    get_dependents,
+    get_rels_path,
+)
+from .html import TableWriter, html_document
+from .images import ImageReader, SheetImages, sheet_images
+from .sheets import Bounds, clip_bounds, select_sheets
+
+# sheet XML中的合并区域：<mergeCell ref="A1:C2"/>，可能带命名空间前缀
+MERGE_CELL_RE = re.compile(
+    rb'<(?:\w+:)?mergeCell\b[^>]*?\bref="([A-Z]+[0-9]+)(?::([A-Z]+[0-9]+))?"'
+)
 
 
 def is_empty_row(cols):
@@ -65,32 +36,34 @@ def is_empty_row(cols):
 
 
 def text_process(value_str):
-    """尝试转为数值并做有效位数处理,单元格内容的换行用标签代替"""
+    """尝试转为数值并做有效位数处理，返回单元格文本"""
     if value_str is None:
         return ""
-    value_str = escape(value_str)
     try:
         num = float(value_str)
         if num.is_integer():
-            return int(num)
+            return str(int(num))
         else:
-            return round(num, 4)
+            return str(round(num, 4))
     except (ValueError, TypeError):
-        # 使用换行标签保证内容为一行
-        return re.sub(r"\r\n|\r|\n", "<br>", value_str)
-
+        return value_str
 
-def sheet_to_html(sheet_name, sheet):
-    """高性能转换 Excel 表格为 HTML，支持合并单元格"""
-    html = []
-    html.append(f"<table><caption>{sheet_name}</caption>")
 
-    # ================= 预处理合并区域 =================
-    merged_ranges = list(sheet.merged_cells.ranges)
-    merge_start_map = {}  # 构建合并起点映射: (min_row, min_col) -> (rowspan, colspan)
-    merged_covered_set = set()  # 构建被覆盖单元格集合
-    for mr in merged_ranges:
-        min_r, min_c, max_r, max_c = mr.min_row, mr.min_col, mr.max_row, mr.max_col
+def build_merge_maps(bounds, area: Bounds | None = None):
+    """
+    构建合并区域索引
+    :param bounds: 合并区域 (min_col, min_row, max_col, max_row) 的迭代器
+    :param area: 只转换的单元格区域，合并区域按与其相交的部分处理
+    :return: (合并起点映射 (行, 列) -> (rowspan, colspan), 被覆盖的非起点单元格集合)
+    """
+    merge_start_map = {}
+    merged_covered_set = set()
+    for min_c, min_r, max_c, max_r in bounds:
+        if area is not None:
+            clipped = clip_merge((min_c, min_r, max_c, max_r), area)
+            if clipped is None:
+                continue
+            min_c, min_r, max_c, max_r = clipped
         rowspan = max_r - min_r + 1
         colspan = max_c - min_c + 1
         merge_start_map[(min_r, min_c)] = (rowspan, colspan)
@@ -100,24 +73,210 @@ def sheet_to_html(sheet_name, sheet):
             for c in range(min_c, max_c + 1):
                 if (r, c) != (min_r, min_c):
                     merged_covered_set.add((r, c))
+    return merge_start_map, merged_covered_set
+
+
+def clip_merge(merge, area: Bounds):
+    """合并区域与选定区域的交集，不相交或被截成单个单元格时返回None"""
+    min_c, min_r, max_c, max_r = merge
+    area_min_c, area_min_r, area_max_c, area_max_r = area
+    clipped = (
+        max(min_c, area_min_c),
+        max(min_r, area_min_r),
+        max_c if area_max_c is None else min(max_c, area_max_c),
+        max_r if area_max_r is None else min(max_r, area_max_r),
+    )
+    if clipped == merge:
+        return merge
+    min_c, min_r, max_c, max_r = clipped
+    if min_c > max_c or min_r > max_r or (min_c == max_c and min_r == max_r):
+        return None
+    return clipped
+
+
+def scan_merged_bounds(sheet, chunk_size=1024 * 1024):
+    """
+    只读模式下获取合并区域：openpyxl只读sheet不提供merged_cells，
+    且合并区域位于sheetData之后，这里按块解压扫描XML文本，不构建单元格对象
+    :return: 合并区域 (min_col, min_row, max_col, max_row) 列表
+    """
+    bounds = []
+    tail = b""
+    with sheet.parent._archive.open(sheet._worksheet_path) as src:
+        while chunk := src.read(chunk_size):
+            buf = tail + chunk
+            end = 0
+            for m in MERGE_CELL_RE.finditer(buf):
+                min_r, min_c = coordinate_to_tuple(m.group(1).decode())
+                max_r, max_c = coordinate_to_tuple((m.group(2) or m.group(1)).decode())
+                bounds.append((min_c, min_r, max_c, max_r))
+                end = m.end()
+            # 保留末尾可能被截断的标签
+            tail = buf[max(end, len(buf) - 256) :]
+    return bounds
+
+
+def sheet_to_html_stream(sheet_name, sheet, writer=TableWriter, bounds=None):
+    """
+    只读模式(read_only)流式转换大表格，逐行解析，不构建整表的Cell对象
+    已转换的行仍暂存在writer中(起始列需全表扫描后才能确定)，内存占用与输出大小成正比
+    与sheet_to_html输出一致，只读模式无法读取图片，含图片的sheet由调用方改用完整解析
+    :param bounds: 只转换的单元格区域，区域之后的行不再解析
+    """
+    merge_start_map, merged_covered_set = build_merge_maps(
+        scan_merged_bounds(sheet), bounds
+    )
+    row_merge_cols = {}  # 各行的合并起点列
+    for r, c in merge_start_map:
+        row_merge_cols.setdefault(r, []).append(c)
+    last_merge_row = max(row_merge_cols, default=0)
+
+    # 起始列需全表扫描后才能确定，先按行写入从该行首个有效列开始的单元格，
+    # 行首到起始列之间只可能是空白或被合并覆盖的单元格，输出时再补齐
+    table = writer(sheet_name)
+    leads = []  # (行号, 首个有效列, 行首的粗体空白列)
+    start_col = min((c for _, c in merge_start_map), default=999999)
+    first_col = bounds[0] if bounds else 1
+
+    for row_idx, cells in iter_stream_rows(sheet, last_merge_row, bounds):
+        item = stream_row(
+            row_idx,
+            cells,
+            merge_start_map,
+            merged_covered_set,
+            row_merge_cols,
+            first_col,
+        )
+        if item:
+            min_col, bold_cols, row_cells = item
+            start_col = min(start_col, min_col)
+            leads.append((row_idx, min_col, bold_cols))
+            table.add_row(row_cells)
 
-    # 获取图片映射及其单元格锚点
-    max_img_row, max_img_col, img_map = get_images_map(sheet)  # 保持原逻辑
+    def lead(i):
+        row_idx, min_col, bold_cols = leads[i]
+        html = []
+        for col_idx in range(start_col, min_col):
+            if (row_idx, col_idx) in merged_covered_set:
+                continue
+            html.append("<th></th>" if col_idx in bold_cols else "<td></td>")
+        return "".join(html), len(html)
+
+    return table.getvalue(lead)
+
+
+def iter_stream_rows(sheet, last_row, bounds=None):
+    """逐行产出(行号, 单元格)，数据行之后仍有合并起点时补充空行"""
+    # 声明的尺寸可能不准，按实际数据行列遍历
+    sheet.reset_dimensions()
+    min_col, min_row, max_col, max_row = bounds or (1, 1, None, None)
+    rows = sheet.iter_rows(
+        min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col
+    )
+    row_idx = min_row - 1
+    for row_idx, cells in enumerate(rows, min_row):
+        yield row_idx, cells
+    for row_idx in range(row_idx + 1, last_row + 1):
+        yield row_idx, ()
+
+
+def stream_row(
+    row_idx,
+    cells,
+    merge_start_map,
+    merged_covered_set,
+    row_merge_cols,
+    first_col=1,
+):
+    """
+    只读模式下转换一行
+    :param first_col: cells 首个单元格的列号
+    :return: (首个有效列, 首个有效列之前的粗体列, 从首个有效列开始的单元格)，整行空返回None
+    """
+    # 找到该行最小/最大有效列（有值 或 是合并起点）
+    merge_cols = row_merge_cols.get(row_idx)
+    min_col = min(merge_cols) if merge_cols else None
+    max_col_in_row = max(merge_cols) if merge_cols else 0
+    for col_idx, cell in enumerate(cells, first_col):
+        if cell.value not in (None, ""):
+            if min_col is None or col_idx < min_col:
+                min_col = col_idx
+            if col_idx > max_col_in_row:
+                max_col_in_row = col_idx
+
+    # 整行空，跳过
+    if min_col is None:
+        return None
+
+    end_col = first_col + len(cells)  # cells 之后的列号
+    bold_cols = {
+        col_idx
+        for col_idx in range(first_col, min(min_col, end_col))
+        if cells[col_idx - first_col].font is not None
+        and cells[col_idx - first_col].font.bold
+    }
+
+    row_cells = []
+    col_idx = min_col
+    while col_idx <= max_col_in_row:
+        # 跳过被合并覆盖的单元格
+        if (row_idx, col_idx) in merged_covered_set:
+            col_idx += 1
+            continue
+
+        rowspan, colspan = merge_start_map.get((row_idx, col_idx), (1, 1))
+
+        # 行内缺失的单元格(只读模式不补齐)视为空白
+        cell = cells[col_idx - first_col] if col_idx < end_col else None
+        value = str(cell.value) if cell is not None and cell.value else ""
+        bold = cell is not None and cell.font is not None and cell.font.bold
+        # xlsx中的粗体单元格视为HTML中的表头
+        tag = "th" if bold else "td"
+        row_cells.append((col_idx, tag, text_process(value), rowspan, colspan))
+
+        # 跳过跨列
+        col_idx += colspan
+    return min_col, bold_cols, row_cells
+
+
+def sheet_to_html(sheet_name, sheet, writer=TableWriter, bounds=None, images=None):
+    """
+    高性能转换 Excel 表格为 HTML，支持合并单元格，生成时即完成列对齐
+    :param writer: 表格输出，默认HTML，ColumnWriter 输出列式结构
+    :param bounds: 只转换的单元格区域，None表示整表
+    :param images: 单元格锚定的图片(SheetImages)，None表示不输出图片
+    """
+    table = writer(sheet_name)
+
+    # ================= 预处理合并区域 =================
+    merge_start_map, merged_covered_set = build_merge_maps(
+        (mr.bounds for mr in sheet.merged_cells.ranges), bounds
+    )
+
+    # 图片单元格锚点，图片内容在输出到该单元格时才读取
+    img_map = images if images is not None else {}
+    max_img_row, max_img_col = images.max_cell() if images is not None else (0, 0)
 
     # 结合图像锚点单元格计算最大的行列
     max_row = max(sheet.max_row, max_img_row)
     max_col = max(sheet.max_column, max_img_col)
+    # 只遍历选定区域
+    first_row, max_row, first_col, max_col = clip_bounds(bounds, max_row, max_col)
 
     # 计算全表的起始列号
     start_col = 999999  # 表格开头空白的列
     for row_idx, row in enumerate(  # 使用 iter_rows 批量读取，提升性能
         sheet.iter_rows(
-            min_row=1, max_row=max_row, min_col=1, max_col=max_col, values_only=False
+            min_row=first_row,
+            max_row=max_row,
+            min_col=first_col,
+            max_col=max_col,
+            values_only=False,
         ),
-        1,
+        first_row,
     ):
         cells = list(row)  # 这行所有单元格对象
-        for col_idx, cell in enumerate(cells, 1):
+        for col_idx, cell in enumerate(cells, first_col):
             # 检查是否是合并起点（用预构建的 map）
             is_merged_start = (row_idx, col_idx) in merge_start_map
             # 检查是否有值
@@ -128,15 +287,19 @@ def sheet_to_html(sheet_name, sheet):
 
     for row_idx, row in enumerate(  # 使用 iter_rows 批量读取，提升性能
         sheet.iter_rows(
-            min_row=1, max_row=max_row, min_col=1, max_col=max_col, values_only=False
+            min_row=first_row,
+            max_row=max_row,
+            min_col=first_col,
+            max_col=max_col,
+            values_only=False,
         ),
-        1,
+        first_row,
     ):
         cells = list(row)  # 这行所有单元格对象
         # 找到该行最小/最大有效列（有值 或 是合并起点）
         min_col = None
         max_col_in_row = 0
-        for col_idx, cell in enumerate(cells, 1):
+        for col_idx, cell in enumerate(cells, first_col):
             # 检查是否是合并起点（用预构建的 map）
             is_merged_start = (row_idx, col_idx) in merge_start_map
             # 检查是否有值
@@ -153,7 +316,7 @@ def sheet_to_html(sheet_name, sheet):
         if min_col is None:
             continue
 
-        html.append("<tr>")
+        row_cells = []
         col_idx = start_col
         while col_idx <= max_col_in_row:
             # 跳过被合并覆盖的单元格
@@ -161,7 +324,7 @@ def sheet_to_html(sheet_name, sheet):
                 col_idx += 1
                 continue
 
-            cell = cells[col_idx - 1]  # 因为 cells 是 0-based
+            cell = cells[col_idx - first_col]  # cells 从 first_col 列开始
 
             # 获取 rowspan/colspan（从预构建 map 中取）
             if (row_idx, col_idx) in merge_start_map:
@@ -169,49 +332,197 @@ def sheet_to_html(sheet_name, sheet):
             else:
                 rowspan, colspan = 1, 1
 
-            # 构建属性
-            attrs = []
-            if rowspan > 1:
-                attrs.append(f'rowspan="{rowspan}"')
-            if colspan > 1:
-                attrs.append(f'colspan="{colspan}"')
-            attr_str = " " + " ".join(attrs) if attrs else ""
-
             # 获取值
             if cell.value:
                 value = str(cell.value)
             elif (row_idx, col_idx) in img_map:  # 图片处理
-                value = get_image_type(img_map[(row_idx, col_idx)])
-                print(
-                    "cell image:", (row_idx, col_idx), len(img_map[(row_idx, col_idx)])
-                )
+                value = img_map.text((row_idx, col_idx))
             else:
                 value = ""
 
-            if cell.font.bold:  # xlsx中的粗体单元格视为HTML中的表头
-                html.append(f"<th{attr_str}>{text_process(value)}</th>")
-            else:
-                html.append(f"<td{attr_str}>{text_process(value)}</td>")
+            # xlsx中的粗体单元格视为HTML中的表头
+            tag = "th" if cell.font.bold else "td"
+            row_cells.append((col_idx, tag, text_process(value), rowspan, colspan))
 
             # 跳过跨列
             col_idx += colspan
-        html.append("</tr>")
-    html.append("</table>\n")
+        table.add_row(row_cells)
 
-    # 只有<table></table>的空表
-    if len(html) == 2:
-        return ""
-    return "".join(html)
+    # 没有行的空表返回空值
+    return table.getvalue()
+
+
+class SheetsReader(ExcelReader):
+    """
+    按需加载sheet的工作簿读取：共享字符串与样式只读一次，
+    选中的sheet逐个解析，未选中的sheet不读取XML
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.images: dict[str, dict] = {}  # sheet名称 -> 单元格锚定的图片路径
+
+    def open(self):
+        """读取工作簿公共部分，不解析sheet"""
+        self.read_manifest()
+        self.read_strings()
+        self.read_workbook()
+        self.read_theme()
+        apply_stylesheet(self.archive, self.wb)
+        self.sheets = self.parser.sheets
+        return self
+
+    def sheet_names(self) -> list[str]:
+        return [sheet.name for sheet in self.sheets]
+
+    def read_worksheets(self):
+        """
+        只解析单元格与合并区域，批注、表格、透视表、图表不影响转换，不再读取；
+        openpyxl会读出全部图片并逐个用PIL打开，这里只记录图片锚点，转换时按需读取
+        """
+        if self.read_only:
+            return super().read_worksheets()
+
+        for sheet, rel in self.parser.find_sheets():
+            if rel.target not in self.valid_files:
+                continue
+            if "chartsheet" in rel.Type:
+                self.read_chartsheet(sheet, rel)
+                continue
+
+            rels = self.sheet_rels(rel)
+            ws = self.wb.create_sheet(sheet.name)
+            ws._rels = rels
+            with self.archive.open(rel.target) as fh:
+                ws_parser = WorksheetReader(
+                    ws, fh, self.shared_strings, self.data_only, self.rich_text
+                )
+                ws_parser.bind_all()
+            ws.sheet_state = sheet.state
+            self.images[sheet.name] = sheet_images(self.archive, rels)
+
+    def sheet_rels(self, rel) -> RelationshipList:
+        """sheet的关联关系(绘图、批注等)"""
+        rels_path = get_rels_path(rel.target)
+        if rels_path not in self.valid_files:
+            return RelationshipList()
+        return get_dependents(self.archive, rels_path)
+
+    def has_images(self, idx: int) -> bool:
+        """第idx个sheet是否有单元格锚定的图片，只解析绘图XML，不解析单元格"""
+        sheet = self.sheets[idx]
+        if not sheet.id or sheet.id not in self.parser.rels:
+            return False
+        rel = self.parser.rels[sheet.id]
+        if rel.target not in self.valid_files or "chartsheet" in rel.Type:
+            return False
+        return bool(sheet_images(self.archive, self.sheet_rels(rel)))
+
+    def load(self, idx: int):
+        """解析第idx个sheet，非工作表(如图表页)返回None"""
+        loaded = len(self.wb._sheets)
+        self.parser.sheets = [self.sheets[idx]]
+        self.read_worksheets()
+        if len(self.wb._sheets) == loaded:
+            return None
+        sheet = self.wb._sheets[-1]
+        if not isinstance(sheet, (Worksheet, ReadOnlyWorksheet)):
+            self.unload(sheet)
+            return None
+        return sheet
+
+    def unload(self, sheet):
+        """释放已转换sheet的单元格"""
+        self.wb._sheets.remove(sheet)
+        self.images.pop(sheet.title, None)
+
+    def close(self):
+        self.archive.close()
+
+
+def xlsx_source(xlsx_path):
+    """
+    文件路径或内存字节转为 openpyxl 可打开的对象
+    :return: (文件路径或BytesIO, 文件字节数)
+    """
+    if isinstance(xlsx_path, (bytes, bytearray, memoryview)):
+        # BytesIO 直接引用 bytes 缓冲区，只读时不复制
+        return BytesIO(xlsx_path), len(xlsx_path)
+    return xlsx_path, os.path.getsize(xlsx_path)
+
+
+def xlsx_sheet_names(xlsx_path) -> list[str]:
+    """工作簿的全部sheet名称，不解析sheet"""
+    reader = SheetsReader(xlsx_source(xlsx_path)[0], read_only=True)
+    try:
+        reader.read_manifest()
+        reader.read_workbook()
+        return [sheet.name for sheet in reader.parser.sheets]
+    finally:
+        reader.close()
+
+
+def xlsx_to_tables(
+    xlsx_path,
+    stream_min_bytes=None,
+    writer=TableWriter,
+    sheets=None,
+    bounds=None,
+    images=None,
+):
+    """
+    逐个sheet加载并转换表格，转换完即释放，未选中的sheet不解析
+    :param xlsx_path: 文件路径或文件内容(bytes)
+    :param stream_min_bytes: 文件不小于该字节数时使用只读流式解析，None表示不启用；
+                             含单元格图片的sheet仍完整解析，保证图片不丢失
+    :param writer: 表格输出，默认HTML，ColumnWriter 输出列式结构
+    :param sheets: 按名称或序号选择sheet，None表示全部
+    :param bounds: 只转换的单元格区域，None表示整表
+    :param images: 图片读取(ImageReader)，默认单元格内容为图片格式
+    :return: 各选中sheet的 (名称, 表格, 解析及转换耗时)，空表的表格为空值
+    """
+    images = images or ImageReader()
+    source, size = xlsx_source(xlsx_path)
+    stream = stream_min_bytes is not None and size >= stream_min_bytes
+    tables = []
+    reader = SheetsReader(source, read_only=stream, data_only=True).open()
+    full = None  # 流式解析时含图片的sheet改用的完整解析读取
+    try:
+        names = reader.sheet_names()
+        for idx in select_sheets(names, sheets):
+            start = time.perf_counter()
+            sheet_reader = reader
+            if stream and reader.has_images(idx):
+                if full is None:
+                    full = SheetsReader(xlsx_source(xlsx_path)[0], data_only=True)
+                    full.open()
+                sheet_reader = full
+            sheet = sheet_reader.load(idx)
+            table = None
+            if sheet is not None and sheet_reader.read_only:
+                table = sheet_to_html_stream(names[idx], sheet, writer, bounds)
+            elif sheet is not None:
+                paths = sheet_reader.images[names[idx]]
+                cells = SheetImages(sheet_reader.archive, paths, images)
+                table = sheet_to_html(names[idx], sheet, writer, bounds, cells)
+            if sheet is not None:
+                sheet_reader.unload(sheet)
+            tables.append((names[idx], table, time.perf_counter() - start))
+    finally:
+        reader.close()
+        if full is not None:
+            full.close()
+    return tables
 
 
-def xlsx_to_html(xlsx_path):
+def xlsx_to_html(xlsx_path, stream_min_bytes=None):
     """
-    将Excel表格转为HTML格式
+    将Excel表格转为列对齐的HTML文档
+    :param stream_min_bytes: 文件不小于该字节数时使用只读流式解析，None表示不启用
     """
     full_html = StringIO()
-    wb = load_workbook(xlsx_path, data_only=True)
-    for idx, sheet in enumerate(wb.worksheets):
-        # 转成HTML格式表格
-        html_cnt = sheet_to_html(sheet.title, sheet)
-        full_html.write(html_cnt)
-    return full_html.getvalue()
+    for _, html_cnt, _ in xlsx_to_tables(xlsx_path, stream_min_bytes):
+        if html_cnt:
+            full_html.write(html_cnt)
+            full_html.write("\n")
+    return html_document(full_html.getvalue())
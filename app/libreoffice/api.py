@@ -1,7 +1,8 @@
 from fastapi.responses import Response
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Header, Query
 
-from .convert_pdf import to_pdf
+from .client import QUEUE_TIMEOUT
+from .convert_pdf import to_pdf, queue_stats
 
 
 # 初始化业务模块路由
@@ -23,6 +24,8 @@ async def convert_pdf(
     file: UploadFile = File(...),
 ):
     pdf_bytes, msg = await to_pdf(file)
+    if msg.startswith(QUEUE_TIMEOUT):
+        raise HTTPException(503, "Converter busy, retry later")
     if msg:
         raise HTTPException(502, "Failed to fetch PDF")
 
@@ -33,3 +36,11 @@ async def convert_pdf(
             "Content-Disposition": "inline; filename=sample.pdf"  # inline=浏览器预览，attachment=强制下载
         },
     )
+
+
+@router.get(
+    "/convert_pdf/stats",
+    summary="PDF转换队列状态：排队深度、在途数与排队时长",
+)
+async def convert_pdf_stats():
+    return {"data": queue_stats(), "msg": "ok", "code": 1}
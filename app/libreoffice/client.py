@@ -1,28 +1,117 @@
-import io
+import time
+import asyncio
 import httpx
 import uuid
 from fastapi import UploadFile
 from typing import Optional, Tuple
-from app.utils.log import log
+from app.utils.log import REQUEST_ID_HEADER, log, request_id
+from app.utils.metrics import STAGE_SECONDS, upstream
+
+# 排队超时的错误信息前缀，接口层据此返回503
+QUEUE_TIMEOUT = "queue timeout"
 
 
 # Gotenberg容器LibreOffice格式转换接口调用封装类
 class LOClient:
-    def __init__(self, addr: str, timeout: float = 10.0):
+    def __init__(
+        self,
+        addr: str,
+        timeout: float = 10.0,
+        convert_timeout: float = 60.0,
+        max_connections: int = 20,
+        max_inflight: int = 4,
+        queue_timeout: float = 30.0,
+    ):
         self.addr = addr.rstrip("/")
         self.timeout = timeout
+        self.convert_timeout = convert_timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+        )
+        self.client: httpx.AsyncClient | None = None
+
+        # 准入控制：限制同时转换数，其余请求排队等待
+        self.max_inflight = max_inflight
+        self.queue_timeout = queue_timeout
+        self.semaphore = asyncio.Semaphore(max_inflight)
+        self.inflight = 0  # 正在转换的数量
+        self.waiting = 0  # 排队等待的数量
+        self.admitted = 0  # 累计放行数
+        self.rejected = 0  # 累计排队超时数
+        self.wait_total = 0.0  # 累计排队时长(秒)
+        self.wait_max = 0.0  # 最长排队时长(秒)
 
     async def __aenter__(self):
-        """async with 开始时申请资源"""
-        self.client = httpx.AsyncClient(timeout=httpx.Timeout(self.timeout))
+        """async with 开始时申请资源(进程内共享的连接池)"""
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.timeout),
+            limits=self.limits,
+        )
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """async with 结束时释放资源"""
         await self.client.aclose()
+        self.client = None
+
+    def stats(self) -> dict:
+        """准入队列的状态统计"""
+        return {
+            "max_inflight": self.max_inflight,
+            "inflight": self.inflight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "wait_avg": self.wait_total / self.admitted if self.admitted else 0.0,
+            "wait_max": self.wait_max,
+        }
+
+    async def admit(self) -> str | None:
+        """排队获取转换名额，超过排队时限返回错误信息"""
+        start = time.monotonic()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return f"{QUEUE_TIMEOUT}: {self.queue_timeout}s, waiting: {self.waiting}"
+        finally:
+            self.waiting -= 1
+
+        waited = time.monotonic() - start
+        STAGE_SECONDS.observe("gotenberg_queue", value=waited)
+        self.admitted += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        self.inflight += 1
+        return None
+
+    def release(self):
+        """归还转换名额"""
+        self.inflight -= 1
+        self.semaphore.release()
+
+    @staticmethod
+    def trace_headers() -> dict[str, str]:
+        """当前请求的关联ID，Gotenberg以Gotenberg-Trace头记录到其日志中"""
+        rid = request_id.get()
+        if rid == "-":
+            return {}
+        return {"Gotenberg-Trace": rid, REQUEST_ID_HEADER: rid}
 
     async def convert_pdf(self, file: UploadFile) -> tuple[bytes | None, str]:
         """代理上传文档到libreoffice转为PDF格式"""
+        msg = await self.admit()
+        if msg:
+            log.warning(f"{msg} {file.filename}")
+            return None, msg
+        try:
+            return await self._convert_pdf(file)
+        finally:
+            self.release()
+
+    async def _convert_pdf(self, file: UploadFile) -> tuple[bytes | None, str]:
         files = {
             "file": (
                 str(uuid.uuid4().hex) + ".pdf",
@@ -32,26 +121,30 @@ class LOClient:
         }
         try:
             # 异步httpx流式请求
-            async with self.client.stream(
-                "POST",
-                url=f"{self.addr}/forms/libreoffice/convert",
-                files=files,
-                timeout=60.0,
-            ) as resp:
-                status = resp.status_code
-                if status != 200:
-                    detail = await resp.aread()
-                    msg = detail.decode("utf-8", errors="replace")
-                    msg = f"convert failed: {status} {file.filename} {msg}"
-                    log.warning(msg)
-                    return None, msg
-
-                # 流式读取 PDF 内容 100KB/chunk
-                pdf_bytes = bytearray()
-                async for chunk in resp.aiter_bytes(chunk_size=102400):
-                    if chunk:
-                        pdf_bytes.extend(chunk)
-                return bytes(pdf_bytes), ""
+            with upstream("gotenberg", "convert", file.size) as call:
+                async with self.client.stream(
+                    "POST",
+                    url=f"{self.addr}/forms/libreoffice/convert",
+                    files=files,
+                    headers=self.trace_headers(),
+                    timeout=self.convert_timeout,
+                ) as resp:
+                    status = call["status"] = resp.status_code
+                    if status != 200:
+                        detail = await resp.aread()
+                        call["received"] = len(detail)
+                        msg = detail.decode("utf-8", errors="replace")
+                        msg = f"convert failed: {status} {file.filename} {msg}"
+                        log.warning(msg)
+                        return None, msg
+
+                    # 流式读取 PDF 内容 100KB/chunk
+                    pdf_bytes = bytearray()
+                    async for chunk in resp.aiter_bytes(chunk_size=102400):
+                        if chunk:
+                            pdf_bytes.extend(chunk)
+                    call["received"] = len(pdf_bytes)
+                    return bytes(pdf_bytes), ""
 
         except httpx.TimeoutException as e:
             msg = f"timeout : {e} {file.filename}"
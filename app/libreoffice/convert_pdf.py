@@ -1,7 +1,24 @@
 from .client import LOClient
 from app.settings import cfg
+from app.utils.metrics import registry
+
+# 进程内共享的Gotenberg客户端(连接池+准入队列)，由FastAPI lifespan负责开启和关闭
+lo_client = LOClient(
+    cfg.office_url,
+    convert_timeout=cfg.office_convert_timeout,
+    max_connections=cfg.office_max_connections,
+    max_inflight=cfg.office_max_inflight,
+    queue_timeout=cfg.office_queue_timeout,
+)
 
 
 async def to_pdf(file):
-    async with LOClient(cfg.office_url) as client:
-        return await client.convert_pdf(file)
+    return await lo_client.convert_pdf(file)
+
+
+def queue_stats() -> dict:
+    """转换队列深度与排队时长"""
+    return lo_client.stats()
+
+
+registry.stats("gotenberg_queue", "PDF转换准入队列状态", queue_stats)
@@ -1,17 +1,53 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import Response
 
 # 引入业务模块进行功能路由注册
 from .mineru.api import router as mrouter
 from .libreoffice.api import router as lorouter
 from .excel.api import router as erouter
 from .markdown.api import router as mdrouter
+from .mineru.parse_file import mu_client, parse_cache
+from .libreoffice.convert_pdf import lo_client
+from .mineru.jobs import job_store, job_poller
+from .excel.convert_html import excel_pool, image_store, result_cache
+from .utils.resultstore import result_store
+from .utils.autoid import allocator
+from .utils.metrics import CONTENT_TYPE, MetricsMiddleware, registry
+from .utils.log import RequestIdMiddleware
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """进程级共享资源：worker启动时创建，退出时释放"""
+    await asyncio.to_thread(parse_cache.load)
+    await asyncio.to_thread(image_store.load)
+    await asyncio.to_thread(result_cache.load)
+    await asyncio.to_thread(job_store.open)
+    await asyncio.to_thread(allocator)
+    try:
+        async with registry, mu_client, lo_client, job_poller, excel_pool, result_store:
+            yield
+    finally:
+        job_store.close()
+
 
 # 添加业务模块路由,
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.include_router(mrouter, prefix="/api", tags=["MinerU"])
 app.include_router(lorouter, prefix="/api", tags=["LibreOffice"])
 app.include_router(erouter, prefix="/api/excel", tags=["Excel"])
 app.include_router(mdrouter, prefix="/api/md", tags=["markdown"])
+app.add_middleware(MetricsMiddleware)
+# 最外层：请求ID在整个处理过程(含指标统计)中可见
+app.add_middleware(RequestIdMiddleware)
+
+
+@app.get("/metrics", summary="Prometheus格式的监控指标(合并全部worker)")
+async def metrics():
+    return Response(content=await registry.export(), media_type=CONTENT_TYPE)
+
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,6 +1,7 @@
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Header, Query
 from . import convert_tmp as ch
+from app.utils.resultstore import content_headers
 
 
 # 初始化业务模块路由
@@ -21,10 +22,15 @@ async def check_uid(x_user_id: str | None = Header(None)):
 async def upload(
     files: list[UploadFile] = File(...),
     user_id: str = Depends(check_uid),
+    check_utf8: bool = Query(
+        True,
+        description="校验文件为UTF-8文本，不合法的文件不暂存；"
+        "不校验时，按文本返回内容的接口将非法字节替换为U+FFFD",
+    ),
 ):
-    cnt, msg = await ch.to_tmps(files, user_id)
+    cnt, msg = await ch.to_tmps(files, user_id, check_utf8)
     if msg:
-        return {"data": "", "msg": msg, "code": -1}
+        return {"data": cnt, "msg": msg, "code": -1}
     return {"data": cnt, "msg": "ok", "code": 1}
 
 
@@ -35,7 +41,17 @@ async def upload(
 async def get_content(
     file_id: int = Query(..., description="文件ID"),
     user_id: str = Depends(check_uid),
+    raw: bool = Query(
+        False, description="直接流式返回原始内容，文件ID、文件名等元数据在响应头"
+    ),
 ):
+    if raw:
+        result, msg = await ch.tmp_content_stream(file_id, user_id)
+        if msg:
+            return {"data": "", "msg": msg, "code": -1}
+        meta, chunks = result
+        return StreamingResponse(chunks, headers=content_headers(meta))
+
     cnt, msg = await ch.tmp_content(file_id, user_id)
     if msg:
         return {"data": "", "msg": msg, "code": -1}
@@ -49,7 +65,12 @@ async def get_content(
 async def get_contents(
     file_ids: list[int] = Query(..., description="文件ID列表"),
     user_id: str = Depends(check_uid),
+    raw: bool = Query(False, description="流式返回NDJSON，每个文件一行"),
 ):
+    if raw:
+        lines = ch.tmp_contents_ndjson(file_ids, user_id)
+        return StreamingResponse(lines, media_type="application/x-ndjson")
+
     cnt, msg = await ch.tmp_contents(file_ids, user_id)
     if msg:
         return {"data": cnt, "msg": msg, "code": -1}
@@ -1,41 +1,67 @@
-import os
-from pathlib import Path
-import aiofiles.os as aos
-import aiofiles.ospath as aop
+import codecs
+import asyncio
+from collections.abc import AsyncIterable, AsyncIterator
+from app.settings import cfg
+from app.utils.log import log
 from app.utils.batch import batch_async
-from app.utils import aiofile as af
-from app.utils.autoid import next_id
+from app.utils.autoid import next_ids_async
+from app.utils.multipart import upload_chunks
+from app.utils.resultstore import result_store
 
+# 结果存储中md内容的类别及直接返回时的内容类型
+KIND = "md"
+CONTENT_TYPE = "text/markdown; charset=utf-8"
 
-def extract_filename(fcnt):
+
+async def utf8_chunks(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """原样产出分块内容，同时增量校验为UTF-8文本(多字节字符可跨块)，不合法时抛出异常"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    async for chunk in chunks:
+        decoder.decode(chunk)
+        yield chunk
+    decoder.decode(b"", final=True)
+
+
+async def to_tmps(files, user_id, check_utf8: bool = True) -> tuple[dict, str]:
     """
-    提取第一行为文件名,后续为内容
-    fcnt格式：filename\ncontent
+    批量暂存上传的md文件：多个文件并发写入(并发数受限)，内容按块原样写入，不解码不拼接
+    :param check_utf8: 写入时校验为UTF-8文本，不合法的文件不暂存
+    :return: (暂存成功的文件信息, 失败文件的错误信息)
     """
-    parts = fcnt.split("\n", 1)  # 只分割一次，最多分成两部分
-    if len(parts) == 2:
-        filename, content = parts
-    else:
-        # 如果没有 \n，说明只有 filename，content 为空
-        filename = parts[0]
-        content = ""
-    return filename, content
+    # 一次分配全部ID，序号用尽时异步等待
+    ids = await next_ids_async(len(files))
 
+    async def worker(param):
+        id, file = param
+        size = file.size
+        if size is None:
+            size = await asyncio.to_thread(file.file.seek, 0, 2)
+        chunks = upload_chunks(file)
+        if check_utf8:
+            chunks = utf8_chunks(chunks)
+        try:
+            await result_store.put_chunks(
+                KIND, user_id, id, file.filename, chunks, size, CONTENT_TYPE
+            )
+        except UnicodeDecodeError:
+            return f"{file.filename}: not utf-8 text"
+        return ""
+
+    results = await batch_async(
+        worker, list(zip(ids, files)), workers=cfg.md_upload_workers, timeout=None
+    )
 
-async def to_tmps(files, user_id) -> tuple[str, str]:
     # 提取批量结果
     files_msg = []
-    for file in files:
-        # 临时文件名
-        id = next_id()
-        tmp_name = f"{user_id}_{id}.md"
-
-        # 临时文件头部写入文件名
-        content = await file.read()
-        cnt = file.filename + "\n" + content.decode("utf-8")
-
-        # 写文件
-        await af.write_file(os.path.join("tmp", tmp_name), cnt)
+    err_msg = []
+    for status, idx, (id, file), msg in results:
+        if not status:
+            log.warning(f"md upload failed: {file.filename} {msg}")
+            err_msg.append(f"{file.filename}: upload failed")
+            continue
+        if msg:
+            err_msg.append(msg)
+            continue
 
         # 文件信息
         files_msg.append(
@@ -49,33 +75,39 @@ async def to_tmps(files, user_id) -> tuple[str, str]:
         "total": len(files),
         "files": files_msg,
     }
-    return output, ""
+    return output, " | ".join(err_msg)
 
 
 async def tmp_content(file_id, user_id) -> tuple[dict, str]:
-    # 触发批处理获取结果
-    tmp_name = f"{user_id}_{file_id}.md"
-    fpath = os.path.join("tmp", tmp_name)
-    fpath = Path(fpath)
-    if not await aop.isfile(fpath):
-        return {}, f"file not found of id: {file_id}"
-
-    # 读取临时存储的文件内容
-    cnt = await af.read_file(fpath)
-    filename, cnt = extract_filename(cnt)
-
-    # 删除临时文件
-    await aos.unlink(fpath)
+    # 取走暂存的内容(读取后删除)
+    result, msg = await result_store.take(KIND, user_id, file_id)
+    if result is None:
+        return {}, msg
+    meta, cnt = result
 
     data = {
         "id": file_id,
         "user_id": user_id,
-        "content": cnt,
-        "filename": filename,
+        # 未校验UTF-8暂存的内容可能不合法，非法字节替换为U+FFFD
+        "content": cnt.decode("utf-8", errors="replace"),
+        "filename": meta["filename"],
     }
     return data, ""
 
 
+async def tmp_content_stream(file_id, user_id) -> tuple[tuple | None, str]:
+    """
+    取走暂存的内容，按块读取直接作为响应体
+    :return: ((元数据, 分块内容), 错误信息)
+    """
+    return await result_store.take_stream(KIND, user_id, file_id)
+
+
+def tmp_contents_ndjson(file_ids, user_id) -> AsyncIterator[str]:
+    """逐个取走暂存的内容，每个文件输出一行JSON，不一次性读入全部内容"""
+    return result_store.iter_ndjson(KIND, user_id, file_ids)
+
+
 async def tmp_contents(file_ids, user_id) -> tuple[list, str]:
     async def worker(param):
         file_id, user_id = param
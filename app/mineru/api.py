@@ -1,6 +1,13 @@
-from typing import List, Optional
+import json
+from pathlib import Path
+from typing import List, Literal, Optional
+from fastapi.responses import StreamingResponse
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Header
-from .parse_file import mu_parse_file, mu_parse_files
+from fastapi import Query, Request
+from .client import MIME_TYPES
+from .parse_file import mu_parse_file, mu_parse_files, cache_stats
+from .parse_file import upload_parse_stream, upload_parse_iter
+from .jobs import submit_jobs, get_job
 
 # 初始化业务模块路由
 router = APIRouter()
@@ -27,6 +34,29 @@ async def parse_files(
     return {"data": data, "msg": "ok", "code": 1}
 
 
+@router.post(
+    "/parse_files/stream",
+    summary="上传文档列表，逐个流式返回先完成的解析结果(NDJSON或SSE)",
+)
+async def parse_files_stream(
+    files: List[UploadFile] = File(...),
+    format: Literal["ndjson", "sse"] = Query("ndjson", description="输出格式"),
+    user_id: str = Depends(get_user_id),
+):
+    async def ndjson():
+        async for event in upload_parse_iter(files, user_id):
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+
+    async def sse():
+        async for event in upload_parse_iter(files, user_id):
+            data = json.dumps(event, ensure_ascii=False)
+            yield f"event: {event['event']}\ndata: {data}\n\n"
+
+    if format == "sse":
+        return StreamingResponse(sse(), media_type="text/event-stream")
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
 @router.post(
     "/parse_file",
     summary="上传文档，返回MinerU解析后的文本内容",
@@ -39,3 +69,65 @@ async def parse_file(
     if msg:
         return {"data": "", "msg": msg, "code": -1}
     return {"data": cnt, "msg": "ok", "code": 1}
+
+
+@router.post(
+    "/parse_file_raw",
+    summary="请求体为文档原始字节，流式中转到MinerU解析，返回文本内容",
+)
+async def parse_file_raw(
+    request: Request,
+    filename: str = Query(..., description="文件名"),
+    user_id: str = Depends(get_user_id),
+):
+    # 类型优先取请求头，缺省时按扩展名推断
+    content_type = request.headers.get("content-type", "")
+    if not content_type or content_type == "application/octet-stream":
+        ext = Path(filename).suffix.lower().lstrip(".")
+        content_type = MIME_TYPES.get(ext, "application/octet-stream")
+    size = request.headers.get("content-length")
+    size = int(size) if size and size.isdigit() else None
+
+    cnt, msg = await upload_parse_stream(
+        request.stream(), filename, content_type, user_id, size
+    )
+    if msg:
+        return {"data": "", "msg": msg, "code": -1}
+    return {"data": cnt, "msg": "ok", "code": 1}
+
+
+@router.post(
+    "/jobs",
+    summary="提交文档列表异步解析，立即返回任务ID列表",
+)
+async def create_jobs(
+    files: List[UploadFile] = File(...),
+    user_id: str = Depends(get_user_id),
+):
+    data, msg = await submit_jobs(files, user_id)
+    if msg:
+        return {"data": data, "msg": msg, "code": -1}
+    return {"data": data, "msg": "ok", "code": 1}
+
+
+@router.get(
+    "/jobs/{job_id}",
+    summary="根据任务ID获取解析状态或结果，wait>0时等待任务结束",
+)
+async def job_result(
+    job_id: int,
+    wait: float = Query(0, ge=0, description="最长等待秒数"),
+    user_id: str = Depends(get_user_id),
+):
+    data, msg = await get_job(job_id, user_id, wait)
+    if msg:
+        return {"data": "", "msg": msg, "code": -1}
+    return {"data": data, "msg": "ok", "code": 1}
+
+
+@router.get(
+    "/parse_cache/stats",
+    summary="MinerU解析结果缓存的命中率、容量与淘汰统计",
+)
+async def parse_cache_stats():
+    return {"data": cache_stats(), "msg": "ok", "code": 1}
@@ -1,7 +1,10 @@
-import io
 import httpx
+from collections.abc import AsyncIterable
 from fastapi import UploadFile
-from app.utils.log import log
+from app.utils.log import REQUEST_ID_HEADER, log, request_id
+from app.utils.batch import batch_async
+from app.utils.metrics import upstream
+from app.utils.multipart import MultipartStream, upload_chunks
 
 MIME_TYPES = {
     "pdf": "application/pdf",
@@ -18,42 +21,98 @@ MIME_TYPES = {
 }
 
 
+async def single_chunk(data: bytes):
+    """完整字节作为单块异步迭代"""
+    yield data
+
+
 # mineru-web接口调用封装类
 class MUClient:
-    def __init__(self, addr: str, uid: str, timeout: float = 20.0):
+    def __init__(
+        self,
+        addr: str,
+        timeout: float = 20.0,
+        max_connections: int = 100,
+        max_keepalive: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        chunk_size: int = 256 * 1024,
+    ):
         self.addr = addr.rstrip("/")
-        self.headers = {"x-user-id": uid}
         self.timeout = timeout
+        self.chunk_size = chunk_size  # 流式上传的分块大小
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2
+        self.client: httpx.AsyncClient | None = None
 
     async def __aenter__(self):
-        """async with 开始时申请资源"""
-        self.client = httpx.AsyncClient(timeout=httpx.Timeout(self.timeout))
+        """async with 开始时申请资源(进程内共享的连接池)"""
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.timeout),
+            limits=self.limits,
+            http2=self.http2,
+        )
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """async with 结束时释放资源"""
         await self.client.aclose()
+        self.client = None
+
+    async def request(
+        self, op: str, method: str, url: str, sent: int | None = None, **kwargs
+    ) -> httpx.Response:
+        """
+        发送请求并记录上游指标(耗时、状态码、收发字节数)，op为接口名
+        带上当前请求的关联ID，便于与mineru-web日志对照
+        """
+        rid = request_id.get()
+        if rid != "-":
+            kwargs["headers"] = {**kwargs.get("headers", {}), REQUEST_ID_HEADER: rid}
+        with upstream("mineru", op, sent) as call:
+            call["resp"] = await self.client.request(method, url, **kwargs)
+        return call["resp"]
+
+    @staticmethod
+    def user_headers(uid: str) -> dict[str, str]:
+        """按调用方用户生成请求头"""
+        return {"x-user-id": uid}
+
+    async def post_multipart(self, uid: str, body: MultipartStream) -> httpx.Response:
+        """流式发送multipart上传请求"""
+        headers = self.user_headers(uid)
+        headers.update(body.headers)
+        return await self.request(
+            "upload",
+            "POST",
+            f"{self.addr}/api/upload",
+            sent=body.content_length,
+            headers=headers,
+            content=body,
+        )
 
     async def proxy_upload(
         self,
+        uid: str,
         file: UploadFile | list[UploadFile],
     ) -> tuple[list[str], str | None]:
         """中转文件到mineru解析服务器进行异步解析"""
         try:
-            # 上传对象
+            # 上传对象，多个文件使用同名字段，内容分块流式读取
             names = []
-            multipart_files = []  # 多个同名字段上传使用 list[tuple]
+            parts = []
             file_list = file if isinstance(file, list) else [file]
             for f in file_list:
                 names.append(f.filename)
-                multipart_files.append(("files", (f.filename, f.file, f.content_type)))
+                chunks = upload_chunks(f, self.chunk_size)
+                parts.append(("files", f.filename, f.content_type, chunks, f.size))
 
             # 异步上传
-            resp = await self.client.post(
-                f"{self.addr}/api/upload",
-                headers=self.headers,
-                files=multipart_files,
-            )
+            resp = await self.post_multipart(uid, MultipartStream(parts))
 
             # 异常状态
             if resp.status_code != 200:
@@ -82,25 +141,22 @@ class MUClient:
 
     async def upload_file(
         self,
+        uid: str,
         file_name: str,
-        file_data: bytes,
+        file_data: bytes | AsyncIterable[bytes],
         content_type: str,
+        size: int | None = None,
     ) -> tuple[str | None, str | None]:
-        """上传文档到mineru解析服务器进行异步解析"""
+        """
+        上传文档到mineru解析服务器进行异步解析
+        file_data可为完整字节或分块异步迭代器(如请求体流)，后者不缓存整个文件
+        """
         try:
-            # 单文件或明确不同字段名使用 dict
-            files = {
-                "files": (
-                    file_name,
-                    io.BytesIO(file_data),
-                    content_type,
-                ),
-            }
-            resp = await self.client.post(
-                f"{self.addr}/api/upload",
-                headers=self.headers,
-                files=files,
-            )
+            if isinstance(file_data, bytes):
+                size = len(file_data)
+                file_data = single_chunk(file_data)
+            part = ("files", file_name, content_type, file_data, size)
+            resp = await self.post_multipart(uid, MultipartStream([part]))
             if resp.status_code != 200:
                 msg = f"upload failed: {resp.status_code} {file_name}"
                 log.warning(msg)
@@ -112,12 +168,16 @@ class MUClient:
             log.warning(msg)
             return None, msg
 
-    async def get_status(self, file_id: str) -> tuple[str | None, str | None]:
+    async def get_status(
+        self, uid: str, file_id: str
+    ) -> tuple[str | None, str | None]:
         """根据文档id查询异步解析结果"""
         try:
-            resp = await self.client.get(
+            resp = await self.request(
+                "status",
+                "GET",
                 f"{self.addr}/api/files/{file_id}",
-                headers=self.headers,
+                headers=self.user_headers(uid),
             )
             if resp.status_code != 200:
                 msg = f"get_status failed: {resp.text} {file_id}"
@@ -129,12 +189,34 @@ class MUClient:
             log.warning(msg)
             return None, msg
 
-    async def trigger_parse(self, file_id: str) -> str | None:
+    async def get_statuses(
+        self,
+        uid: str,
+        file_ids: list[str],
+        workers: int = 16,
+    ) -> dict[str, tuple[str | None, str | None]]:
+        """
+        批量查询多个文档的解析状态
+        mineru-web只提供单文档状态接口，此处复用连接池并发查询，一轮返回全部结果
+        """
+
+        async def query(file_id):
+            return await self.get_status(uid, file_id)
+
+        statuses = {}
+        results = await batch_async(query, file_ids, workers=workers)
+        for ok, idx, file_id, result in results:
+            statuses[file_id] = result if ok else (None, result)
+        return statuses
+
+    async def trigger_parse(self, uid: str, file_id: str) -> str | None:
         """触发插队解析"""
         try:
-            resp = await self.client.post(
+            resp = await self.request(
+                "parse",
+                "POST",
                 f"{self.addr}/api/files/{file_id}/parse",
-                headers=self.headers,
+                headers=self.user_headers(uid),
             )
             if resp.status_code not in (200, 204):
                 msg = f"trigger_parse failed: {resp.text}"
@@ -146,12 +228,16 @@ class MUClient:
             log.warning(msg)
             return msg
 
-    async def get_content(self, file_id: str) -> tuple[str | None, str | None]:
+    async def get_content(
+        self, uid: str, file_id: str
+    ) -> tuple[str | None, str | None]:
         """获取解析结果内容"""
         try:
-            resp = await self.client.get(
+            resp = await self.request(
+                "content",
+                "GET",
                 f"{self.addr}/api/files/{file_id}/parsed_content",
-                headers=self.headers,
+                headers=self.user_headers(uid),
             )
             if resp.status_code != 200:
                 msg = f"get_content failed: {resp.text}"
@@ -166,11 +252,13 @@ class MUClient:
             log.warning(msg)
             return None, msg
 
-    async def delete_file(self, file_id: str) -> str | None:
+    async def delete_file(self, uid: str, file_id: str) -> str | None:
         try:
-            resp = await self.client.delete(
+            resp = await self.request(
+                "delete",
+                "DELETE",
                 f"{self.addr}/api/files/{file_id}",
-                headers=self.headers,
+                headers=self.user_headers(uid),
             )
             if resp.status_code not in (200, 204):
                 msg = f"delete file failed: {resp.text}"
@@ -0,0 +1,377 @@
+import time
+import uuid
+import asyncio
+import sqlite3
+import threading
+from pathlib import Path
+from itertools import groupby
+from fastapi import UploadFile
+from app.settings import cfg
+from app.utils.log import log
+from app.utils.autoid import next_ids_async
+from app.utils.backoff import backoff_delays
+from .parse_file import (
+    mu_client,
+    parse_cache,
+    parse_key,
+    fetch_content,
+    discard_uploads,
+)
+
+# 任务状态：排队/解析中为进行中，解析完成与失败为终态
+ACTIVE = ("pending", "parsing")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    cache_key TEXT,
+    file_id TEXT,
+    status TEXT NOT NULL,
+    content TEXT,
+    error TEXT,
+    triggered INTEGER NOT NULL DEFAULT 0,
+    owner TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, updated_at);
+CREATE INDEX IF NOT EXISTS jobs_file ON jobs (user_id, cache_key, status);
+"""
+
+
+class JobStore:
+    """
+    解析任务表(SQLite)，多个worker共享同一文件，worker重启后任务不丢失
+    sqlite3为阻塞调用，所有操作在线程中执行，单连接由锁串行化
+    """
+
+    def __init__(self, db_path: str | Path):
+        self.db_path = Path(db_path)
+        self.conn: sqlite3.Connection | None = None
+        self.lock = threading.Lock()
+
+    def open(self):
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(
+            self.db_path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def _run(self, func, *args):
+        with self.lock:
+            return func(self.conn, *args)
+
+    async def run(self, func, *args):
+        """在线程中执行 func(conn, *args)"""
+        return await asyncio.to_thread(self._run, func, *args)
+
+
+def _insert(conn, rows: list[dict]):
+    with conn:
+        conn.executemany(
+            "INSERT INTO jobs (id, user_id, filename, cache_key, file_id, status,"
+            " content, error, owner, created_at, updated_at) VALUES (:id, :user_id,"
+            " :filename, :cache_key, :file_id, :status, :content, :error, :owner,"
+            " :created_at, :updated_at)",
+            rows,
+        )
+
+
+def _find_active(conn, user_id: str, key: str) -> str | None:
+    """同一用户进行中的相同文档，复用其mineru文件ID"""
+    row = conn.execute(
+        "SELECT file_id FROM jobs WHERE user_id=? AND cache_key=?"
+        " AND status IN (?, ?) AND file_id IS NOT NULL LIMIT 1",
+        (user_id, key, *ACTIVE),
+    ).fetchone()
+    return row["file_id"] if row else None
+
+
+def _get(conn, job_id: int) -> sqlite3.Row | None:
+    return conn.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+
+
+def _claim(conn, owner: str, now: float, lease: float) -> list[sqlite3.Row]:
+    """续约本worker的任务，接管租约过期的任务，返回本worker负责的进行中任务"""
+    with conn:
+        conn.execute(
+            "UPDATE jobs SET owner=?, updated_at=? WHERE status IN (?, ?)"
+            " AND (owner=? OR owner IS NULL OR updated_at<?)",
+            (owner, now, *ACTIVE, owner, now - lease),
+        )
+    return conn.execute(
+        "SELECT id, user_id, cache_key, file_id, status, triggered, created_at"
+        " FROM jobs WHERE owner=? AND status IN (?, ?) ORDER BY user_id",
+        (owner, *ACTIVE),
+    ).fetchall()
+
+
+def _update(conn, updates: list[tuple]):
+    """批量更新任务：(状态, 内容, 错误, 已触发插队, 更新时间, mineru文件ID)"""
+    with conn:
+        conn.executemany(
+            "UPDATE jobs SET status=?, content=?, error=?, triggered=?, updated_at=?"
+            " WHERE file_id=? AND status IN ('pending', 'parsing')",
+            updates,
+        )
+
+
+def _purge(conn, before: float) -> int:
+    """删除过期的终态任务"""
+    with conn:
+        cur = conn.execute(
+            "DELETE FROM jobs WHERE status NOT IN (?, ?) AND updated_at<?",
+            (*ACTIVE, before),
+        )
+    return cur.rowcount
+
+
+class JobPoller:
+    """
+    后台轮询本worker负责的所有任务：按用户合并查询状态，解析完成后拉取内容并写缓存
+    无任务或状态无变化时按指数退避放慢轮询，有新任务提交时立即唤醒
+    """
+
+    def __init__(self, store: JobStore):
+        self.store = store
+        self.owner = uuid.uuid4().hex  # 本worker的租约标识
+        self.kick = asyncio.Event()  # 新任务提交
+        self.changed = asyncio.Event()  # 本轮有任务状态变化
+        self.task: asyncio.Task | None = None
+        self.stopped = False
+
+    def delays(self):
+        return backoff_delays(
+            cfg.mineru_poll_initial,
+            cfg.mineru_poll_max,
+            cfg.mineru_poll_factor,
+            cfg.mineru_poll_jitter,
+        )
+
+    async def __aenter__(self):
+        self.stopped = False
+        self.kick = asyncio.Event()
+        self.changed = asyncio.Event()
+        self.task = asyncio.create_task(self.run())
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        # 取消可能被wait_for吞掉(3.11)，同时置停止标记并唤醒循环
+        self.stopped = True
+        self.kick.set()
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+    def notify(self):
+        """唤醒等待任务结果的请求"""
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    async def run(self):
+        delays = self.delays()
+        last_purge = 0.0
+        while not self.stopped:
+            try:
+                await asyncio.wait_for(self.kick.wait(), next(delays))
+            except asyncio.TimeoutError:
+                pass
+            if self.kick.is_set():
+                self.kick.clear()
+                delays = self.delays()
+
+            try:
+                if await self.poll_once():
+                    self.notify()
+                now = time.time()
+                if now - last_purge > 60:
+                    last_purge = now
+                    await self.store.run(_purge, now - cfg.mineru_job_ttl)
+            except Exception as e:
+                log.warning(f"job poll failed: {type(e).__name__}: {e}")
+
+    async def poll_once(self) -> bool:
+        """轮询一轮，返回是否有任务状态变化"""
+        now = time.time()
+        jobs = await self.store.run(_claim, self.owner, now, cfg.mineru_job_lease)
+        if not jobs:
+            return False
+
+        # 同一mineru文件可能对应多个任务，按用户合并查询
+        updates = []
+        for user_id, group in groupby(jobs, key=lambda job: job["user_id"]):
+            files = {}
+            for job in group:
+                files.setdefault(job["file_id"], job)
+            updates.extend(await self.poll_user(user_id, files, now))
+
+        if updates:
+            await self.store.run(_update, updates)
+        return any(status not in ACTIVE for status, *_ in updates)
+
+    async def poll_user(self, user_id: str, files: dict, now: float) -> list[tuple]:
+        updates = []
+        statuses = await mu_client.get_statuses(
+            user_id, list(files), workers=cfg.mineru_status_workers
+        )
+        for file_id, (status, err) in statuses.items():
+            job = files[file_id]
+            triggered = job["triggered"]
+            timeout = now - job["created_at"] > cfg.mineru_job_timeout
+            if err:
+                # 查状态失败(网络抖动、mineru-web 5xx等)视为暂时错误，保持原状态下一轮重试；
+                # 复用的文件可能已被其他任务取走结果并删除，缓存中有结果时直接完成
+                content = await cached_content(job)
+                if content is not None:
+                    updates.append(("parsed", content, None, triggered, now, file_id))
+                elif timeout:
+                    err = f"timeout: {cfg.mineru_job_timeout}: {err}"
+                    updates.append(("failed", None, err, triggered, now, file_id))
+            elif status == "parsed":
+                content, err = await fetch_content(user_id, file_id)
+                if err:
+                    # 取内容失败：同上，改从缓存获取
+                    content = await cached_content(job)
+                    if content is None:
+                        updates.append(("failed", None, err, triggered, now, file_id))
+                        continue
+                elif job["cache_key"]:
+                    await parse_cache.set(job["cache_key"], content.encode("utf-8"))
+                updates.append(("parsed", content, None, triggered, now, file_id))
+            elif timeout:
+                err = f"timeout: {cfg.mineru_job_timeout}"
+                updates.append(("failed", None, err, triggered, now, file_id))
+            elif status == "pending":
+                # 排队等待，仅触发一次插队解析
+                if not triggered:
+                    await mu_client.trigger_parse(user_id, file_id)
+                updates.append(("pending", None, None, 1, now, file_id))
+            elif status == "parsing":
+                updates.append(("parsing", None, None, triggered, now, file_id))
+            else:
+                err = f"unknown status: {status}"
+                updates.append(("failed", None, err, triggered, now, file_id))
+        return updates
+
+
+async def cached_content(job: sqlite3.Row) -> str | None:
+    """任务对应文档的缓存解析结果，未启用缓存或未命中时为None"""
+    if not job["cache_key"]:
+        return None
+    cached = await parse_cache.get(job["cache_key"])
+    return None if cached is None else cached.decode("utf-8")
+
+
+# 进程内共享的任务表与轮询器，由FastAPI lifespan负责开启和关闭
+job_store = JobStore(cfg.mineru_job_db)
+job_poller = JobPoller(job_store)
+
+
+def job_view(job: sqlite3.Row) -> dict:
+    """任务对外展示的字段"""
+    data = {
+        "id": job["id"],
+        "filename": job["filename"],
+        "status": job["status"],
+    }
+    if job["status"] == "parsed":
+        data["content"] = job["content"]
+    if job["error"]:
+        data["error"] = job["error"]
+    return data
+
+
+async def submit_jobs(files: list[UploadFile], user_id: str) -> tuple[dict, str]:
+    """
+    提交解析任务后立即返回任务ID列表
+    命中缓存的文档直接完成，同一用户进行中的相同文档复用同一次解析
+    """
+    now = time.time()
+    rows = []
+    uploads = []  # 需要上传的文档: (任务, 上传文件)
+    ids = await next_ids_async(len(files))
+    for f, job_id in zip(files, ids):
+        row = {
+            "id": job_id,
+            "user_id": user_id,
+            "filename": f.filename,
+            "cache_key": None,
+            "file_id": None,
+            "status": "pending",
+            "content": None,
+            "error": None,
+            "owner": job_poller.owner,
+            "created_at": now,
+            "updated_at": now,
+        }
+        rows.append(row)
+        if cfg.mineru_cache_enabled:
+            key = row["cache_key"] = await parse_key(f)
+            cached = await parse_cache.get(key)
+            if cached is not None:
+                row["status"] = "parsed"
+                row["content"] = cached.decode("utf-8")
+                continue
+            row["file_id"] = await job_store.run(_find_active, user_id, key)
+            if row["file_id"]:
+                continue
+        uploads.append((row, f))
+
+    # 一次上传全部未命中的文档
+    msg = ""
+    if uploads:
+        file_items, err = await mu_client.proxy_upload(
+            user_id, [f for _, f in uploads]
+        )
+        if err:
+            msg = err
+            await discard_uploads(user_id, file_items)
+            for row, _ in uploads:
+                row["status"] = "failed"
+                row["error"] = err
+        else:
+            for (row, _), (file_id, _) in zip(uploads, file_items):
+                row["file_id"] = file_id
+
+    await job_store.run(_insert, rows)
+    job_poller.kick.set()
+
+    output = {
+        "total": len(rows),
+        "jobs": [
+            {"id": row["id"], "filename": row["filename"], "status": row["status"]}
+            for row in rows
+        ],
+    }
+    return output, msg
+
+
+async def get_job(job_id: int, user_id: str, wait: float = 0) -> tuple[dict, str]:
+    """查询任务状态或结果，wait>0时长轮询直至任务结束或超时"""
+    deadline = time.monotonic() + min(wait, cfg.mineru_job_max_wait)
+    while True:
+        job = await job_store.run(_get, job_id)
+        if job is None or job["user_id"] != user_id:
+            return {}, f"job not found: {job_id}"
+
+        remaining = deadline - time.monotonic()
+        if job["status"] not in ACTIVE or remaining <= 0:
+            return job_view(job), ""
+
+        # 本worker的任务由轮询器通知，其他worker的任务按间隔重查
+        try:
+            await asyncio.wait_for(job_poller.changed.wait(), min(remaining, 1.0))
+        except asyncio.TimeoutError:
+            pass
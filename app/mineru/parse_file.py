@@ -1,10 +1,34 @@
+import time
 import asyncio
+import hashlib
 from typing import Any
+from collections.abc import AsyncIterable, AsyncIterator
 from .client import MUClient
 from app.settings import cfg
+from app.utils.log import log
 from app.utils.batch import batch_async
+from app.utils.backoff import backoff_delays
+from app.utils.cache import DiskCache, SingleFlight, cache_key, file_digest
+from app.utils.metrics import STAGE_SECONDS, registry
 from fastapi import UploadFile
 
+# 进程内共享的mineru-web客户端(连接池)，由FastAPI lifespan负责开启和关闭
+mu_client = MUClient(
+    cfg.mineru_url,
+    max_connections=cfg.mineru_max_connections,
+    max_keepalive=cfg.mineru_max_keepalive,
+    keepalive_expiry=cfg.mineru_keepalive_expiry,
+    http2=cfg.mineru_http2,
+)
+
+# 解析结果缓存(按文档内容寻址)，及相同文档的并发解析合并
+parse_cache = DiskCache(
+    cfg.mineru_cache_dir,
+    max_bytes=cfg.mineru_cache_max_bytes,
+    ttl=cfg.mineru_cache_ttl,
+)
+parse_flight = SingleFlight(timeout=cfg.mineru_flight_timeout)
+
 
 async def mu_parse_files(files, user_id):
     """解析文件列表"""
@@ -14,62 +38,309 @@ async def mu_parse_files(files, user_id):
 async def mu_parse_file(file, user_id):
     """解析单个文件"""
     cnts, err = await upload_parse(file, user_id)
+    if err:
+        return "", err
     if len(cnts) > 0:
         return cnts[0]["content"], None
     return "", err
 
 
+async def fetch_content(user_id: str, file_id: str) -> tuple[str, str | None]:
+    """拉取解析完成的内容，并清理服务器留存的数据"""
+    content, err = await mu_client.get_content(user_id, file_id)
+    if err:
+        return "", err
+    await mu_client.delete_file(user_id, file_id)
+    return content, None
+
+
+async def discard_uploads(user_id: str, file_items: list[tuple[str, str]]):
+    """上传失败时删除已上传成功的部分文档，避免其滞留在服务器上占用解析队列"""
+    file_ids = [file_id for file_id, _ in file_items if file_id]
+    errors = await asyncio.gather(
+        *(mu_client.delete_file(user_id, file_id) for file_id in file_ids)
+    )
+    for file_id, msg in zip(file_ids, errors):
+        if msg:
+            log.warning(f"discard upload failed: {file_id}: {msg}")
+
+
+async def iter_contents(
+    user_id: str,
+    file_ids: list[str],
+) -> AsyncIterator[tuple[dict[str, str], dict[str, tuple[str, str | None]]]]:
+    """
+    合并轮询同一请求的所有文档，直至全部解析完成
+    每轮按指数退避等待后批量查询全部未完成文档的状态，解析完成的并发拉取内容
+    :return: 逐轮产出(未完成文档的状态, 本轮完成的文档结果)，
+             状态为 {文档ID: 状态}，结果为 {文档ID: (内容, 错误信息)}
+    """
+    pending = list(file_ids)
+    triggered = set()  # 已触发插队解析的文档
+    parse_start = {}  # 文档ID -> 开始解析的时间，用于统计排队与解析时长
+    start = last_poll = time.monotonic()
+    delays = backoff_delays(
+        cfg.mineru_poll_initial,
+        cfg.mineru_poll_max,
+        cfg.mineru_poll_factor,
+        cfg.mineru_poll_jitter,
+    )
+    deadline = time.monotonic() + cfg.mineru_poll_timeout
+    while pending:
+        if time.monotonic() > deadline:
+            err = f"timeout: {cfg.mineru_poll_timeout}"
+            yield {}, {file_id: ("", err) for file_id in pending}
+            break
+        await asyncio.sleep(next(delays))
+
+        # 一轮查询所有未完成文档的状态
+        statuses = await mu_client.get_statuses(
+            user_id, pending, workers=cfg.mineru_status_workers
+        )
+        now = time.monotonic()
+        results = {}
+        parsed = []
+        waiting = {}
+        for file_id in pending:
+            status, err = statuses[file_id]
+            # 排队时长从上传完成算到首次查到parsing，解析时长从首次查到parsing算到parsed；
+            # 两轮查询之间即解析完成的，开始解析时间按上一轮查询估计，精度受轮询间隔限制
+            if status in ("parsing", "parsed") and file_id not in parse_start:
+                parse_start[file_id] = now if status == "parsing" else last_poll
+                elapsed = parse_start[file_id] - start
+                STAGE_SECONDS.observe("mineru_queue", value=elapsed)
+            if err:
+                results[file_id] = "", err
+            # 解析完成
+            elif status == "parsed":
+                elapsed = now - parse_start[file_id]
+                STAGE_SECONDS.observe("mineru_parse", value=elapsed)
+                parsed.append(file_id)
+            # 排队等待，仅触发一次插队解析
+            elif status == "pending":
+                if file_id not in triggered:
+                    await mu_client.trigger_parse(user_id, file_id)
+                    triggered.add(file_id)
+                waiting[file_id] = status
+            # 正在解析
+            elif status == "parsing":
+                waiting[file_id] = status
+            else:
+                results[file_id] = "", f"unknown status: {status}"
+
+        # 并发拉取本轮解析完成的内容
+        if parsed:
+
+            async def fetch(file_id):
+                with STAGE_SECONDS.time("mineru_fetch"):
+                    return await fetch_content(user_id, file_id)
+
+            for ok, idx, file_id, result in await batch_async(fetch, parsed):
+                results[file_id] = result if ok else ("", result)
+        pending = list(waiting)
+        last_poll = now
+        yield waiting, results
+
+
+async def poll_contents(
+    user_id: str,
+    file_ids: list[str],
+) -> dict[str, tuple[str, str | None]]:
+    """
+    轮询直至全部文档解析完成
+    :return: 字典，key = 文档ID, value = (内容, 错误信息)
+    """
+    results = {}
+    async for _, done in iter_contents(user_id, file_ids):
+        results.update(done)
+    return results
+
+
+def cache_stats() -> dict:
+    """解析结果缓存的命中率、容量与淘汰统计"""
+    return parse_cache.stats()
+
+
+registry.stats("mineru_cache", "mineru解析结果缓存统计", cache_stats)
+
+
+def content_key(digest: str, content_type: str | None) -> str:
+    """文件内容摘要 + 解析参数组成的缓存key"""
+    return cache_key(
+        digest,
+        content_type=content_type,
+        version=cfg.mineru_cache_version,
+    )
+
+
+async def parse_key(file: UploadFile) -> str:
+    """上传文件的缓存key"""
+    digest = await asyncio.to_thread(file_digest, file.file)
+    return content_key(digest, file.content_type)
+
+
+@STAGE_SECONDS.timed("upload_parse")
 async def upload_parse(
     file: UploadFile | list[UploadFile],
     user_id: str,
 ) -> tuple[list[Any], str | None]:
     """代理上传并解析文档，并清理服务器留存的数据"""
-    async with MUClient(cfg.mineru_url, user_id) as client:
-        # 上传文件获取文件ID列表
-        file_items, err = await client.proxy_upload(file)
-        if err:
-            return "", err
-
-        # 定义批处理函数
-        async def check_content(file_item) -> tuple[str, str]:
-            # 轮询解析
-            file_id, file_name = file_item
-            for _ in range(300):
-                await asyncio.sleep(1)
-                status, err = await client.get_status(file_id)
-                if err:
-                    return "", err
-
-                # 解析完成
-                if status == "parsed":
-                    content, err = await client.get_content(file_id)
-                    if err:
-                        return "", err
-                    await client.delete_file(file_id)
-                    return content, None
-
-                # 排队等待
-                if status == "pending":
-                    await client.trigger_parse(file_id)
-
-                # 正则解析
-                elif status == "parsing":
-                    continue
-                else:
-                    return "", f"unknown status: {status}"
-
-        # 触发批处理获取结果
-        results = await batch_async(check_content, file_items)
-
-        # 提取正常请求的结果
-        parse_cnts = []
-        err_msgs = []
-        for status, idx, (file_id, file_name), result in results:
-            if status:
-                # 逻辑函数正常返回
-                cnt, msg = result
-                parse_cnts.append({"filename": file_name, "content": cnt})
+    file_list = file if isinstance(file, list) else [file]
+    results = [None] * len(file_list)
+    async for event in upload_parse_iter(file_list, user_id):
+        if event["event"] == "result":
+            results[event["index"]] = event
+
+    # 按上传顺序提取结果
+    parse_cnts = []
+    err_msgs = []
+    for event in results:
+        parse_cnts.append({"filename": event["filename"], "content": event["content"]})
+        if event.get("error"):
+            err_msgs.append(f"{event['filename']}：{event['error']}")
+    return parse_cnts, "\n".join(err_msgs)
+
+
+async def upload_parse_iter(
+    files: list[UploadFile],
+    user_id: str,
+) -> AsyncIterator[dict]:
+    """
+    代理上传并解析文档，逐个产出先完成的文档结果
+    相同内容的文档直接返回缓存结果，并发提交的相同文档只解析一次
+    :return: 事件迭代器
+      - {"event": "progress", "total", "done", "pending", "parsing"}
+      - {"event": "result", "index", "filename", "content", "error"(可选)}
+    """
+    total = len(files)
+    done = 0
+
+    def result(idx: int, cnt: str, msg: str | None) -> dict:
+        nonlocal done
+        done += 1
+        event = {
+            "event": "result",
+            "index": idx,
+            "filename": files[idx].filename,
+            "content": cnt,
+        }
+        if msg:
+            event["error"] = msg
+        return event
+
+    leaders = {}  # 本请求负责上传解析的文档: 序号 -> key
+    followers = {}  # 等待其他请求解析结果的文档: Future -> 序号
+
+    def follower_results():
+        for fut in [fut for fut in followers if fut.done()]:
+            yield result(followers.pop(fut), *fut.result())
+
+    # 已加入的调用在任何退出路径(含查缓存期间产出结果时客户端断开)都由finally结束
+    try:
+        # 查缓存，未命中的按内容合并到进行中的解析
+        for idx, f in enumerate(files):
+            if not cfg.mineru_cache_enabled:
+                leaders[idx] = None
+                continue
+            key = await parse_key(f)
+            cached = await parse_cache.get(key)
+            if cached is not None:
+                yield result(idx, cached.decode("utf-8"), None)
+                continue
+            fut, leader = parse_flight.join(key)
+            if leader:
+                leaders[idx] = key
             else:
-                # 批处理函数异常返回
-                err_msgs.append(f"{file_name}：{result}")
-        return parse_cnts, "\n".join(err_msgs)
+                followers[asyncio.ensure_future(follow(key, fut))] = idx
+
+        # 上传未命中的文档并逐轮产出进度与结果
+        if leaders:
+            order = list(leaders)
+            file_items, err = await mu_client.proxy_upload(
+                user_id, [files[idx] for idx in order]
+            )
+            if err:
+                await discard_uploads(user_id, file_items)
+                file_items = []
+                for idx in order:
+                    await finish_leader(leaders.pop(idx), "", err)
+                    yield result(idx, "", err)
+
+            index = {file_id: idx for idx, (file_id, _) in zip(order, file_items)}
+            async for waiting, finished in iter_contents(user_id, list(index)):
+                for file_id, (cnt, msg) in finished.items():
+                    idx = index[file_id]
+                    await finish_leader(leaders.pop(idx), cnt, msg)
+                    yield result(idx, cnt, msg)
+                for event in follower_results():
+                    yield event
+                statuses = list(waiting.values())
+                yield {
+                    "event": "progress",
+                    "total": total,
+                    "done": done,
+                    "pending": statuses.count("pending"),
+                    "parsing": statuses.count("parsing"),
+                }
+
+        # 等待并发的相同文档解析结果
+        for fut in asyncio.as_completed(list(followers)):
+            await fut
+            for event in follower_results():
+                yield event
+    finally:
+        # 客户端断开等异常退出时，唤醒等待本请求解析结果的其他请求
+        for key in leaders.values():
+            if key:
+                parse_flight.finish(key, ("", "aborted"))
+        for fut in followers:
+            fut.cancel()
+
+
+async def follow(key: str, fut: asyncio.Future) -> tuple[str, str | None]:
+    """等待并发的相同文档解析结果，超时(如对方请求异常中断)返回错误"""
+    try:
+        return await parse_flight.wait(key, fut)
+    except TimeoutError:
+        return "", f"timeout waiting for identical upload: {parse_flight.timeout}"
+
+
+async def finish_leader(key: str | None, cnt: str, msg: str | None):
+    """写入缓存并唤醒等待相同文档的请求"""
+    if not key:
+        return
+    if not msg:
+        await parse_cache.set(key, cnt.encode("utf-8"))
+    parse_flight.finish(key, (cnt, msg))
+
+
+async def upload_parse_stream(
+    chunks: AsyncIterable[bytes],
+    file_name: str,
+    content_type: str,
+    user_id: str,
+    size: int | None = None,
+) -> tuple[str, str | None]:
+    """
+    请求体直通mineru-web：边接收边上传，文档不在本服务落盘或整体驻留内存
+    上传的同时计算内容摘要，解析结果写入缓存供后续相同文档命中
+    """
+    digest = hashlib.sha256()
+
+    async def tee():
+        async for chunk in chunks:
+            digest.update(chunk)
+            yield chunk
+
+    file_id, err = await mu_client.upload_file(
+        user_id, file_name, tee(), content_type, size
+    )
+    if err:
+        return "", err
+
+    results = await poll_contents(user_id, [file_id])
+    cnt, msg = results[file_id]
+    if not msg and cfg.mineru_cache_enabled:
+        key = content_key(digest.hexdigest(), content_type)
+        await parse_cache.set(key, cnt.encode("utf-8"))
+    return cnt, msg
@@ -6,10 +6,107 @@ class Settings(BaseSettings):
 
     # mineru-web服务地址
     mineru_url: str = "http://172.17.30.21:8089"
+    # mineru-web连接池：最大连接数、最大空闲保活连接数、空闲保活时长(秒)
+    mineru_max_connections: int = 100
+    mineru_max_keepalive: int = 20
+    mineru_keepalive_expiry: float = 30.0
+    # 服务端支持时启用HTTP/2(https下通过ALPN协商，http下仍为HTTP/1.1)
+    mineru_http2: bool = True
+    # 解析状态轮询：首次间隔、最大间隔、退避倍数、随机抖动比例(秒)
+    mineru_poll_initial: float = 0.1
+    mineru_poll_max: float = 3.0
+    mineru_poll_factor: float = 1.5
+    mineru_poll_jitter: float = 0.2
+    # 单个请求等待解析完成的最长时间(秒)
+    mineru_poll_timeout: float = 300.0
+    # 每轮批量查询状态的并发数
+    mineru_status_workers: int = 16
+    # 解析结果缓存：目录、总大小上限(字节)、有效期(秒)
+    # 缓存版本号变更后旧结果全部失效(如mineru模型升级)
+    mineru_cache_enabled: bool = True
+    mineru_cache_dir: str = "cache/mineru"
+    mineru_cache_max_bytes: int = 1024 * 1024 * 1024
+    mineru_cache_ttl: float = 7 * 24 * 3600
+    mineru_cache_version: str = "1"
+    # 相同文档并发解析时等待首个请求结果的最长时间(秒)，超时返回错误
+    mineru_flight_timeout: float = 360.0
+    # 异步解析任务：任务库路径(SQLite WAL模式，须为本机磁盘)、单任务最长等待(秒)、已完成任务保留时长(秒)
+    mineru_job_db: str = "cache/jobs.db"
+    mineru_job_timeout: float = 3600.0
+    mineru_job_ttl: float = 24 * 3600
+    # 任务租约(秒)：持有任务的worker超过该时长未续约，其他worker接管轮询
+    mineru_job_lease: float = 30.0
+    # 查询任务时长轮询的最长等待(秒)
+    mineru_job_max_wait: float = 60.0
+
+    # md与Excel上传结果暂存：内容目录、索引库路径、未取走结果的有效期(秒)、过期清理间隔(秒)
+    # 索引库为SQLite WAL模式，须放在本机磁盘(不支持NFS等网络文件系统)，同一主机的worker共用
+    result_dir: str = "tmp/results"
+    result_db: str = "cache/results.db"
+    result_ttl: float = 24 * 3600
+    result_sweep_interval: float = 60.0
+    # ID分配：主机号、本机worker槽位位数(最多 2^位数 个worker)、槽位锁目录
+    # 主机号须小于 2^(16-槽位位数)：配置值超出范围时启动报错；
+    # 未配置时取私有IPv4低16位，超出范围时折叠到可用位数并告警(多主机部署建议显式配置)
+    # 槽位锁目录须为本机磁盘且同一主机的worker共用
+    id_host_id: int | None = None
+    id_worker_bits: int = 4
+    id_lock_dir: str = "tmp/ids"
+
+    # md上传：同时写入的文件数
+    md_upload_workers: int = 8
 
     # Gotenberg容器LibreOffice服务地址
     office_url: str = "http://172.17.30.110:45505"
     # office_url: str = "http://localhost:3000"
+    # Gotenberg连接池最大连接数、单次转换超时(秒)
+    office_max_connections: int = 20
+    office_convert_timeout: float = 60.0
+    # 同时在Gotenberg转换的最大文档数，超出的请求排队等待
+    office_max_inflight: int = 4
+    # 排队等待的最长时间(秒)，超时直接拒绝
+    office_queue_timeout: float = 30.0
+
+    # Excel转换进程池：进程数、单任务超时(秒)、进程执行多少次后重建
+    # 每个uvicorn worker各有一个进程池，进程总数为 uvicorn workers × excel_workers，
+    # 按 CPU核数 // uvicorn workers 设置(0表示CPU核数，仅适合单worker部署)
+    excel_workers: int = 2
+    excel_task_timeout: float = 120.0
+    excel_worker_max_tasks: int = 50
+    # xlsx文件不小于该字节数时改用只读流式解析(不构建整表单元格对象，内存约与输出大小成正比)，
+    # 含单元格图片的sheet仍完整解析
+    excel_stream_min_bytes: int = 10 * 1024 * 1024
+    # 文件不小于该字节数且选中多个sheet时，各sheet分发到不同工作进程并行转换
+    excel_parallel_min_bytes: int = 2 * 1024 * 1024
+    # 上传文件不大于该字节数时以内存字节直接交给解析进程，超过或大小未知时分块落盘到临时目录
+    excel_inmemory_max_bytes: int = 32 * 1024 * 1024
+    # 大文件的临时目录，建议使用本地磁盘而非共享存储
+    excel_tmp_dir: str = "tmp/all"
+    # 单元格图片存储(images=blob时写入)：目录、总大小上限、有效期(秒)
+    excel_image_dir: str = "cache/excel_images"
+    excel_image_max_bytes: int = 1024 * 1024 * 1024
+    excel_image_ttl: float = 7 * 24 * 3600
+    # 转换结果缓存(按文件内容+转换参数寻址)：内存层总大小上限，磁盘层目录、总大小上限，
+    # 两层共用的有效期(秒)；缓存版本号变更后旧结果全部失效(如转换逻辑调整)
+    excel_cache_enabled: bool = True
+    excel_cache_memory_bytes: int = 128 * 1024 * 1024
+    excel_cache_dir: str = "cache/excel"
+    excel_cache_max_bytes: int = 1024 * 1024 * 1024
+    excel_cache_ttl: float = 7 * 24 * 3600
+    excel_cache_version: str = "2"
+
+    # 监控指标：多worker共享的快照目录(须为本机目录，启动时清理已退出进程的快照；为空时只输出本进程指标)，
+    # 各worker写入快照的间隔(秒)
+    metrics_dir: str = "tmp/metrics"
+    metrics_flush_interval: float = 5.0
+
+    # 日志：级别、输出格式(json 或 text)
+    log_level: str = "INFO"
+    log_format: str = "json"
+    # 同一代码位置的重复警告限流：每个窗口(秒)内前若干条照常输出，之后每若干条输出一条
+    log_rate_window: float = 10.0
+    log_rate_burst: int = 10
+    log_sample_every: int = 100
 
 
 # 服务配置
@@ -1,4 +1,5 @@
 from pathlib import Path
+from collections.abc import AsyncIterable
 import aiofiles
 import aiofiles.os as aos
 
@@ -57,3 +58,26 @@ async def write_bin(
         await f.write(content)
 
     return fpath
+
+
+async def write_chunks(
+    fpath: str | Path,
+    chunks: AsyncIterable[bytes],
+    check_folder: bool = True,
+) -> Path:
+    """
+    异步分块写入二进制文件，内存占用与文件大小无关
+    :param fpath: 文件路径（支持 str / Path）
+    :param chunks: 分块内容
+    :param check_folder: 是否自动创建父目录
+    :return: 实际写入的路径（Path 对象）
+    """
+    fpath = Path(fpath)
+    if check_folder:
+        await aos.makedirs(fpath.parent, exist_ok=True, mode=0o755)
+
+    async with aiofiles.open(fpath, "wb") as f:
+        async for chunk in chunks:
+            await f.write(chunk)
+
+    return fpath
@@ -1,14 +1,208 @@
-from sonyflake import Sonyflake
+import os
+import time
+import fcntl
+import asyncio
+from pathlib import Path
 from datetime import datetime
+from sonyflake.sonyflake import (
+    DEFAULT_BITS_MACHINE_ID,
+    DEFAULT_BITS_SEQUENCE,
+    DEFAULT_TIME_UNIT,
+    NoPrivateAddress,
+    _lower_16bit_private_ip,
+)
+from app.settings import cfg
+from app.utils.log import log
+from app.utils.metrics import registry
 
-sf = Sonyflake(start_time=datetime(2025, 12, 12))
+# 与Sonyflake相同的ID布局：时间片(10ms) | 序号(8位) | 机器号(16位)，新旧ID保持有序且不冲突
+START_TIME = datetime(2025, 12, 12)
+TICK = DEFAULT_TIME_UNIT / 1e9
+SEQ_PER_TICK = 1 << DEFAULT_BITS_SEQUENCE
+MACHINE_BITS = DEFAULT_BITS_MACHINE_ID
+
+
+def host_id() -> int:
+    """主机号：配置优先，否则取私有IPv4低16位(与Sonyflake默认一致)，无私有地址时为0"""
+    if cfg.id_host_id is not None:
+        return cfg.id_host_id
+    try:
+        return _lower_16bit_private_ip()
+    except NoPrivateAddress:
+        log.warning("no private ipv4 address, id host id falls back to 0")
+        return 0
+
+
+def fold_bits(value: int, bits: int) -> int:
+    """按位异或折叠到低bits位：超出部分与低位异或，比直接截断高位更少冲突"""
+    if bits <= 0:
+        return 0
+    mask = (1 << bits) - 1
+    while value > mask:
+        value = (value & mask) ^ (value >> bits)
+    return value
+
+
+def claim_slot(lock_dir: str | Path, slots: int) -> tuple[int, int]:
+    """
+    抢占本机空闲的worker槽位：对槽位锁文件加排他flock，进程存活期间一直持有，
+    进程退出(含崩溃)时由系统释放
+    :return: (槽位号, 锁文件描述符)
+    """
+    lock_dir = Path(lock_dir)
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    for slot in range(slots):
+        fd = os.open(lock_dir / f"worker-{slot}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            continue
+        return slot, fd
+    raise RuntimeError(f"no free id slot in {lock_dir}: all {slots} slots are taken")
+
+
+class IdAllocator:
+    """
+    按时间片整段分配ID，每个worker进程使用独立的机器号，跨worker无需协调
+      - 机器号 = 主机号(低位) << worker位数 | 本机worker槽位
+      - 一次分配同一时间片内连续的多个序号，不逐个加锁
+      - 当前时间片序号用尽时借用后续时间片，最多领先时钟max_ahead个时间片，
+        超出时异步版本等待、同步版本短暂休眠
+    只在事件循环线程中调用，分配过程无await，无需加锁
+    """
+
+    def __init__(self, machine_id: int, max_ahead: int = 10):
+        self.machine_id = machine_id
+        self.max_ahead = max_ahead
+        self.epoch = START_TIME.timestamp()
+        self.tick = 0  # 最近分配的时间片
+        self.seq = 0  # 该时间片内下一个序号
+        self.started = time.monotonic()
+        self.issued = 0  # 已分配ID数
+        self.blocks = 0  # 分配次数(每次为同一时间片内的一段)
+        self.waits = 0  # 因领先时钟过多而等待的次数
+        self.window_start = self.started
+        self.window_count = 0
+        self.rate = 0.0  # 最近一个统计窗口(1秒)的分配速率
+        self.peak_rate = 0.0
+
+    def now(self) -> int:
+        return int((time.time() - self.epoch) / TICK)
+
+    def ahead(self) -> int:
+        """当前分配位置领先时钟的时间片数"""
+        return self.tick - self.now()
+
+    def take(self, n: int) -> list[int]:
+        """从当前时间片分配至多n个ID(不等待)，时间片用尽时借用下一个"""
+        now = self.now()
+        if now > self.tick:
+            self.tick, self.seq = now, 0
+        elif self.seq >= SEQ_PER_TICK:
+            self.tick, self.seq = self.tick + 1, 0
+        count = min(n, SEQ_PER_TICK - self.seq)
+        base = (self.tick << (DEFAULT_BITS_SEQUENCE + MACHINE_BITS)) | self.machine_id
+        seqs = range(self.seq, self.seq + count)
+        self.seq += count
+        self._count(count)
+        return [base | (seq << MACHINE_BITS) for seq in seqs]
+
+    def _count(self, count: int):
+        self.issued += count
+        self.blocks += 1
+        self.window_count += count
+        now = time.monotonic()
+        if now - self.window_start >= 1.0:
+            self.rate = self.window_count / (now - self.window_start)
+            self.peak_rate = max(self.peak_rate, self.rate)
+            self.window_start, self.window_count = now, 0
+
+    def next_id(self) -> int:
+        if self.ahead() >= self.max_ahead:
+            self.waits += 1
+            time.sleep(self.ahead() * TICK)
+        return self.take(1)[0]
+
+    async def next_ids(self, n: int) -> list[int]:
+        ids = []
+        while len(ids) < n:
+            if self.ahead() >= self.max_ahead:
+                self.waits += 1
+                await asyncio.sleep(self.ahead() * TICK)
+            ids.extend(self.take(n - len(ids)))
+        return ids
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        return {
+            "machine_id": self.machine_id,
+            "issued": self.issued,
+            "blocks": self.blocks,
+            "waits": self.waits,
+            "ahead_ticks": max(self.ahead(), 0),
+            "rate": self.rate,
+            "peak_rate": self.peak_rate,
+            "avg_rate": self.issued / elapsed if elapsed > 0 else 0.0,
+        }
+
+
+_allocator: IdAllocator | None = None
+_slot_fd: int | None = None  # 持有槽位锁，进程退出时释放
+
+
+def allocator() -> IdAllocator:
+    """
+    本进程的ID分配器，首次使用时抢占worker槽位(同步，由FastAPI lifespan在线程中预先创建)
+    主机号与槽位号共同组成机器号，主机号须小于 2^(16-id_worker_bits)：
+      - 配置的 id_host_id 超出范围时直接报错
+      - 取自私有IPv4时按位折叠到可用位数并告警，不同主机可能冲突，多主机部署应配置 id_host_id
+    """
+    global _allocator, _slot_fd
+    if _allocator is None:
+        bits = cfg.id_worker_bits
+        host_bits = MACHINE_BITS - bits
+        host = host_id()
+        if host >= 1 << host_bits:
+            if cfg.id_host_id is not None:
+                raise RuntimeError(
+                    f"id_host_id {host} does not fit in {host_bits} bits"
+                    f" (id_worker_bits={bits}), must be below {1 << host_bits}"
+                )
+            folded = fold_bits(host, host_bits)
+            log.warning(
+                f"id host id {host} from private ipv4 exceeds {host_bits} bits,"
+                f" folded to {folded}; set id_host_id to avoid collisions"
+            )
+            host = folded
+        slot, _slot_fd = claim_slot(cfg.id_lock_dir, 1 << bits)
+        machine_id = (host << bits) | slot
+        ids = IdAllocator(machine_id)
+        # 槽位可能刚被退出的进程释放，等过其可能借用的时间片后再分配
+        time.sleep((ids.max_ahead + 1) * TICK)
+        _allocator = ids
+        log.info(f"id allocator: slot={slot} machine_id={machine_id}")
+    return _allocator
 
 
 def next_id():
     """获取下一个自增ID(单例中使用)"""
-    return sf.next_id()
+    return allocator().next_id()
 
 
 async def next_id_async():
     """获取下一个自增ID(单例中使用)"""
-    return await sf.next_id_async()
+    return (await allocator().next_ids(1))[0]
+
+
+async def next_ids_async(n: int) -> list[int]:
+    """批量获取自增ID，按时间片整段分配，领先时钟过多时异步等待，不阻塞事件循环"""
+    return await allocator().next_ids(n)
+
+
+def id_stats() -> dict:
+    """ID分配速率等统计"""
+    return allocator().stats()
+
+
+registry.stats("id_allocator", "ID分配统计", id_stats)
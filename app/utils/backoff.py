@@ -0,0 +1,22 @@
+import random
+from collections.abc import Iterator
+
+
+def backoff_delays(
+    initial: float,
+    maximum: float,
+    factor: float = 2.0,
+    jitter: float = 0.2,
+) -> Iterator[float]:
+    """
+    指数退避的等待时长序列(无限生成)
+    :param initial: 首次等待时长(秒)
+    :param maximum: 等待时长上限(秒)
+    :param factor: 每次增长的倍数
+    :param jitter: 随机抖动比例，错开多个请求的轮询时刻
+    :return: 等待时长迭代器
+    """
+    delay = initial
+    while True:
+        yield delay * random.uniform(1 - jitter, 1 + jitter)
+        delay = min(delay * factor, maximum)
@@ -2,7 +2,7 @@ import traceback
 import asyncio
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Callable, TypeVar
-from collections.abc import Awaitable
+from collections.abc import AsyncIterator, Awaitable, Iterable
 
 T = TypeVar("T")  # 入参
 U = TypeVar("U")  # 出参
@@ -59,9 +59,111 @@ def batch_safe(
     return results
 
 
+async def _call(
+    async_func: Callable[[T], Awaitable[U]],
+    idx: int,
+    item: T,
+    timeout: float | None,
+    return_exceptions: bool,
+) -> tuple[bool, int, T, U | str]:
+    """执行单个异步任务，超时或异常时返回错误信息"""
+    try:
+        # timeout=None 表示无超时
+        async with asyncio.timeout(timeout):
+            result = await async_func(item)
+        return (True, idx, item, result)
+    except TimeoutError:
+        err_msg = f"timeout: {timeout}"
+    except Exception as e:
+        if return_exceptions:
+            err_msg = f"{type(e).__name__}: {e}: {traceback.format_exc()}"
+        else:
+            raise
+    return (False, idx, item, err_msg)
+
+
+class _Failure:
+    """工作协程抛出的异常(return_exceptions=False时向调用方传递)"""
+
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+_DONE = object()  # 工作协程结束标记
+
+
+async def batch_async_iter(
+    async_func: Callable[[T], Awaitable[U]],
+    items: Iterable[T],
+    workers: int = 10,
+    timeout: float | None = 30.0,
+    return_exceptions: bool = True,
+    ordered: bool = True,
+) -> AsyncIterator[tuple[bool, int, T, U | str]]:
+    """
+    并发执行异步函数，逐个产出结果
+    只创建workers个工作协程，从items迭代器中按需取参数，不预先创建全部任务
+    :param async_func: 调用的异步函数，f(T)->U
+    :param items: 多任务的参数，任意可迭代对象(可为惰性生成器)
+    :param workers: 并发协程数
+    :param timeout: 单个任务超时时间
+    :param return_exceptions: 容忍异常，返回异常信息
+    :param ordered: True按items顺序产出，False按完成先后产出
+    :return: 异步迭代器(状态, 编号，入参T，出参U | 错误信息)
+             调用方中途退出(如客户端断开)时取消所有未完成的任务
+    """
+    source = enumerate(items)
+    # 已完成待产出的结果，队列满时工作协程暂停取新任务
+    queue: asyncio.Queue = asyncio.Queue(maxsize=workers)
+    # 按序产出时限制领先窗口，避免慢任务之后的结果无限堆积
+    window = asyncio.Semaphore(workers * 2) if ordered else None
+
+    async def worker():
+        try:
+            while True:
+                if window:
+                    await window.acquire()
+                try:
+                    idx, item = next(source)
+                except StopIteration:
+                    break
+                result = await _call(async_func, idx, item, timeout, return_exceptions)
+                await queue.put(result)
+        except Exception as e:
+            await queue.put(_Failure(e))
+            return
+        # 被取消时不再写队列(消费方已退出，队列可能已满)
+        await queue.put(_DONE)
+
+    tasks = [asyncio.create_task(worker()) for _ in range(max(1, workers))]
+    try:
+        running = len(tasks)
+        pending = {}  # 按序产出时暂存的乱序结果
+        next_idx = 0
+        while running:
+            result = await queue.get()
+            if result is _DONE:
+                running -= 1
+                continue
+            if isinstance(result, _Failure):
+                raise result.exc
+            if not ordered:
+                yield result
+                continue
+            pending[result[1]] = result
+            while next_idx in pending:
+                window.release()
+                yield pending.pop(next_idx)
+                next_idx += 1
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
 async def batch_async(
     async_func: Callable[[T], Awaitable[U]],
-    items: list[T],
+    items: Iterable[T],
     workers: int = 10,
     timeout: float | None = 30.0,
     return_exceptions: bool = True,
@@ -70,39 +172,14 @@ async def batch_async(
     并发执行异步函数，处理列表每个参数
     :param async_func: 调用的异步函数，f(T)->U
     :param items: 多任务的参数列表,list[T]
-    :param workers: 并发线程数
+    :param workers: 并发协程数
     :param timeout: 任务超时时间
     :param return_exceptions: 容忍异常，返回异常信息
     :return: 列表(状态, 编号，入参T，出参U | 错误信息)
     """
-    if not items:
-        return [], []
-
-    # 异步信号量控制并发
-    semaphore = asyncio.Semaphore(workers)
-
-    async def _wrapped(idx: int, item: T) -> tuple[bool, int, T, U | str]:
-        async with semaphore:
-            try:
-                # timeout=None 表示无超时
-                if timeout is not None:
-                    result = await asyncio.wait_for(async_func(item), timeout=timeout)
-                else:
-                    result = await async_func(item)
-                return (True, idx, item, result)
-            except asyncio.TimeoutError:
-                err_msg = f"timeout: {timeout}"
-            except Exception as e:
-                if return_exceptions:
-                    err_msg = f"{type(e).__name__}: {e}: {traceback.format_exc()}"
-                else:
-                    raise
-            return (False, idx, item, err_msg)
-
-    # 创建任务（携带索引）
-    tasks = [asyncio.create_task(_wrapped(i, item)) for i, item in enumerate(items)]
-
-    # 并发执行所有任务
-    results = await asyncio.gather(*tasks, return_exceptions=False)
-
-    return results
+    return [
+        result
+        async for result in batch_async_iter(
+            async_func, items, workers, timeout, return_exceptions
+        )
+    ]
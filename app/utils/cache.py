@@ -0,0 +1,300 @@
+import os
+import time
+import asyncio
+import hashlib
+from pathlib import Path
+from collections import OrderedDict
+from typing import Any, BinaryIO
+import aiofiles
+import aiofiles.os as aos
+from app.utils.log import log
+
+
+def file_digest(fobj: BinaryIO, chunk_size: int = 1024 * 1024) -> str:
+    """分块计算文件对象的SHA-256，计算后复位读取位置"""
+    fobj.seek(0)
+    digest = hashlib.sha256()
+    while chunk := fobj.read(chunk_size):
+        digest.update(chunk)
+    fobj.seek(0)
+    return digest.hexdigest()
+
+
+def cache_key(digest: str, **options: Any) -> str:
+    """内容摘要与处理参数共同组成缓存key"""
+    opts = "&".join(f"{k}={options[k]}" for k in sorted(options))
+    return hashlib.sha256(f"{digest}?{opts}".encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """
+    本地磁盘缓存，按key分目录存放
+      - LRU：超出总大小上限时淘汰最久未访问的条目
+      - TTL：超过有效期的条目在访问或加载时删除
+    索引只在本进程内维护，其他worker写入的条目在未命中时按文件补录
+    """
+
+    def __init__(self, root: str | Path, max_bytes: int, ttl: float):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.index: OrderedDict[str, tuple[int, float]] = OrderedDict()
+        self.size = 0  # 缓存内容总字节数
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def load(self):
+        """启动时扫描磁盘重建索引(同步，放在线程中执行)"""
+        now = time.time()
+        entries = []
+        self.root.mkdir(parents=True, exist_ok=True)
+        for shard in self.root.iterdir():
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard):
+                st = entry.stat()
+                if now - st.st_mtime > self.ttl or entry.name.endswith(".tmp"):
+                    os.unlink(entry.path)
+                    continue
+                entries.append((st.st_mtime, entry.name, st.st_size))
+
+        # 按写入时间排序，近似还原LRU顺序
+        self.index.clear()
+        self.size = 0
+        for mtime, key, size in sorted(entries):
+            self.index[key] = (size, mtime)
+            self.size += size
+        self._shrink()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.index),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+        }
+
+    async def get(self, key: str) -> bytes | None:
+        """读取缓存，未命中或已过期返回None"""
+        entry = self.index.get(key)
+        fpath = self.path(key)
+        if entry is None:
+            # 其他worker写入的条目
+            try:
+                st = await aos.stat(fpath)
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+            entry = (st.st_size, st.st_mtime)
+            self._add(key, *entry)
+
+        size, stored_at = entry
+        if time.time() - stored_at > self.ttl:
+            await self._remove(key)
+            self.misses += 1
+            return None
+
+        try:
+            async with aiofiles.open(fpath, "rb") as f:
+                data = await f.read()
+        except FileNotFoundError:
+            # 被其他worker淘汰
+            self._forget(key)
+            self.misses += 1
+            return None
+
+        self.index.move_to_end(key)
+        self.hits += 1
+        return data
+
+    async def set(self, key: str, data: bytes):
+        """写入缓存(先写临时文件再原子替换)，并按大小上限淘汰"""
+        if len(data) > self.max_bytes:
+            return
+        fpath = self.path(key)
+        tmp_path = fpath.with_name(f"{key}.{os.getpid()}.tmp")
+        try:
+            await aos.makedirs(fpath.parent, exist_ok=True, mode=0o755)
+            async with aiofiles.open(tmp_path, "wb") as f:
+                await f.write(data)
+            await aos.replace(tmp_path, fpath)
+        except OSError as e:
+            log.warning(f"cache write failed: {type(e).__name__}: {e} {key}")
+            return
+
+        self._forget(key)
+        self._add(key, len(data), time.time())
+        await self._shrink_async()
+
+    def _add(self, key: str, size: int, stored_at: float):
+        self.index[key] = (size, stored_at)
+        self.size += size
+
+    def _forget(self, key: str):
+        entry = self.index.pop(key, None)
+        if entry:
+            self.size -= entry[0]
+
+    async def _remove(self, key: str):
+        self._forget(key)
+        self.evictions += 1
+        try:
+            await aos.unlink(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def _shrink(self):
+        """同步淘汰，仅在load中使用"""
+        while self.size > self.max_bytes and self.index:
+            key = next(iter(self.index))
+            self._forget(key)
+            self.evictions += 1
+            try:
+                os.unlink(self.path(key))
+            except FileNotFoundError:
+                pass
+
+    async def _shrink_async(self):
+        while self.size > self.max_bytes and self.index:
+            key = next(iter(self.index))
+            await self._remove(key)
+
+
+class MemoryCache:
+    """
+    进程内LRU缓存，按调用方给出的条目大小(字节)限制总量
+      - LRU：超出总大小上限时淘汰最久未访问的条目
+      - TTL：超过有效期的条目在访问时删除
+    缓存的对象直接返回给所有调用方共享，调用方不可修改
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.items: OrderedDict[str, tuple[Any, int, float]] = OrderedDict()
+        self.size = 0  # 缓存条目总字节数
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.items),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+        }
+
+    def get(self, key: str) -> Any:
+        """读取缓存，未命中或已过期返回None"""
+        item = self.items.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        if time.time() - item[2] > self.ttl:
+            self._pop(key)
+            self.evictions += 1
+            self.misses += 1
+            return None
+        self.items.move_to_end(key)
+        self.hits += 1
+        return item[0]
+
+    def set(self, key: str, value: Any, size: int, stored_at: float | None = None):
+        """
+        写入缓存，并按大小上限淘汰
+        :param stored_at: 写入时间，从下层缓存提升的条目沿用其写入时间，不延长有效期
+        """
+        if size > self.max_bytes:
+            return
+        self._pop(key)
+        self.items[key] = (value, size, time.time() if stored_at is None else stored_at)
+        self.size += size
+        while self.size > self.max_bytes and self.items:
+            self._pop(next(iter(self.items)))
+            self.evictions += 1
+
+    def _pop(self, key: str):
+        item = self.items.pop(key, None)
+        if item:
+            self.size -= item[1]
+
+
+class SingleFlight:
+    """
+    合并相同key的并发调用：首个调用方(leader)执行，其余调用方等待同一结果
+    等待超过timeout(秒)仍未完成时放弃该调用(如leader被取消而未结束)，
+    由超时的调用方重新执行，不会一直阻塞后续的相同调用
+    """
+
+    def __init__(self, timeout: float | None = None):
+        self.timeout = timeout
+        self.calls: dict[str, asyncio.Future] = {}
+
+    def join(self, key: str) -> tuple[asyncio.Future, bool]:
+        """加入key对应的调用，返回(结果Future, 是否为leader)"""
+        fut = self.calls.get(key)
+        if fut is not None:
+            return fut, False
+        fut = asyncio.get_running_loop().create_future()
+        # 无人等待时避免 "exception was never retrieved" 警告
+        fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self.calls[key] = fut
+        return fut, True
+
+    def finish(self, key: str, result: Any = None, exc: BaseException | None = None):
+        """leader设置结果并唤醒所有等待方"""
+        fut = self.calls.pop(key, None)
+        if fut is None or fut.done():
+            return
+        if exc is not None:
+            fut.set_exception(exc)
+        else:
+            fut.set_result(result)
+
+    def expire(self, key: str, fut: asyncio.Future):
+        """放弃超时未完成的调用，等待该调用的其他调用方收到TimeoutError"""
+        if self.calls.get(key) is fut:
+            del self.calls[key]
+        if not fut.done():
+            fut.set_exception(TimeoutError(f"single flight timeout: {self.timeout}"))
+
+    async def wait(self, key: str, fut: asyncio.Future) -> Any:
+        """
+        作为等待方等待结果，超时后放弃该调用并抛出TimeoutError
+        """
+        try:
+            return await asyncio.wait_for(asyncio.shield(fut), self.timeout)
+        except TimeoutError:
+            self.expire(key, fut)
+            raise
+
+    async def do(self, key: str, async_func, *args) -> Any:
+        """执行或等待key对应的调用，等待超时后由本调用方重新执行"""
+        while True:
+            fut, leader = self.join(key)
+            if leader:
+                break
+            try:
+                return await self.wait(key, fut)
+            except TimeoutError:
+                log.warning(f"single flight timeout, retry as leader: {key}")
+        try:
+            result = await async_func(*args)
+        except BaseException as e:
+            self.finish(key, exc=e)
+            raise
+        self.finish(key, result)
+        return result
@@ -0,0 +1,64 @@
+import json
+import struct
+from typing import Any
+from aiofiles.threadpool.binary import AsyncBufferedReader
+
+# 固定头部：魔数、格式版本、元数据字节数；其后为JSON元数据，再之后为原始内容
+MAGIC = b"BZF"
+VERSION = 1
+HEADER = struct.Struct("<3sBI")
+
+
+class FrameError(ValueError):
+    """内容不是有效的分帧格式"""
+
+
+def pack_header(meta: dict[str, Any]) -> bytes:
+    """固定头部 + 元数据，原始内容由调用方直接接在其后写入"""
+    data = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+    return HEADER.pack(MAGIC, VERSION, len(data)) + data
+
+
+def _unpack_fixed(head: bytes) -> int:
+    if len(head) < HEADER.size:
+        raise FrameError("truncated header")
+    magic, version, meta_len = HEADER.unpack_from(head)
+    if magic != MAGIC or version != VERSION:
+        raise FrameError(f"bad header: {magic!r} v{version}")
+    return meta_len
+
+
+def _loads_meta(data: bytes) -> dict[str, Any]:
+    """解析元数据，内容损坏(非UTF-8、非JSON对象)时统一抛出FrameError"""
+    try:
+        meta = json.loads(data)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise FrameError(f"bad metadata: {type(e).__name__}: {e}") from e
+    if not isinstance(meta, dict):
+        raise FrameError(f"bad metadata: {type(meta).__name__}")
+    return meta
+
+
+def unpack(data: bytes | memoryview) -> tuple[dict[str, Any], memoryview]:
+    """
+    拆分内存中的分帧内容
+    :return: (元数据, 原始内容)，原始内容为原缓冲区的视图，不复制
+    """
+    view = memoryview(data)
+    meta_len = _unpack_fixed(view[: HEADER.size])
+    end = HEADER.size + meta_len
+    if len(view) < end:
+        raise FrameError("truncated metadata")
+    return _loads_meta(bytes(view[HEADER.size : end])), view[end:]
+
+
+async def read_header(f: AsyncBufferedReader) -> tuple[dict[str, Any], int]:
+    """
+    从异步文件开头读取元数据，读取位置停在原始内容开头，之后可直接读取或流式发送内容
+    :return: (元数据, 原始内容在文件中的偏移)
+    """
+    meta_len = _unpack_fixed(await f.read(HEADER.size))
+    data = await f.read(meta_len)
+    if len(data) < meta_len:
+        raise FrameError("truncated metadata")
+    return _loads_meta(data), HEADER.size + meta_len
@@ -1,32 +1,161 @@
 import os
+import json
+import uuid
+import queue
+import atexit
 import logging
+import threading
+from functools import lru_cache
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from app.settings import cfg
 
+# 当前请求的关联ID，由RequestIdMiddleware设置，在该请求派生的任务与线程中可见
+request_id: ContextVar[str] = ContextVar("request_id", default="-")
+
+REQUEST_ID_HEADER = "x-request-id"
+
+
+@lru_cache(maxsize=None)
+def short_path(pathname: str) -> str:
+    """代码位置的 父目录/文件名(如 api/upload.py)，每个源文件只计算一次"""
+    filename = os.path.basename(pathname)
+    parent_dir = os.path.basename(os.path.dirname(pathname))
+    return os.path.join(parent_dir, filename)
+
+
+class TextFormatter(logging.Formatter):
+    """文本格式：时间 级别 位置 请求ID 内容"""
+
+    def __init__(self):
+        super().__init__(
+            "%(asctime)s %(levelname)s %(one_level_path)s:%(lineno)d:%(funcName)s"
+            " [%(request_id)s]  %(message)s"
+        )
+
+    def format(self, record):
+        record.one_level_path = short_path(record.pathname)
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{text} (suppressed {suppressed})" if suppressed else text
+
+
+class JsonFormatter(logging.Formatter):
+    """单行JSON格式，便于日志平台按字段检索"""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "loc": f"{short_path(record.pathname)}:{record.lineno}:{record.funcName}",
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RateLimit(logging.Filter):
+    """
+    同一代码位置的重复警告限流：每个时间窗口内前burst条照常输出，
+    之后每sample条输出一条，输出的记录带上此前被丢弃的条数(suppressed)
+    在调用方线程执行，丢弃的记录不进入队列
+    """
+
+    def __init__(self, burst: int, window: float, sample: int):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.sample = max(sample, 1)
+        self.state: dict[tuple[str, int], list] = {}  # 位置 -> [窗口开始, 条数, 丢弃数]
+        self.lock = threading.Lock()
 
-class parent_file_path(logging.Filter):
     def filter(self, record):
-        # 获取文件名（如 upload.py）
-        filename = os.path.basename(record.pathname)
-        # 获取父目录名（如 api）
-        parent_dir = os.path.basename(os.path.dirname(record.pathname))
-        # 组合成：api/upload.py
-        record.one_level_path = os.path.join(parent_dir, filename)
+        if record.levelno != logging.WARNING:
+            return True
+        key = (record.pathname, record.lineno)
+        with self.lock:
+            state = self.state.get(key)
+            if state is None or record.created - state[0] >= self.window:
+                dropped = state[2] if state else 0
+                state = self.state[key] = [record.created, 0, dropped]
+            state[1] += 1
+            over = state[1] - self.burst
+            if over > 0 and over % self.sample:
+                state[2] += 1
+                return False
+            record.suppressed, state[2] = state[2], 0
         return True
 
 
+class ContextQueueHandler(QueueHandler):
+    """
+    入队前只记下请求ID并合并消息参数，格式化与输出在监听线程中完成，
+    不在事件循环中做字符串格式化或阻塞写stderr
+    """
+
+    def prepare(self, record):
+        record.request_id = request_id.get()
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class RequestIdMiddleware:
+    """
+    ASGI中间件：取请求头x-request-id作为关联ID(没有时生成)，写入响应头，
+    请求处理期间的日志与上游调用都带上该ID
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        rid = ""
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER.encode():
+                rid = value.decode("latin-1")[:128]
+                break
+        rid = rid or uuid.uuid4().hex
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((REQUEST_ID_HEADER.encode(), rid.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = request_id.set(rid)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
+
+
 # 创建 logger
 log = logging.getLogger(__name__)
-log.setLevel(logging.INFO)
+log.setLevel(cfg.log_level)
 
-# 创建控制台处理器
+# 控制台处理器在监听线程中格式化并输出
 handler = logging.StreamHandler()
-handler.setLevel(logging.INFO)
+handler.setFormatter(JsonFormatter() if cfg.log_format == "json" else TextFormatter())
 
-# 设置日志格式
-formatter = logging.Formatter(
-    "%(asctime)s %(levelname)s %(one_level_path)s:%(lineno)d:%(funcName)s  %(message)s"
+# 调用方只做限流判断并入队(无界队列，不阻塞)
+log_queue: queue.SimpleQueue = queue.SimpleQueue()
+queue_handler = ContextQueueHandler(log_queue)
+queue_handler.addFilter(
+    RateLimit(cfg.log_rate_burst, cfg.log_rate_window, cfg.log_sample_every)
 )
-handler.setFormatter(formatter)
+log.addHandler(queue_handler)
 
-# 添加处理器到 logger
-handler.addFilter(parent_file_path())
-log.addHandler(handler)
+listener = QueueListener(log_queue, handler)
+listener.start()
+# 进程退出前输出队列中剩余的日志
+atexit.register(listener.stop)
@@ -0,0 +1,507 @@
+import os
+import json
+import time
+import asyncio
+import functools
+import threading
+from bisect import bisect_left
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Callable, Iterator
+from app.settings import cfg
+from app.utils.log import log
+
+# 耗时直方图的默认分桶(秒)：覆盖毫秒级的缓存/存储操作到分钟级的解析等待
+# fmt: off
+DEFAULT_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0,
+)
+# fmt: on
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    """标签值格式化为 {name="value",...}"""
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _num(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    指标基类：按标签值分组的样本，更新时加锁(可能在线程中更新)
+    标签值按 labels 顺序以位置参数传入
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.doc = doc
+        self.labels = tuple(labels)
+        self.samples: dict[tuple, float | list] = {}
+        self.lock = threading.Lock()
+
+    def _key(self, values: tuple) -> tuple:
+        if len(values) != len(self.labels):
+            raise ValueError(f"{self.name}: expected labels {self.labels}")
+        return tuple(str(v) for v in values)
+
+    def snapshot(self) -> dict:
+        """可JSON序列化的样本快照，用于写入多进程目录"""
+        with self.lock:
+            # 直方图样本为可变列表，复制后再交给其他线程序列化
+            samples = [
+                [list(k), v[:] if isinstance(v, list) else v]
+                for k, v in self.samples.items()
+            ]
+        return {
+            "kind": self.kind,
+            "doc": self.doc,
+            "labels": self.labels,
+            "samples": samples,
+        }
+
+
+class Counter(Metric):
+    """只增计数，跨进程求和"""
+
+    kind = "counter"
+
+    def inc(self, *values, amount: float = 1):
+        key = self._key(values)
+        with self.lock:
+            self.samples[key] = self.samples.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    当前值，跨进程合并方式：
+      - livesum：存活进程求和(如在途请求数)
+      - all：按进程分别输出，附加pid标签
+    已退出进程的数值不再计入
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, doc, labels=(), mode: str = "livesum"):
+        super().__init__(name, doc, labels)
+        if mode not in ("livesum", "all"):
+            raise ValueError(f"unsupported gauge mode: {mode}")
+        self.mode = mode
+
+    def set(self, *values, value: float):
+        key = self._key(values)
+        with self.lock:
+            self.samples[key] = value
+
+    def inc(self, *values, amount: float = 1):
+        key = self._key(values)
+        with self.lock:
+            self.samples[key] = self.samples.get(key, 0) + amount
+
+    def dec(self, *values, amount: float = 1):
+        self.inc(*values, amount=-amount)
+
+    @contextmanager
+    def track(self, *values) -> Iterator[None]:
+        """代码块执行期间计数加一(在途数)"""
+        self.inc(*values)
+        try:
+            yield
+        finally:
+            self.dec(*values)
+
+    def snapshot(self) -> dict:
+        return {**super().snapshot(), "mode": self.mode}
+
+
+class Histogram(Metric):
+    """分桶计数 + 总和 + 次数，样本为 [各桶计数..., 总和, 次数]，跨进程逐项求和"""
+
+    kind = "histogram"
+
+    def __init__(self, name, doc, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, *values, value: float):
+        key = self._key(values)
+        idx = bisect_left(self.buckets, value)
+        with self.lock:
+            sample = self.samples.get(key)
+            if sample is None:
+                sample = self.samples[key] = [0] * (len(self.buckets) + 3)
+            sample[idx] += 1
+            sample[-2] += value
+            sample[-1] += 1
+
+    @contextmanager
+    def time(self, *values) -> Iterator[None]:
+        """记录代码块耗时(含异常退出)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(*values, value=time.perf_counter() - start)
+
+    def timed(self, *values):
+        """装饰异步函数，记录每次调用的耗时"""
+
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with self.time(*values):
+                    return await func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def snapshot(self) -> dict:
+        return {**super().snapshot(), "buckets": self.buckets}
+
+
+def _alive(pid: int) -> bool:
+    """进程是否存在(无权限发送信号的进程也视为存在)"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _merge(snapshots: dict[int, dict]) -> dict[str, dict]:
+    """
+    合并各进程快照：计数与直方图求和(含已退出进程，保持单调)，
+    livesum仪表只对存活进程求和，all仪表按pid分别输出
+    """
+    merged = {}
+    for pid, metrics in sorted(snapshots.items()):
+        alive = None
+        for name, snap in metrics.items():
+            out = merged.setdefault(name, {**snap, "samples": {}})
+            gauge = snap["kind"] == "gauge"
+            if gauge:
+                alive = _alive(pid) if alive is None else alive
+                if not alive:
+                    continue
+            for values, value in snap["samples"]:
+                key = tuple(values)
+                if gauge and snap.get("mode") == "all":
+                    key += (str(pid),)
+                prev = out["samples"].get(key)
+                if prev is None:
+                    out["samples"][key] = value
+                elif isinstance(value, list):
+                    out["samples"][key] = [a + b for a, b in zip(prev, value)]
+                else:
+                    out["samples"][key] = prev + value
+    return merged
+
+
+def _render(merged: dict[str, dict]) -> str:
+    """Prometheus文本格式(0.0.4)"""
+    lines = []
+    for name, snap in merged.items():
+        labels = tuple(snap["labels"])
+        if snap["kind"] == "gauge" and snap.get("mode") == "all":
+            labels += ("pid",)
+        lines.append(f"# HELP {name} {snap['doc']}")
+        lines.append(f"# TYPE {name} {snap['kind']}")
+        for key, value in sorted(snap["samples"].items()):
+            if snap["kind"] != "histogram":
+                lines.append(f"{name}{_labels(labels, key)} {_num(value)}")
+                continue
+            cumulative = 0
+            bounds = [*snap["buckets"], float("inf")]
+            for bound, count in zip(bounds, value):
+                cumulative += count
+                le = f'le="{_num(float(bound))}"'
+                lines.append(f"{name}_bucket{_labels(labels, key, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels, key)} {_num(value[-2])}")
+            lines.append(f"{name}_count{_labels(labels, key)} {value[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+class Registry:
+    """
+    进程内指标注册表，/metrics 按Prometheus文本格式输出
+    uvicorn多worker时各进程定期把快照写入共享目录(每进程一个文件)，
+    输出时合并目录下全部快照，任一worker都能给出全局数值
+    目录须为本机目录；各进程启动时删除已退出进程的快照(如上次部署残留)并立即写入自身快照，
+    覆盖进程号被复用的旧文件，运行中退出的worker的计数随之清零(Prometheus按计数器重置处理)
+    """
+
+    def __init__(self, directory: str | Path | None = None, interval: float = 5.0):
+        self.directory = Path(directory) if directory else None
+        self.interval = interval
+        self.metrics: dict[str, Metric] = {}
+        self.collectors: list[Callable[[], None]] = []
+        self.task: asyncio.Task | None = None
+
+    def _register(self, metric: Metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"duplicated metric: {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, doc: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, doc, labels))
+
+    def gauge(self, name, doc, labels=(), mode: str = "livesum") -> Gauge:
+        return self._register(Gauge(name, doc, labels, mode))
+
+    def histogram(self, name, doc, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, doc, labels, buckets))
+
+    def on_collect(self, func: Callable[[], None]) -> Callable[[], None]:
+        """注册采集回调：快照前调用，用于把各模块的统计(如缓存命中)同步到仪表"""
+        self.collectors.append(func)
+        return func
+
+    def snapshot(self) -> dict[str, dict]:
+        for func in self.collectors:
+            try:
+                func()
+            except Exception as e:
+                log.warning(f"metrics collector failed: {type(e).__name__}: {e}")
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def _path(self, pid: int) -> Path:
+        return self.directory / f"{pid}.json"
+
+    def _write(self, snapshot: dict):
+        """原子替换本进程的快照文件"""
+        path = self._path(os.getpid())
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(snapshot), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def _clean(self):
+        """删除已退出进程及本进程号的旧快照(含写入中断残留的临时文件)"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for path in self.directory.iterdir():
+            try:
+                pid = int(path.stem)
+            except ValueError:
+                continue
+            if pid != os.getpid() and _alive(pid):
+                continue
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _read_all(self, own: dict) -> dict[int, dict]:
+        snapshots = {}
+        for path in self.directory.glob("*.json"):
+            try:
+                pid = int(path.stem)
+                if pid != os.getpid():
+                    snapshots[pid] = json.loads(path.read_text(encoding="utf-8"))
+            except (ValueError, OSError) as e:
+                log.warning(f"metrics snapshot unreadable: {path.name}: {e}")
+        snapshots[os.getpid()] = own
+        return snapshots
+
+    def _export(self, own: dict) -> str:
+        # 本进程使用实时快照，其他进程使用最近写入的快照(至多滞后一个写入间隔)
+        if self.directory is None:
+            return _render(_merge({os.getpid(): own}))
+        return _render(_merge(self._read_all(own)))
+
+    async def export(self) -> str:
+        """合并全部进程的指标并输出文本(文件读写在线程中执行)"""
+        return await asyncio.to_thread(self._export, self.snapshot())
+
+    async def flush(self):
+        if self.directory is not None:
+            await asyncio.to_thread(self._write, self.snapshot())
+
+    async def flush_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                log.warning(f"metrics flush failed: {type(e).__name__}: {e}")
+
+    async def __aenter__(self):
+        """启动定期写入快照(未配置目录时只输出本进程指标)"""
+        if self.directory is not None:
+            await asyncio.to_thread(self._clean)
+            await self.flush()
+            self.task = asyncio.create_task(self.flush_loop())
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """退出前写入最终快照，计数不因进程退出丢失"""
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        await self.flush()
+
+    def stats(self, name: str, doc: str, func: Callable[[], dict], mode="all"):
+        """
+        把已有的统计字典(如缓存命中、队列深度)注册为仪表，标签stat为字段名，
+        嵌套字典的字段名以下划线连接，非数值字段忽略
+        默认按进程分别输出：字典中的比率、均值不能跨进程求和，
+        共享目录的缓存索引各进程各有一份
+        """
+        gauge = self.gauge(name, doc, ("stat",), mode)
+
+        def collect():
+            for stat, value in _flatten(func()):
+                gauge.set(stat, value=value)
+
+        self.on_collect(collect)
+        return gauge
+
+
+def _flatten(stats: dict, prefix: str = "") -> Iterator[tuple[str, float]]:
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{prefix}{key}_")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield f"{prefix}{key}", value
+
+
+# 进程内指标注册表，由FastAPI lifespan负责定期写入多进程目录
+registry = Registry(cfg.metrics_dir or None, cfg.metrics_flush_interval)
+
+# 接口请求：按路由模板统计，不按实际路径(避免ID等参数造成标签膨胀)
+HTTP_REQUESTS = registry.counter(
+    "http_requests_total", "接口请求数", ("method", "route", "status")
+)
+HTTP_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "接口耗时(至响应发送完毕)", ("method", "route")
+)
+HTTP_INFLIGHT = registry.gauge("http_requests_in_flight", "正在处理的接口请求数")
+HTTP_BYTES_IN = registry.counter(
+    "http_request_bytes_total", "接口请求体字节数", ("route",)
+)
+HTTP_BYTES_OUT = registry.counter(
+    "http_response_bytes_total", "接口响应体字节数", ("route",)
+)
+
+# 上游服务(mineru-web、Gotenberg)调用
+UPSTREAM_REQUESTS = registry.counter(
+    "upstream_requests_total",
+    "上游请求数，status为HTTP状态码，未收到响应时为异常类型",
+    ("upstream", "op", "status"),
+)
+UPSTREAM_SECONDS = registry.histogram(
+    "upstream_request_duration_seconds", "上游请求耗时", ("upstream", "op")
+)
+UPSTREAM_INFLIGHT = registry.gauge(
+    "upstream_requests_in_flight", "正在进行的上游请求数", ("upstream",)
+)
+UPSTREAM_BYTES_OUT = registry.counter(
+    "upstream_sent_bytes_total", "发往上游的请求体字节数", ("upstream", "op")
+)
+UPSTREAM_BYTES_IN = registry.counter(
+    "upstream_received_bytes_total", "上游返回的响应体字节数", ("upstream", "op")
+)
+
+# 处理阶段：排队、解析、转换、暂存读写等
+STAGE_SECONDS = registry.histogram(
+    "stage_duration_seconds", "各处理阶段耗时", ("stage",)
+)
+STAGE_BYTES = registry.counter(
+    "stage_bytes_total", "各处理阶段读写的字节数", ("stage",)
+)
+
+
+@contextmanager
+def upstream(name: str, op: str, sent: int | None = None) -> Iterator[dict]:
+    """
+    记录一次上游请求：耗时、在途数、状态码与收发字节数
+    调用方把响应写入 call["resp"]，或把状态与接收字节数写入 call["status"]/call["received"]
+    """
+    call = {"resp": None, "status": None, "received": 0}
+    start = time.perf_counter()
+    UPSTREAM_INFLIGHT.inc(name)
+    try:
+        yield call
+    except BaseException as e:
+        call["status"] = call["status"] or type(e).__name__
+        raise
+    finally:
+        UPSTREAM_INFLIGHT.dec(name)
+        UPSTREAM_SECONDS.observe(name, op, value=time.perf_counter() - start)
+        resp = call["resp"]
+        if resp is not None:
+            call["status"] = call["status"] or resp.status_code
+            if not call["received"] and resp.is_closed:
+                call["received"] = len(resp.content)
+        UPSTREAM_REQUESTS.inc(name, op, call["status"] or "none")
+        if sent:
+            UPSTREAM_BYTES_OUT.inc(name, op, amount=sent)
+        if call["received"]:
+            UPSTREAM_BYTES_IN.inc(name, op, amount=call["received"])
+
+
+class MetricsMiddleware:
+    """
+    ASGI中间件：统计接口请求数、耗时、在途数与请求/响应体字节数
+    直接包装receive/send计数，流式响应按实际发送的字节统计，不缓存响应体
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        bytes_in = bytes_out = 0
+
+        async def counting_receive():
+            nonlocal bytes_in
+            message = await receive()
+            bytes_in += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal status, bytes_out
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                bytes_out += len(message.get("body", b""))
+            await send(message)
+
+        start = time.perf_counter()
+        HTTP_INFLIGHT.inc()
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            HTTP_INFLIGHT.dec()
+            # 路由匹配后scope中带有路由对象，未匹配的请求统一归为unmatched
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            HTTP_SECONDS.observe(method, route, value=time.perf_counter() - start)
+            HTTP_REQUESTS.inc(method, route, status)
+            HTTP_BYTES_IN.inc(route, amount=bytes_in)
+            HTTP_BYTES_OUT.inc(route, amount=bytes_out)
@@ -0,0 +1,74 @@
+import uuid
+from collections.abc import AsyncIterable, AsyncIterator
+from fastapi import UploadFile
+
+# 单个文件字段：(字段名, 文件名, 类型, 分块内容, 总字节数或None)
+FilePart = tuple[str, str, str, AsyncIterable[bytes], int | None]
+
+
+async def upload_chunks(
+    file: UploadFile,
+    chunk_size: int = 256 * 1024,
+) -> AsyncIterator[bytes]:
+    """从头分块读取上传文件(落盘部分在线程中读取，不阻塞事件循环)"""
+    await file.seek(0)
+    while chunk := await file.read(chunk_size):
+        yield chunk
+
+
+def part_header(boundary: str, field: str, filename: str, content_type: str) -> bytes:
+    """multipart字段头"""
+    # 与httpx一致：仅转义引号、反斜杠与换行，非ASCII按UTF-8原样发送
+    name = filename.replace("\\", "\\\\").replace('"', "%22")
+    name = name.replace("\r", "%0D").replace("\n", "%0A")
+    return (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="{field}"; filename="{name}"\r\n'
+        f"Content-Type: {content_type or 'application/octet-stream'}\r\n\r\n"
+    ).encode("utf-8")
+
+
+class MultipartStream:
+    """
+    流式multipart/form-data请求体
+    逐块拉取各文件内容并拼接字段头，内存占用与文件大小无关，
+    发送端(httpx)按网络速度拉取，天然形成背压
+    """
+
+    def __init__(self, parts: list[FilePart], boundary: str | None = None):
+        self.parts = parts
+        self.boundary = boundary or uuid.uuid4().hex
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    @property
+    def content_length(self) -> int | None:
+        """各文件大小均已知时给出总长度，否则使用chunked编码"""
+        total = len(self.closing())
+        for field, filename, content_type, _, size in self.parts:
+            if size is None:
+                return None
+            total += len(part_header(self.boundary, field, filename, content_type))
+            total += size + 2
+        return total
+
+    @property
+    def headers(self) -> dict[str, str]:
+        headers = {"Content-Type": self.content_type}
+        length = self.content_length
+        if length is not None:
+            headers["Content-Length"] = str(length)
+        return headers
+
+    def closing(self) -> bytes:
+        return f"--{self.boundary}--\r\n".encode("utf-8")
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        for field, filename, content_type, chunks, _ in self.parts:
+            yield part_header(self.boundary, field, filename, content_type)
+            async for chunk in chunks:
+                yield chunk
+            yield b"\r\n"
+        yield self.closing()
@@ -0,0 +1,194 @@
+import os
+import time
+import asyncio
+import traceback
+import multiprocessing as mp
+from typing import Any, Callable
+from multiprocessing.connection import Connection
+
+# 日志与指标模块只在主进程(run)中导入：spawn的工作进程会重新导入本模块，
+# 模块级导入会让每个工作进程都启动日志监听线程并创建指标注册表
+
+
+def _worker_main(conn: Connection, max_tasks: int):
+    """工作进程主循环：接收(函数, 参数)执行后回传结果，执行满max_tasks次后退出"""
+    conn.send("ready")
+    done = 0
+    while not max_tasks or done < max_tasks:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        func, args = task
+        try:
+            result = (func(*args), "")
+        except Exception as e:
+            result = (None, f"{type(e).__name__}: {e}: {traceback.format_exc()}")
+        conn.send(result)
+        done += 1
+    conn.close()
+
+
+class _Worker:
+    """常驻工作进程及其通信管道"""
+
+    def __init__(self, ctx, max_tasks: int):
+        self.conn, child = ctx.Pipe()
+        self.proc = ctx.Process(target=_worker_main, args=(child, max_tasks))
+        self.proc.daemon = True
+        self.proc.start()
+        child.close()
+        # 等待进程完成启动导入，避免启动耗时计入首个任务的超时
+        self.conn.recv()
+        self.tasks = 0
+
+    def kill(self):
+        self.proc.kill()
+        self.proc.join()
+        self.conn.close()
+
+    def stop(self, timeout: float = 5.0):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.proc.join(timeout)
+        if self.proc.is_alive():
+            self.proc.kill()
+            self.proc.join()
+        self.conn.close()
+
+
+class ProcPool:
+    """
+    常驻多进程池，执行纯Python的CPU密集任务(绕开GIL)
+      - 超时的任务直接杀掉其工作进程并补充新进程，不会拖住整个池
+      - 工作进程执行满max_tasks次后退出重建，限制内存缓慢增长
+    未启动(如脚本直接调用)时退化为线程执行
+    排队等待空闲进程与任务执行(含参数传递)的耗时记为 <name>_pool_wait / <name>_pool_task
+    """
+
+    def __init__(
+        self,
+        workers: int = 0,
+        timeout: float | None = 120.0,
+        max_tasks: int = 50,
+        start_method: str = "spawn",
+        name: str = "proc",
+    ):
+        self.name = name
+        self.size = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.max_tasks = max_tasks
+        self.ctx = mp.get_context(start_method)
+        self.idle: asyncio.Queue[_Worker] | None = None
+        self.workers: set[_Worker] = set()
+        self.killed = 0  # 超时或崩溃被杀掉的进程数
+        self.recycled = 0  # 执行满次数后重建的进程数
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self.ctx, self.max_tasks)
+        self.workers.add(worker)
+        return worker
+
+    async def __aenter__(self):
+        """启动全部工作进程"""
+        self.idle = asyncio.Queue()
+        for _ in range(self.size):
+            self.idle.put_nowait(await asyncio.to_thread(self._spawn))
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """通知工作进程退出并回收"""
+        workers, self.workers = self.workers, set()
+        self.idle = None
+        await asyncio.gather(*(asyncio.to_thread(w.stop) for w in workers))
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self.workers),
+            "idle": self.idle.qsize() if self.idle else 0,
+            "killed": self.killed,
+            "recycled": self.recycled,
+        }
+
+    async def _readable(self, conn: Connection, timeout: float | None) -> bool:
+        """等待工作进程回传结果，超时返回False"""
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        fd = conn.fileno()
+        loop.add_reader(fd, lambda: fut.done() or fut.set_result(True))
+        try:
+            async with asyncio.timeout(timeout):
+                await fut
+            return True
+        except TimeoutError:
+            return False
+        finally:
+            loop.remove_reader(fd)
+
+    async def _replace(self, worker: _Worker, kill: bool) -> _Worker:
+        self.workers.discard(worker)
+        if kill:
+            await asyncio.to_thread(worker.kill)
+        else:
+            await asyncio.to_thread(worker.stop)
+        return await asyncio.to_thread(self._spawn)
+
+    async def run(
+        self,
+        func: Callable[..., Any],
+        *args: Any,
+        timeout: float | None = None,
+    ) -> tuple[Any, str]:
+        """
+        在工作进程中执行func(*args)，func与参数需可pickle
+        :param timeout: 任务超时(秒)，默认使用池配置
+        :return: (结果, 错误信息)
+        """
+        if self.idle is None:
+            try:
+                return await asyncio.to_thread(func, *args), ""
+            except Exception as e:
+                return None, f"{type(e).__name__}: {e}: {traceback.format_exc()}"
+
+        from app.utils.log import log
+        from app.utils.metrics import STAGE_SECONDS
+
+        timeout = self.timeout if timeout is None else timeout
+        idle = self.idle
+        start = time.perf_counter()
+        worker = await idle.get()
+        started = time.perf_counter()
+        STAGE_SECONDS.observe(f"{self.name}_pool_wait", value=started - start)
+        try:
+            await asyncio.to_thread(worker.conn.send, (func, args))
+            if not await self._readable(worker.conn, timeout):
+                # 超时：杀掉进程，正在执行的任务随之终止
+                self.killed += 1
+                log.warning(f"process task timeout: {timeout} {func.__name__}")
+                worker = await self._replace(worker, kill=True)
+                return None, f"timeout: {timeout}"
+            result = await asyncio.to_thread(worker.conn.recv)
+            worker.tasks += 1
+        except (EOFError, OSError) as e:
+            # 工作进程崩溃(如内存不足被系统杀掉)
+            self.killed += 1
+            msg = f"worker died: {type(e).__name__}: {e}"
+            log.warning(f"{msg} {func.__name__}")
+            worker = await self._replace(worker, kill=True)
+            return None, msg
+        except BaseException:
+            # 调用方取消时进程状态未知，直接重建
+            worker = await self._replace(worker, kill=True)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            STAGE_SECONDS.observe(f"{self.name}_pool_task", value=elapsed)
+            if self.max_tasks and worker.tasks >= self.max_tasks:
+                self.recycled += 1
+                worker = await self._replace(worker, kill=False)
+            idle.put_nowait(worker)
+        return result
@@ -0,0 +1,351 @@
+import json
+import time
+import codecs
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from urllib.parse import quote
+from collections.abc import AsyncIterable, AsyncIterator
+import aiofiles
+import aiofiles.os as aos
+from app.settings import cfg
+from app.utils.log import log
+from app.utils.framing import FrameError, pack_header, read_header
+from app.utils.metrics import STAGE_BYTES, STAGE_SECONDS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_created ON results (created_at);
+"""
+
+
+def _insert(conn, row: dict):
+    conn.execute(
+        "INSERT INTO results (id, kind, user_id, filename, size, created_at)"
+        " VALUES (:id, :kind, :user_id, :filename, :size, :created_at)",
+        row,
+    )
+
+
+def _take(conn, kind: str, user_id: str, result_id: int) -> sqlite3.Row | None:
+    """取走结果：删除索引并返回元数据，并发读取同一结果时只有一个能取到"""
+    return conn.execute(
+        "DELETE FROM results WHERE id=? AND kind=? AND user_id=?"
+        " RETURNING id, filename, size, created_at",
+        (result_id, kind, user_id),
+    ).fetchone()
+
+
+def _expire(conn, before: float, limit: int) -> list[int]:
+    """删除一批过期结果的索引，返回其ID"""
+    rows = conn.execute(
+        "DELETE FROM results WHERE id IN"
+        " (SELECT id FROM results WHERE created_at<? LIMIT ?) RETURNING id",
+        (before, limit),
+    ).fetchall()
+    return [row["id"] for row in rows]
+
+
+def content_headers(meta: dict) -> dict[str, str]:
+    """直接返回结果内容时的响应头：长度、内容类型，ID与文件名(URL编码)"""
+    filename = quote(meta["filename"])
+    return {
+        "Content-Length": str(meta["size"]),
+        "Content-Type": meta.get("content_type", "application/octet-stream"),
+        "Content-Disposition": f"inline; filename*=UTF-8''{filename}",
+        "X-File-Id": str(meta["id"]),
+        "X-Filename": filename,
+    }
+
+
+class ResultStore:
+    """
+    暂存的处理结果，上传后按ID取回一次
+      - 内容按ID摘要分两级目录存放，单目录文件数不随总量增长
+      - 文件为分帧格式：固定头部与元数据之后为原始内容，读取时跳过头部直接读内容
+      - 元数据(文件名、用户、大小、创建时间)存于SQLite索引，按ID主键查找
+      - 后台定期清理超过有效期未取走的结果
+    多个worker共享同一目录与索引；sqlite3为阻塞调用，在线程中执行，单连接由锁串行化
+    """
+
+    def __init__(
+        self,
+        root: str | Path,
+        db_path: str | Path,
+        ttl: float,
+        sweep_interval: float = 60.0,
+    ):
+        self.root = Path(root)
+        self.db_path = Path(db_path)
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.conn: sqlite3.Connection | None = None
+        self.lock = threading.Lock()
+        self.task: asyncio.Task | None = None
+
+    def open(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(
+            self.db_path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    async def __aenter__(self):
+        """打开索引并启动过期清理"""
+        await asyncio.to_thread(self.open)
+        self.task = asyncio.create_task(self.sweep_loop())
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.close()
+
+    def _run(self, func, *args):
+        with self.lock:
+            return func(self.conn, *args)
+
+    async def run(self, func, *args):
+        """在线程中执行 func(conn, *args)"""
+        return await asyncio.to_thread(self._run, func, *args)
+
+    def path(self, result_id: int) -> Path:
+        """ID摘要的前两个字节作为两级目录"""
+        digest = hashlib.blake2b(str(result_id).encode(), digest_size=2).hexdigest()
+        return self.root / digest[:2] / digest[2:] / str(result_id)
+
+    async def put(
+        self,
+        kind: str,
+        user_id: str,
+        result_id: int,
+        filename: str,
+        content: bytes,
+        content_type: str = "application/octet-stream",
+    ):
+        """写入结果内容后登记索引，索引可见时内容已完整落盘"""
+        row = self._row(kind, user_id, result_id, filename, len(content))
+        fpath = self.path(result_id)
+        with STAGE_SECONDS.time("result_put"):
+            await aos.makedirs(fpath.parent, exist_ok=True, mode=0o755)
+            async with aiofiles.open(fpath, "wb") as f:
+                # 文件自带元数据(含内容类型)，索引丢失时仍可识别
+                await f.writelines(
+                    (pack_header({**row, "content_type": content_type}), content)
+                )
+            await self._register(row)
+        STAGE_BYTES.inc("result_put", amount=len(content))
+
+    async def put_chunks(
+        self,
+        kind: str,
+        user_id: str,
+        result_id: int,
+        filename: str,
+        chunks: AsyncIterable[bytes],
+        size: int,
+        content_type: str = "application/octet-stream",
+    ):
+        """
+        分块写入结果内容，内存占用与内容大小无关
+        :param size: 内容总字节数，与实际写入不符时放弃写入
+        分块迭代中抛出的异常(如内容校验失败)原样抛出，已写入的部分删除
+        """
+        row = self._row(kind, user_id, result_id, filename, size)
+        fpath = self.path(result_id)
+        start = time.perf_counter()
+        await aos.makedirs(fpath.parent, exist_ok=True, mode=0o755)
+        written = 0
+        try:
+            async with aiofiles.open(fpath, "wb") as f:
+                await f.write(pack_header({**row, "content_type": content_type}))
+                async for chunk in chunks:
+                    await f.write(chunk)
+                    written += len(chunk)
+            if written != size:
+                raise ValueError(f"size mismatch: {written} != {size}")
+        except BaseException:
+            await self._unlink(result_id)
+            raise
+        await self._register(row)
+        # 耗时含分块迭代(如上传内容的读取与校验)
+        STAGE_SECONDS.observe("result_put", value=time.perf_counter() - start)
+        STAGE_BYTES.inc("result_put", amount=written)
+
+    @staticmethod
+    def _row(kind: str, user_id: str, result_id: int, filename: str, size: int):
+        return {
+            "id": result_id,
+            "kind": kind,
+            "user_id": user_id,
+            "filename": filename,
+            "size": size,
+            "created_at": time.time(),
+        }
+
+    async def _register(self, row: dict):
+        """内容落盘后登记索引，登记失败时删除内容"""
+        try:
+            await self.run(_insert, row)
+        except BaseException:
+            await self._unlink(row["id"])
+            raise
+
+    async def _claim(self, kind: str, user_id: str, result_id: int):
+        """
+        取走结果：删除索引，打开文件并跳过头部后即删除路径(已打开的文件仍可读完)，
+        读取中断也不会遗留文件
+        :return: ((元数据, 停在内容开头的文件), 错误信息)，
+                 不存在、已取走、已过期或文件头损坏时结果为None
+        """
+        not_found = None, f"file not found of id: {result_id}"
+        row = await self.run(_take, kind, user_id, result_id)
+        if row is None:
+            return not_found
+        if time.time() - row["created_at"] > self.ttl:
+            await self._unlink(result_id)
+            return not_found
+        try:
+            f = await aiofiles.open(self.path(result_id), "rb")
+        except FileNotFoundError:
+            return not_found
+        try:
+            meta, _ = await read_header(f)
+        except FrameError as e:
+            await f.close()
+            log.warning(f"result file corrupt: {e} {result_id}")
+            return None, f"corrupt result of id: {result_id}: {e}"
+        except BaseException:
+            await f.close()
+            raise
+        finally:
+            await self._unlink(result_id)
+        return (meta, f), ""
+
+    async def take(
+        self, kind: str, user_id: str, result_id: int
+    ) -> tuple[tuple[dict, bytes] | None, str]:
+        """
+        取走结果(读取后删除)
+        :return: ((元数据, 内容), 错误信息)，不存在、已取走、已过期或损坏时结果为None
+        """
+        with STAGE_SECONDS.time("result_take"):
+            claimed, msg = await self._claim(kind, user_id, result_id)
+            if claimed is None:
+                return None, msg
+            meta, f = claimed
+            try:
+                content = await f.read()
+            finally:
+                await f.close()
+        STAGE_BYTES.inc("result_take", amount=len(content))
+        return (meta, content), ""
+
+    async def take_stream(
+        self,
+        kind: str,
+        user_id: str,
+        result_id: int,
+        chunk_size: int = 256 * 1024,
+    ) -> tuple[tuple[dict, AsyncIterator[bytes]] | None, str]:
+        """
+        取走结果并分块读取内容，内存占用与内容大小无关
+        :return: ((元数据, 分块内容), 错误信息)，不存在、已取走、已过期或损坏时结果为None
+        """
+        # 流式读取的耗时取决于客户端接收速度，只记录取走(打开)耗时，字节数按实际读取累计
+        with STAGE_SECONDS.time("result_take"):
+            claimed, msg = await self._claim(kind, user_id, result_id)
+        if claimed is None:
+            return None, msg
+        meta, f = claimed
+
+        async def chunks():
+            try:
+                while chunk := await f.read(chunk_size):
+                    STAGE_BYTES.inc("result_take", amount=len(chunk))
+                    yield chunk
+            finally:
+                await f.close()
+
+        return (meta, chunks()), ""
+
+    async def iter_ndjson(
+        self, kind: str, user_id: str, result_ids: list[int]
+    ) -> AsyncIterator[str]:
+        """
+        逐个取走结果，每个结果输出一行JSON：{"id", "user_id", "filename", "content"}，
+        不存在或损坏的结果输出 {"id", "error"}
+        内容按块转义输出，不在内存中组装完整内容，非UTF-8内容中的非法字节替换为U+FFFD
+        """
+        for result_id in result_ids:
+            taken, msg = await self.take_stream(kind, user_id, result_id)
+            if taken is None:
+                line = {"id": result_id, "error": msg}
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+                continue
+
+            meta, chunks = taken
+            head = {"id": result_id, "user_id": user_id, "filename": meta["filename"]}
+            yield json.dumps(head, ensure_ascii=False)[:-1] + ', "content": "'
+            # 增量解码，多字节字符跨块时留到下一块；非法字节替换为U+FFFD，不中断整个流
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            async for chunk in chunks:
+                yield json.dumps(decoder.decode(chunk), ensure_ascii=False)[1:-1]
+            yield json.dumps(decoder.decode(b"", final=True), ensure_ascii=False)[1:-1]
+            yield '"}\n'
+
+    async def _unlink(self, result_id: int):
+        try:
+            await aos.unlink(self.path(result_id))
+        except FileNotFoundError:
+            pass
+
+    async def sweep(self, batch: int = 1000) -> int:
+        """清理过期结果，返回清理数量"""
+        before = time.time() - self.ttl
+        total = 0
+        while ids := await self.run(_expire, before, batch):
+            for result_id in ids:
+                await self._unlink(result_id)
+            total += len(ids)
+        return total
+
+    async def sweep_loop(self):
+        while True:
+            try:
+                count = await self.sweep()
+                if count:
+                    log.info(f"result store swept: {count}")
+            except Exception as e:
+                log.warning(f"result sweep failed: {type(e).__name__}: {e}")
+            await asyncio.sleep(self.sweep_interval)
+
+
+# 进程内共享的结果存储(md与Excel上传结果)，由FastAPI lifespan负责开启和关闭
+result_store = ResultStore(
+    cfg.result_dir,
+    cfg.result_db,
+    ttl=cfg.result_ttl,
+    sweep_interval=cfg.result_sweep_interval,
+)
@@ -0,0 +1,97 @@
+"""
+batch_async 的吞吐与峰值内存：改动前(一次创建全部任务+信号量+gather)与改动后(固定数量工作协程)对比
+
+    python benchmarks/bench_batch_async.py [--workers 并发数] [任务数 ...]
+
+每个任务只让出一次事件循环，测的是调度本身的开销：
+  - old：改动前的实现(原样保留在本脚本中)，返回结果列表
+  - batch_async：改动后的实现，返回结果列表
+  - batch_async_iter：逐个消费结果、不保留，峰值内存与任务数无关
+峰值内存为tracemalloc统计的Python分配峰值，耗时在关闭tracemalloc时单独测量
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+import traceback
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.utils.batch import batch_async, batch_async_iter  # noqa: E402
+
+
+async def batch_async_old(async_func, items, workers=10, timeout=30.0):
+    """改动前的 batch_async"""
+    semaphore = asyncio.Semaphore(workers)
+
+    async def _wrapped(idx, item):
+        async with semaphore:
+            try:
+                if timeout is not None:
+                    result = await asyncio.wait_for(async_func(item), timeout=timeout)
+                else:
+                    result = await async_func(item)
+                return (True, idx, item, result)
+            except asyncio.TimeoutError:
+                err_msg = f"timeout: {timeout}"
+            except Exception as e:
+                err_msg = f"{type(e).__name__}: {e}: {traceback.format_exc()}"
+            return (False, idx, item, err_msg)
+
+    tasks = [asyncio.create_task(_wrapped(i, item)) for i, item in enumerate(items)]
+    return await asyncio.gather(*tasks)
+
+
+async def work(item: int) -> int:
+    await asyncio.sleep(0)
+    return item
+
+
+async def consume_iter(items, workers):
+    count = 0
+    async for _ in batch_async_iter(work, items, workers):
+        count += 1
+    return count
+
+
+CASES = {
+    "old": lambda n, w: batch_async_old(work, range(n), w),
+    "batch_async": lambda n, w: batch_async(work, range(n), w),
+    "batch_async_iter": lambda n, w: consume_iter(range(n), w),
+}
+
+
+def measure(case: str, n: int, workers: int) -> tuple[float, float]:
+    """返回(耗时秒, 峰值内存MB)"""
+    start = time.perf_counter()
+    asyncio.run(CASES[case](n, workers))
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    asyncio.run(CASES[case](n, workers))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=10)
+    parser.add_argument("counts", nargs="*", type=int, default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    print(f"{'items':>8} {'impl':>18} {'seconds':>8} {'items/s':>10} {'peak MB':>8}")
+    for n in args.counts:
+        for case in CASES:
+            elapsed, peak = measure(case, n, args.workers)
+            print(
+                f"{n:>8} {case:>18} {elapsed:>8.3f}"
+                f" {n / elapsed:>10.0f} {peak:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
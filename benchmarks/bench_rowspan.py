@@ -0,0 +1,72 @@
+"""
+rowspan 密集的大表格上 group_logic_cols / rows_occupied 的耗时
+
+    python benchmarks/bench_rowspan.py [--app-dir 其他版本的代码目录] [行数 ...]
+
+每1000行以一个 rowspan=1000、colspan=100 的单元格开头，另有一列每10行一个 rowspan=10，
+其余为普通单元格；被占用的列数始终在百列以上，逐行重建占用状态的实现耗时与 行数×占用列数 成正比
+各行数在独立子进程中解析并计时，--app-dir 指向旧版本的检出目录即可对比改动前后
+"""
+
+import sys
+import time
+import argparse
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def make_rows(rows: int) -> list:
+    from lxml import etree
+
+    html = ["<table>"]
+    for r in range(rows):
+        html.append("<tr>")
+        if r % 1000 == 0:
+            html.append('<th rowspan="1000" colspan="100">block</th>')
+        if r % 10 == 0:
+            html.append('<td rowspan="10">group</td>')
+        html.append("<td>a</td><td>b</td><td>c</td><td>d</td><td>e</td></tr>")
+    html.append("</table>")
+    return etree.HTML("".join(html)).findall(".//tr")
+
+
+def child(app_dir: str, rows: int):
+    """子进程：输出两个函数各自的耗时(秒)"""
+    sys.path.insert(0, app_dir)
+    from app.excel.html import group_logic_cols, rows_occupied
+
+    trs = make_rows(rows)
+    times = []
+    for func in (group_logic_cols, rows_occupied):
+        start = time.perf_counter()
+        func(trs)
+        times.append(time.perf_counter() - start)
+    print(*times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--app-dir", default=str(ROOT))
+    parser.add_argument("rows", nargs="*", type=int, default=[10_000, 50_000])
+    parser.add_argument("--child", type=int, metavar="ROWS")
+    args = parser.parse_args()
+    if args.child:
+        return child(args.app_dir, args.child)
+
+    print(f"{'rows':>7} {'group_logic_cols':>17} {'rows_occupied':>14}")
+    for rows in args.rows:
+        cmd = [sys.executable, __file__, "--app-dir", args.app_dir]
+        out = subprocess.run(
+            [*cmd, "--child", str(rows)],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout
+        logic, occupied = map(float, out.split())
+        print(f"{rows:>7} {logic:>16.3f}s {occupied:>13.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+上传解析接口的峰值内存随文件大小的变化
+
+    python benchmarks/bench_upload_rss.py [--app-dir 其他版本的代码目录] [文件大小MB ...]
+
+本地起一个模拟的mineru-web(读完并丢弃上传内容，状态直接返回parsed)，
+每个接口、每个文件大小重启一次服务并上传一次，输出服务进程峰值内存(VmHWM)相对上传前的增量：
+  - /api/parse_file：multipart上传，经流式multipart转发到mineru-web
+  - /api/parse_file_raw：请求体为文档原始字节，边接收边转发(旧版本没有该接口)
+--app-dir 指向旧版本的检出目录即可对比改动前后
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+import httpx
+
+MINERU_PORT = 8799
+APP_PORT = 8798
+
+
+async def mineru(scope, receive, send):
+    """模拟mineru-web：上传读完即丢弃，查询状态一律为parsed"""
+    if scope["type"] != "http":
+        return
+    while (await receive()).get("more_body"):
+        pass
+    path = scope["path"]
+    if path == "/api/upload":
+        body = {"files": [{"id": "1", "filename": "f.pdf"}]}
+    elif path.endswith("/parsed_content"):
+        body = "parsed"
+    else:
+        body = {"status": "parsed"}
+    data = json.dumps(body).encode()
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": data})
+
+
+def vm_hwm(pid: int) -> int:
+    """进程峰值常驻内存(KB)"""
+    for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+        if line.startswith("VmHWM"):
+            return int(line.split()[1])
+    return 0
+
+
+def start_app(app_dir: Path, work: Path) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "MINERU_URL": f"http://127.0.0.1:{MINERU_PORT}",
+        "MINERU_CACHE_ENABLED": "false",
+        "MINERU_POLL_INITIAL": "0.01",
+        "MINERU_CACHE_DIR": str(work / "mineru"),
+        "MINERU_JOB_DB": str(work / "jobs.db"),
+        "EXCEL_WORKERS": "1",
+        "EXCEL_IMAGE_DIR": str(work / "images"),
+        "EXCEL_CACHE_DIR": str(work / "excel"),
+        "RESULT_DIR": str(work / "results"),
+        "RESULT_DB": str(work / "results.db"),
+        "ID_LOCK_DIR": str(work / "ids"),
+        "METRICS_DIR": "",
+    }
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(APP_PORT)],
+        cwd=app_dir,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{APP_PORT}/docs")
+            return proc
+        except httpx.TransportError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("app server did not start")
+
+
+def upload(endpoint: str, path: str):
+    url = f"http://127.0.0.1:{APP_PORT}/api/{endpoint}"
+    headers = {"x-user-id": "bench"}
+    with open(path, "rb") as f:
+        if endpoint == "parse_file":
+            files = {"file": ("f.pdf", f, "application/pdf")}
+            resp = httpx.post(url, headers=headers, files=files, timeout=600)
+        else:
+            headers["content-type"] = "application/pdf"
+            resp = httpx.post(
+                url,
+                headers=headers,
+                params={"filename": "f.pdf"},
+                content=iter(lambda: f.read(1024 * 1024), b""),
+                timeout=600,
+            )
+    return resp
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--app-dir", default=str(Path(__file__).resolve().parents[1]))
+    parser.add_argument("sizes", nargs="*", type=int, default=[50, 100, 200])
+    args = parser.parse_args()
+
+    code = "import uvicorn, bench_upload_rss as b; "
+    code += f"uvicorn.run(b.mineru, port={MINERU_PORT})"
+    mineru_proc = subprocess.Popen(
+        [sys.executable, "-c", code],
+        cwd=Path(__file__).parent,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    time.sleep(2)
+    try:
+        print(
+            f"{'size':>8} {'endpoint':>16} {'status':>6}"
+            f" {'peak +MB':>10} {'seconds':>8}"
+        )
+        for size_mb in args.sizes:
+            with tempfile.NamedTemporaryFile(suffix=".pdf") as tmp:
+                chunk = os.urandom(1024 * 1024)
+                for _ in range(size_mb):
+                    tmp.write(chunk)
+                tmp.flush()
+                for endpoint in ("parse_file", "parse_file_raw"):
+                    with tempfile.TemporaryDirectory() as work:
+                        app = start_app(Path(args.app_dir), Path(work))
+                        try:
+                            base = vm_hwm(app.pid)
+                            start = time.perf_counter()
+                            resp = upload(endpoint, tmp.name)
+                            elapsed = time.perf_counter() - start
+                            peak = (vm_hwm(app.pid) - base) / 1024
+                        finally:
+                            app.terminate()
+                            app.wait()
+                    print(
+                        f"{size_mb:>6}MB {endpoint:>16} {resp.status_code:>6}"
+                        f" {peak:>10.1f} {elapsed:>8.2f}"
+                    )
+    finally:
+        mineru_proc.terminate()
+
+
+if __name__ == "__main__":
+    main()
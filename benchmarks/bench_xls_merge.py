@@ -0,0 +1,77 @@
+"""
+xls 转换耗时随行数与合并区域数的变化
+
+    python benchmarks/bench_xls_merge.py [--app-dir 其他版本的代码目录] [行数 ...]
+
+生成带前置空行/列的xls(需安装xlwt)，每行3个合并区域、6个数字单元格，
+合并区域数与行数成正比；每个文件在独立子进程中用 xls_to_html 转换一次，
+输出耗时与每千行耗时，实现为线性时每千行耗时应基本不变
+--app-dir 指向旧版本的检出目录即可对比改动前后
+"""
+
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def make_xls(path: Path, rows: int):
+    import xlwt
+
+    wb = xlwt.Workbook()
+    ws = wb.add_sheet("data")
+    bold = xlwt.easyxf("font: bold on")
+    # 前2行、前1列为空
+    for r in range(2, rows + 2):
+        ws.write_merge(r, r, 1, 3, f"m{r}", bold)
+        ws.write_merge(r, r, 4, 5, r)
+        for c in range(6, 12):
+            ws.write(r, c, r * c)
+        if r % 2 == 0 and r + 1 < rows + 2:
+            ws.write_merge(r, r + 1, 12, 12, "v")
+    wb.save(str(path))
+
+
+def child(app_dir: str, path: str):
+    """子进程：转换一次并输出耗时(秒)"""
+    sys.path.insert(0, app_dir)
+    from app.excel.xls import xls_to_html
+
+    start = time.perf_counter()
+    xls_to_html(path)
+    print(time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--app-dir", default=str(ROOT))
+    parser.add_argument("rows", nargs="*", type=int, default=[1000, 2000, 4000, 8000])
+    parser.add_argument("--child", metavar="PATH")
+    args = parser.parse_args()
+    if args.child:
+        return child(args.app_dir, args.child)
+
+    print(f"{'rows':>7} {'merges':>7} {'seconds':>8} {'ms/1k rows':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            path = Path(tmp) / f"{rows}.xls"
+            make_xls(path, rows)
+            merges = rows * 2 + rows // 2
+            cmd = [sys.executable, __file__, "--app-dir", args.app_dir]
+            out = subprocess.run(
+                [*cmd, "--child", str(path)],
+                capture_output=True,
+                check=True,
+                text=True,
+            ).stdout
+            elapsed = float(out)
+            per_k = elapsed / rows * 1000 * 1000
+            print(f"{rows:>7} {merges:>7} {elapsed:>8.3f} {per_k:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
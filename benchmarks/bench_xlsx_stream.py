@@ -0,0 +1,91 @@
+"""
+xlsx 流式解析与完整解析的峰值内存、耗时对比
+
+    python benchmarks/bench_xlsx_stream.py [单元格数 ...]
+
+生成 单元格数/10 行 × 10 列 的工作簿(字符串与数字各半，含少量合并单元格)，
+每种解析方式在独立子进程中转换一次，输出子进程峰值内存(VmHWM)相对转换前的增量与耗时：
+  - full：完整解析(openpyxl构建全部Cell对象)
+  - stream：只读流式解析(stream_min_bytes=0)
+"""
+
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from openpyxl import Workbook
+
+ROOT = Path(__file__).resolve().parents[1]
+COLS = 10
+
+
+def vm_hwm() -> int:
+    """本进程峰值常驻内存(KB)"""
+    for line in Path("/proc/self/status").read_text().splitlines():
+        if line.startswith("VmHWM"):
+            return int(line.split()[1])
+    return 0
+
+
+def make_workbook(path: Path, cells: int):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("data")
+    rows = max(cells // COLS, 1)
+    # 每100行一个跨两列的合并表头
+    for r in range(1, rows + 1, 100):
+        ws.merged_cells.add(f"A{r}:B{r}")
+    for r in range(1, rows + 1):
+        ws.append([f"s{r}-{c}" if c % 2 else r * c for c in range(COLS)])
+    wb.save(path)
+
+
+def child(path: str, mode: str):
+    """子进程：转换一次，输出耗时与峰值内存增量"""
+    sys.path.insert(0, str(ROOT))
+    from app.excel.xlsx import xlsx_to_tables
+
+    base = vm_hwm()
+    start = time.perf_counter()
+    tables = xlsx_to_tables(path, 0 if mode == "stream" else None)
+    elapsed = time.perf_counter() - start
+    size = sum(len(table or "") for _, table, _ in tables)
+    print(json.dumps({"seconds": elapsed, "peak_kb": vm_hwm() - base, "size": size}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    default = [10_000, 100_000, 1_000_000]
+    parser.add_argument("cells", nargs="*", type=int, default=default)
+    parser.add_argument("--child", nargs=2, metavar=("PATH", "MODE"))
+    args = parser.parse_args()
+    if args.child:
+        return child(*args.child)
+
+    print(
+        f"{'cells':>9} {'file MB':>8} {'mode':>7} {'seconds':>8}"
+        f" {'peak +MB':>9} {'html MB':>8}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for cells in args.cells:
+            path = Path(tmp) / f"{cells}.xlsx"
+            make_workbook(path, cells)
+            file_mb = path.stat().st_size / 1024 / 1024
+            for mode in ("full", "stream"):
+                out = subprocess.run(
+                    [sys.executable, __file__, "--child", str(path), mode],
+                    capture_output=True,
+                    check=True,
+                    text=True,
+                ).stdout
+                res = json.loads(out)
+                print(
+                    f"{cells:>9} {file_mb:>8.2f} {mode:>7} {res['seconds']:>8.2f}"
+                    f" {res['peak_kb'] / 1024:>9.1f} {res['size'] / 1024 / 1024:>8.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import pytest
+from app.utils import autoid
+
+
+@pytest.fixture
+def fresh_allocator(tmp_path, monkeypatch):
+    """每个用例重新创建分配器，使用独立的槽位锁目录"""
+    monkeypatch.setattr(autoid, "_allocator", None)
+    monkeypatch.setattr(autoid, "_slot_fd", None)
+    monkeypatch.setattr(autoid.cfg, "id_lock_dir", str(tmp_path))
+    monkeypatch.setattr(autoid.cfg, "id_worker_bits", 4)
+
+
+def test_private_ip_host_id_is_folded(fresh_allocator, monkeypatch):
+    """私有IP低16位超出主机号位数(如172.17.30.21 → 7701)时折叠而不是启动失败"""
+    monkeypatch.setattr(autoid.cfg, "id_host_id", None)
+    monkeypatch.setattr(autoid, "_lower_16bit_private_ip", lambda: 7701)
+    machine_id = autoid.allocator().machine_id
+    assert machine_id >> 4 == autoid.fold_bits(7701, 12) < 4096
+    assert machine_id >> 4 != 7701 & 4095
+
+
+def test_explicit_host_id_out_of_range_fails(fresh_allocator, monkeypatch):
+    monkeypatch.setattr(autoid.cfg, "id_host_id", 4096)
+    with pytest.raises(RuntimeError, match="id_host_id 4096"):
+        autoid.allocator()
+
+
+def test_fold_bits():
+    assert autoid.fold_bits(4095, 12) == 4095
+    assert autoid.fold_bits(0x1E15, 12) == 0xE15 ^ 0x1
+    assert autoid.fold_bits(0xFFFF, 0) == 0
@@ -0,0 +1,41 @@
+import asyncio
+from app.excel import convert_html as ch
+from app.utils.cache import DiskCache, MemoryCache
+
+
+def test_result_cache_round_trip(tmp_path, monkeypatch):
+    """内存层缓存序列化后的内容并按其长度计量；引用的图片被删除后结果失效"""
+    memory = MemoryCache(1024 * 1024, ttl=3600)
+    disk = DiskCache(tmp_path / "results", max_bytes=1024 * 1024, ttl=3600)
+    images = DiskCache(tmp_path / "images", max_bytes=1024 * 1024, ttl=3600)
+    monkeypatch.setattr(ch, "result_memory", memory)
+    monkeypatch.setattr(ch, "result_cache", disk)
+    monkeypatch.setattr(ch, "image_store", images)
+
+    cnt = [{"name": "s1", "rows": [["a", 1], ["b", None]]}]
+    image_id = "ab" * 32 + ".png"
+
+    async def run():
+        disk.load()
+        images.load()
+        await ch.save_images({image_id: b"png"})
+        await ch.set_result("k1", "json", cnt, [image_id])
+        cached = await ch.get_result("k1")
+
+        # 磁盘层命中时提升到内存层
+        memory.items.clear()
+        memory.size = 0
+        promoted = await ch.get_result("k1")
+
+        # 图片文件被其他worker淘汰，本进程索引仍有记录
+        images.path(image_id).unlink()
+        missing = await ch.get_result("k1")
+        return cached, promoted, missing
+
+    cached, promoted, missing = asyncio.run(run())
+    assert cached == cnt
+    assert promoted == cnt
+    data = memory.items["k1"][0]
+    assert isinstance(data, bytes)
+    assert memory.size == len(data)
+    assert missing is None
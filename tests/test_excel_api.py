@@ -0,0 +1,15 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.excel import api
+
+
+def test_arrow_without_pyarrow_is_501(monkeypatch):
+    """未安装pyarrow时，arrow/parquet格式直接返回501"""
+    monkeypatch.setattr(api, "arrow_available", lambda: False)
+    app = FastAPI()
+    app.include_router(api.router)
+    files = {"file": ("a.xlsx", b"", "application/octet-stream")}
+    with TestClient(app) as client:
+        resp = client.post("/to_html", params={"format": "parquet"}, files=files)
+    assert resp.status_code == 501
+    assert resp.json()["detail"] == "parquet output requires pyarrow"
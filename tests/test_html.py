@@ -0,0 +1,85 @@
+import random
+import pytest
+from lxml import etree
+from app.excel.html import group_logic_cols, rows_occupied
+
+
+def old_group_logic_cols(etree_group):
+    """改动前的实现(逐行重建占用列表)，作为对照"""
+    logic_cols = []
+    rowspan_occupancy = []
+    for row in etree_group:
+        rowspan_occupancy = [r - 1 for r in rowspan_occupancy if r - 1 > 0]
+        for cell in row.xpath(".//td | .//th"):
+            cs = int(cell.get("colspan", "1")) or 1
+            rs = int(cell.get("rowspan", "1")) or 1
+            for _ in range(cs):
+                rowspan_occupancy.append(rs)
+        logic_cols.append(len(rowspan_occupancy))
+    return logic_cols
+
+
+def old_rows_occupied(rows):
+    """改动前的实现(每行复制整个占用数组)，作为对照"""
+    active = []
+    occupied_counts = []
+    for row in rows:
+        occupied_counts.append(sum(1 for x in active if x > 0))
+        current_occupied = [x > 0 for x in active]
+        next_active = [max(0, x - 1) for x in active]
+        col = 0
+        for cell in [child for child in row if child.tag in ("td", "th")]:
+            while col < len(current_occupied) and current_occupied[col]:
+                col += 1
+            while col >= len(current_occupied):
+                current_occupied.append(False)
+                next_active.append(0)
+            try:
+                rowspan = max(1, int(cell.get("rowspan", 1)))
+            except (ValueError, TypeError):
+                rowspan = 1
+            try:
+                colspan = max(1, int(cell.get("colspan", 1)))
+            except (ValueError, TypeError):
+                colspan = 1
+            while col + colspan > len(next_active):
+                next_active.append(0)
+                current_occupied.append(False)
+            if rowspan > 1:
+                for c in range(col, col + colspan):
+                    next_active[c] = rowspan - 1
+            col += colspan
+        active = next_active
+    return occupied_counts
+
+
+def random_rows(rng: random.Random, spans: list[str]) -> list:
+    """随机行组：每行若干td/th(随机rowspan/colspan)，夹杂非单元格子元素"""
+    rows = []
+    for _ in range(rng.randint(0, 15)):
+        tr = etree.Element("tr")
+        for _ in range(rng.randint(0, 6)):
+            if rng.random() < 0.1:
+                etree.SubElement(tr, "span")
+                continue
+            cell = etree.SubElement(tr, rng.choice(["td", "th"]))
+            if rng.random() < 0.5:
+                cell.set("rowspan", rng.choice(spans))
+            if rng.random() < 0.5:
+                cell.set("colspan", rng.choice(spans))
+        rows.append(tr)
+    return rows
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_group_logic_cols_matches_baseline(seed):
+    # 旧实现对非数字、负数的处理不一致(抛异常或不计列)，只比较合法取值
+    rows = random_rows(random.Random(seed), ["0", "1", "2", "3", "5"])
+    assert group_logic_cols(rows) == old_group_logic_cols(rows)
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_rows_occupied_matches_baseline(seed):
+    spans = ["0", "1", "2", "3", "5", "-1", "x", ""]
+    rows = random_rows(random.Random(seed), spans)
+    assert rows_occupied(rows) == old_rows_occupied(rows)
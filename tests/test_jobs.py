@@ -0,0 +1,99 @@
+import io
+import asyncio
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+from app.mineru import jobs
+from app.utils.cache import DiskCache
+
+
+def upload(name: str, data: bytes) -> UploadFile:
+    headers = Headers({"content-type": "application/pdf"})
+    return UploadFile(io.BytesIO(data), filename=name, headers=headers)
+
+
+def test_fetch_error_falls_back_to_cache(tmp_path, monkeypatch):
+    """状态为parsed但取内容失败(结果已被共用该文件的任务取走)时，改用缓存结果"""
+    cache = DiskCache(tmp_path, max_bytes=1024 * 1024, ttl=3600)
+    monkeypatch.setattr(jobs, "parse_cache", cache)
+
+    async def get_statuses(user_id, file_ids, workers):
+        return {file_id: ("parsed", None) for file_id in file_ids}
+
+    async def fetch_content(user_id, file_id):
+        return "", "file not found"
+
+    monkeypatch.setattr(jobs.mu_client, "get_statuses", get_statuses)
+    monkeypatch.setattr(jobs, "fetch_content", fetch_content)
+
+    async def run():
+        cache.load()
+        await cache.set("k1", "cached".encode("utf-8"))
+        files = {
+            "1": {"triggered": 0, "cache_key": "k1", "created_at": 0.0},
+            "2": {"triggered": 0, "cache_key": "k2", "created_at": 0.0},
+        }
+        poller = jobs.JobPoller(jobs.job_store)
+        return await poller.poll_user("u1", files, 1.0)
+
+    updates = {update[-1]: update for update in asyncio.run(run())}
+    assert updates["1"][:3] == ("parsed", "cached", None)
+    assert updates["2"][:3] == ("failed", None, "file not found")
+
+
+def test_status_error_is_transient(tmp_path, monkeypatch):
+    """查状态失败时保持原状态重试，缓存命中时完成，超时后才失败"""
+    cache = DiskCache(tmp_path, max_bytes=1024 * 1024, ttl=3600)
+    monkeypatch.setattr(jobs, "parse_cache", cache)
+    monkeypatch.setattr(jobs.cfg, "mineru_job_timeout", 100.0)
+
+    async def get_statuses(user_id, file_ids, workers):
+        return {file_id: (None, "get_status failed: 502") for file_id in file_ids}
+
+    monkeypatch.setattr(jobs.mu_client, "get_statuses", get_statuses)
+
+    async def run():
+        cache.load()
+        await cache.set("k1", "cached".encode("utf-8"))
+        files = {
+            "1": {"triggered": 0, "cache_key": "k1", "created_at": 0.0},
+            "2": {"triggered": 0, "cache_key": "k2", "created_at": 0.0},
+            "3": {"triggered": 0, "cache_key": None, "created_at": -200.0},
+        }
+        poller = jobs.JobPoller(jobs.job_store)
+        return await poller.poll_user("u1", files, 1.0)
+
+    updates = {update[-1]: update for update in asyncio.run(run())}
+    assert updates["1"][:3] == ("parsed", "cached", None)
+    assert "2" not in updates
+    assert updates["3"][0] == "failed"
+    assert updates["3"][2].startswith("timeout: 100.0: get_status failed")
+
+
+def test_partial_upload_failure_deletes_uploaded(tmp_path, monkeypatch):
+    """上传返回错误时，已上传成功的部分文档被删除，所有任务记为失败"""
+    store = jobs.JobStore(tmp_path / "jobs.db")
+    deleted = []
+
+    async def proxy_upload(user_id, files):
+        return [("f1", files[0].filename)], "got:1, expected:2"
+
+    async def delete_file(user_id, file_id):
+        deleted.append(file_id)
+
+    monkeypatch.setattr(jobs.cfg, "mineru_cache_enabled", False)
+    monkeypatch.setattr(jobs, "job_store", store)
+    monkeypatch.setattr(jobs.mu_client, "proxy_upload", proxy_upload)
+    monkeypatch.setattr(jobs.mu_client, "delete_file", delete_file)
+
+    async def run():
+        files = [upload("a.pdf", b"a"), upload("b.pdf", b"b")]
+        return await jobs.submit_jobs(files, "u1")
+
+    store.open()
+    try:
+        output, msg = asyncio.run(run())
+    finally:
+        store.close()
+    assert deleted == ["f1"]
+    assert msg == "got:1, expected:2"
+    assert [job["status"] for job in output["jobs"]] == ["failed", "failed"]
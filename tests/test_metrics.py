@@ -0,0 +1,24 @@
+import os
+import json
+import asyncio
+from app.utils.metrics import Registry
+
+
+def test_startup_removes_stale_snapshots(tmp_path):
+    """启动时删除已退出进程及本进程号的旧快照，保留存活进程的快照"""
+    stale, live, own = 1 << 30, os.getppid(), os.getpid()
+    for pid in (stale, live, own):
+        (tmp_path / f"{pid}.json").write_text(json.dumps({"old": pid}))
+    (tmp_path / f"{stale}.tmp").write_text("")
+
+    registry = Registry(tmp_path, interval=60)
+    registry.counter("requests_total", "请求数").inc()
+
+    async def run():
+        async with registry:
+            return sorted(path.name for path in tmp_path.iterdir())
+
+    names = asyncio.run(run())
+    assert names == sorted([f"{live}.json", f"{own}.json"])
+    snapshot = json.loads((tmp_path / f"{own}.json").read_text())
+    assert "requests_total" in snapshot
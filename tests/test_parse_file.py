@@ -0,0 +1,102 @@
+import io
+import asyncio
+from types import SimpleNamespace
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+from app.mineru import parse_file as pf
+from app.utils.cache import DiskCache
+from app.utils.metrics import Histogram
+
+
+def upload(name: str, data: bytes) -> UploadFile:
+    headers = Headers({"content-type": "application/pdf"})
+    return UploadFile(io.BytesIO(data), filename=name, headers=headers)
+
+
+def test_close_mid_stream_finishes_joined_leaders(tmp_path, monkeypatch):
+    """首个文档未命中(已加入合并)、第二个命中缓存，产出首个结果后关闭迭代器"""
+    cache = DiskCache(tmp_path, max_bytes=1024 * 1024, ttl=3600)
+    monkeypatch.setattr(pf, "parse_cache", cache)
+
+    async def run():
+        cache.load()
+        miss, hit = upload("miss.pdf", b"miss"), upload("hit.pdf", b"hit")
+        await cache.set(await pf.parse_key(hit), "cached".encode("utf-8"))
+
+        events = pf.upload_parse_iter([miss, hit], "u1")
+        first = await anext(events)
+        await events.aclose()
+
+        # 后续相同文档的请求成为leader，而不是一直等待已中断的请求
+        _, leader = pf.parse_flight.join(await pf.parse_key(miss))
+        return first, leader
+
+    first, leader = asyncio.run(run())
+    assert first["filename"] == "hit.pdf"
+    assert first["content"] == "cached"
+    assert leader
+
+
+def test_parse_duration_starts_when_parsing_seen(monkeypatch):
+    """解析时长从首次查到parsing算起；两轮之间即解析完成的按上一轮查询时间估计"""
+    clock = [0.0]
+    rounds = [
+        {"a": "pending", "b": "pending"},
+        {"a": "parsing", "b": "pending"},
+        {"a": "parsing", "b": "pending"},
+        {"a": "parsed", "b": "parsed"},
+    ]
+
+    async def get_statuses(user_id, file_ids, workers):
+        clock[0] += 10
+        return {file_id: (rounds[0][file_id], None) for file_id in file_ids}
+
+    async def trigger_parse(user_id, file_id):
+        pass
+
+    async def fetch_content(user_id, file_id):
+        return f"content {file_id}", None
+
+    seconds = Histogram("stage_duration_seconds", "各处理阶段耗时", ("stage",))
+    monkeypatch.setattr(pf, "time", SimpleNamespace(monotonic=lambda: clock[0]))
+    monkeypatch.setattr(pf.cfg, "mineru_poll_initial", 0.0)
+    monkeypatch.setattr(pf.mu_client, "get_statuses", get_statuses)
+    monkeypatch.setattr(pf.mu_client, "trigger_parse", trigger_parse)
+    monkeypatch.setattr(pf, "fetch_content", fetch_content)
+    monkeypatch.setattr(pf, "STAGE_SECONDS", seconds)
+
+    async def run():
+        results = {}
+        async for _, done in pf.iter_contents("u1", ["a", "b"]):
+            results.update(done)
+            rounds.pop(0)
+        return results
+
+    results = asyncio.run(run())
+    assert results == {"a": ("content a", None), "b": ("content b", None)}
+    # [..., 总和, 次数]：a 排队20解析20，b 排队30解析10
+    assert seconds.samples[("mineru_queue",)][-2:] == [50.0, 2]
+    assert seconds.samples[("mineru_parse",)][-2:] == [30.0, 2]
+
+
+def test_partial_upload_failure_deletes_uploaded(monkeypatch):
+    """上传返回错误时，已上传成功的部分文档被删除，所有文档返回上传错误"""
+    deleted = []
+
+    async def proxy_upload(user_id, files):
+        return [("f1", files[0].filename)], "got:1, expected:2"
+
+    async def delete_file(user_id, file_id):
+        deleted.append(file_id)
+
+    monkeypatch.setattr(pf.cfg, "mineru_cache_enabled", False)
+    monkeypatch.setattr(pf.mu_client, "proxy_upload", proxy_upload)
+    monkeypatch.setattr(pf.mu_client, "delete_file", delete_file)
+
+    async def run():
+        files = [upload("a.pdf", b"a"), upload("b.pdf", b"b")]
+        return [event async for event in pf.upload_parse_iter(files, "u1")]
+
+    events = asyncio.run(run())
+    assert deleted == ["f1"]
+    assert [e["error"] for e in events] == ["got:1, expected:2"] * 2
@@ -0,0 +1,63 @@
+import json
+import asyncio
+from app.utils.framing import HEADER, MAGIC, VERSION
+from app.utils.resultstore import ResultStore
+
+
+def test_take_corrupt_header_returns_error(tmp_path):
+    """文件头损坏的结果以错误信息返回，并且同样被取走删除"""
+    store = ResultStore(tmp_path / "results", tmp_path / "results.db", ttl=3600)
+
+    async def run():
+        store.open()
+        try:
+            await store.put("md", "u1", 1, "ok.md", b"content")
+            await store.put("md", "u1", 2, "bad.md", b"content")
+            store.path(2).write_bytes(b"garbage")
+            # 固定头部完好，元数据损坏(非JSON、非UTF-8)
+            for result_id, meta in ((3, b"{not json"), (4, b"\xff\xfe")):
+                await store.put("md", "u1", result_id, "bad.md", b"content")
+                head = HEADER.pack(MAGIC, VERSION, len(meta)) + meta
+                store.path(result_id).write_bytes(head + b"content")
+
+            ok = await store.take("md", "u1", 1)
+            bad = [await store.take("md", "u1", i) for i in (2, 3, 4)]
+            again = await store.take("md", "u1", 2)
+            lines = [line async for line in store.iter_ndjson("md", "u1", [2])]
+            return ok, bad, again, lines
+        finally:
+            store.close()
+
+    ok, bad, again, lines = asyncio.run(run())
+    assert ok[0][1] == b"content" and ok[1] == ""
+    for result_id, (result, msg) in zip((2, 3, 4), bad):
+        assert result is None
+        assert msg.startswith(f"corrupt result of id: {result_id}")
+        assert not store.path(result_id).exists()
+    assert again == (None, "file not found of id: 2")
+    assert json.loads(lines[0]) == {"id": 2, "error": "file not found of id: 2"}
+
+
+def test_non_utf8_content_is_replaced(tmp_path, monkeypatch):
+    """未校验UTF-8暂存的内容，按文本返回时非法字节替换为U+FFFD，不中断输出"""
+    from app.markdown import convert_tmp
+
+    store = ResultStore(tmp_path / "results", tmp_path / "results.db", ttl=3600)
+    monkeypatch.setattr(convert_tmp, "result_store", store)
+    raw = "标题".encode("utf-8") + b"\xff\xfe" + b"end"
+
+    async def run():
+        store.open()
+        try:
+            await store.put("md", "u1", 1, "a.md", raw)
+            await store.put("md", "u1", 2, "b.md", raw)
+            data, msg = await convert_tmp.tmp_content(1, "u1")
+            lines = [line async for line in store.iter_ndjson("md", "u1", [2])]
+            return data, msg, "".join(lines)
+        finally:
+            store.close()
+
+    data, msg, text = asyncio.run(run())
+    assert msg == ""
+    assert data["content"] == "标题��end"
+    assert json.loads(text)["content"] == "标题��end"